@@ -1,9 +1,7 @@
 # install first:
 # pip install quart==0.19.4 quart-cors==0.7.0 hypercorn==0.15.0 pillow tensorflow websockets
 
-import io
 import json
-from PIL import Image
 import numpy as np
 import os
 from tensorflow.keras.models import load_model, Sequential
@@ -18,10 +16,13 @@ import websockets
 import logging
 from hypercorn.config import Config
 from hypercorn.asyncio import serve
-from tensorflow.keras.preprocessing.image import img_to_array
 import socket
 from functools import wraps
-import aiohttp
+from utils.batching import MicroBatcher
+from utils.inference_pipeline import InferencePipeline, FrameDropped
+from utils.frame_bridge import FrameBridge, HTTPForwarder
+from utils.preprocessing import preprocess_jpeg, input_buffers
+from utils.compiled_model import CompiledPredictor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +38,8 @@ WEBSOCKET_PORT = 5001
 HTTP_PORT = 5000
 IMAGE_FOLDER = "received_images"
 MODEL_PATH = "product_model3_finetuned.h5"
+# Optional Socket.IO server (run.py) to relay complete frames to, e.g. http://localhost:5002/esp32_ws_forward
+SOCKETIO_FORWARD_URL = os.environ.get("SOCKETIO_FORWARD_URL")
 
 # Mock user database (replace with real database in production)
 USERS = {
@@ -91,37 +94,43 @@ except Exception as e:
     class_indices = {str(i): f"class_{i}" for i in range(10)}  # Placeholder
     print("Using placeholder classes.")
 
+# Fixed-shape compiled calls per batch bucket instead of model.predict, traced at startup
+model_predictor = CompiledPredictor(model).warmup() if model.built else None
+
+def _predict_batch(batch):
+    if model_predictor is None:
+        return model.predict(batch, verbose=0)
+    return model_predictor.predict(batch)
+
+# Frames from concurrent carts share batched forward passes
+inference_batcher = MicroBatcher(_predict_batch, max_batch_size=16, max_wait_ms=5, name='quart')
+
 def preprocess_image(image_data):
     """Preprocess image data for model prediction."""
     try:
-        # Convert base64 to image
-        if isinstance(image_data, str):
-            # Remove data URL prefix if present
-            if "base64," in image_data:
-                image_data = image_data.split("base64,")[1]
-            image_data = base64.b64decode(image_data)
-        
-        # Open and preprocess image
-        img = Image.open(io.BytesIO(image_data))
-        img = img.resize((224, 224))  # Adjust size according to your model
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = img_array / 255.0  # Normalize
-        
+        # Reduced-resolution decode straight into a pooled float32 input buffer
+        img_array = preprocess_jpeg(decode_image_data(image_data), out=input_buffers.acquire())
+        if img_array is None:
+            logger.error("Error preprocessing image: could not decode image")
         return img_array
     except Exception as e:
         logger.error(f"Error preprocessing image: {e}")
         return None
 
+def decode_image_data(image_data):
+    """Return raw image bytes from bytes, base64 or a data URL."""
+    if isinstance(image_data, str):
+        if "base64," in image_data:
+            image_data = image_data.split("base64,")[1]
+        image_data = base64.b64decode(image_data)
+    return image_data
+
 def save_image(image_data, cart_id=None):
-    """Save received image to disk."""
+    """Save received image to disk (blocking; run it on the pipeline's IO pool)."""
     try:
-        if isinstance(image_data, str):
-            if "base64," in image_data:
-                image_data = image_data.split("base64,")[1]
-            image_data = base64.b64decode(image_data)
+        image_data = decode_image_data(image_data)
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         filename = f"{timestamp}_{cart_id}.jpg" if cart_id else f"{timestamp}.jpg"
         filepath = os.path.join(IMAGE_FOLDER, filename)
         
@@ -135,30 +144,38 @@ def save_image(image_data, cart_id=None):
 
 def generate_token(cart_id):
     """Generate JWT token for cart authentication."""
-    expiration = datetime.utcnow() + timedelta(days=1)
+    expiration = datetime.datetime.utcnow() + datetime.timedelta(days=1)
     return jwt.encode(
         {"cart_id": cart_id, "exp": expiration},
         JWT_SECRET,
         algorithm="HS256"
     )
 
+# ESP32 chunks are joined per frame and fanned out in-process
+frame_bridge = FrameBridge()
+frame_forwarder = HTTPForwarder(frame_bridge, SOCKETIO_FORWARD_URL) if SOCKETIO_FORWARD_URL else None
+# Strong reference to the forwarder task; the event loop only keeps a weak one
+frame_forwarder_task = None
+
+# Decode/resize on a thread pool, inference on the batcher thread, file writes on an IO pool
+inference_pipeline = InferencePipeline(preprocess_image, inference_batcher, max_in_flight=8, max_pending_per_cart=2,
+                                       release_fn=input_buffers.release)
+
 async def process_image(image_data, cart_id=None):
-    """Process image and return predictions."""
+    """Process image and return predictions without blocking the event loop."""
     try:
-        # Save image
-        filepath = save_image(image_data, cart_id)
+        image_bytes = decode_image_data(image_data)
+
+        # Write the file and classify the frame concurrently
+        filepath, predictions = await asyncio.gather(
+            inference_pipeline.run_io(save_image, image_bytes, cart_id),
+            inference_pipeline.predict(cart_id, image_bytes)
+        )
         if not filepath:
             return {"error": "Failed to save image"}
 
-        # Preprocess image
-        processed_img = preprocess_image(image_data)
-        if processed_img is None:
-            return {"error": "Failed to process image"}
-
-        # Make prediction
-        predictions = model.predict(processed_img)
-        predicted_class = str(np.argmax(predictions[0]))
-        confidence = float(np.max(predictions[0]))
+        predicted_class = str(np.argmax(predictions))
+        confidence = float(np.max(predictions))
 
         # Get class label
         class_label = class_indices.get(predicted_class, f"Unknown ({predicted_class})")
@@ -169,6 +186,8 @@ async def process_image(image_data, cart_id=None):
             "confidence": confidence,
             "file_path": filepath
         }
+    except FrameDropped as e:
+        return {"error": str(e), "dropped": True}
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         return {"error": str(e)}
@@ -177,7 +196,7 @@ def token_required(f):
     @wraps(f)
     async def decorated(*args, **kwargs):
         token = None
-        auth_header = (await request.headers).get('Authorization')
+        auth_header = request.headers.get('Authorization')
         
         if auth_header and auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
@@ -195,7 +214,7 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return await make_response(jsonify({'message': 'Invalid token'}), 401)
         
-        return await f(current_user, *args, **kwargs)
+        return await f(dict(current_user, username=data['username']), *args, **kwargs)
     return decorated
 
 @app.route("/login", methods=["POST"])
@@ -217,7 +236,7 @@ async def login():
         token = jwt.encode({
             'username': username,
             'role': user['role'],
-            'exp': datetime.utcnow() + timedelta(hours=24)
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
         }, JWT_SECRET, algorithm="HS256")
         
         return await make_response(jsonify({
@@ -240,6 +259,24 @@ async def check_auth(current_user):
         'role': current_user['role']
     }), 200)
 
+@app.route("/predict", methods=["POST"])
+async def predict():
+    """Classify one frame sent as JSON {"cart_id": ..., "image": <base64>}."""
+    data = await request.get_json()
+    if not data or not data.get('image'):
+        return await make_response(jsonify({'error': 'image is required'}), 400)
+    result = await process_image(data['image'], data.get('cart_id'))
+    if result.get('dropped'):
+        return await make_response(jsonify(result), 503)
+    if 'error' in result:
+        return await make_response(jsonify(result), 500)
+    return jsonify(result)
+
+@app.route("/inference/stats")
+async def inference_stats():
+    """Report pipeline backpressure, batching throughput and queue latency."""
+    return jsonify(inference_pipeline.stats())
+
 @app.route("/")
 async def index():
     """Render the preview page."""
@@ -259,6 +296,7 @@ async def serve_image(current_user, filename):
 
 async def websocket_handler(websocket, path):
     """Handle WebSocket connections from ESP32 cameras."""
+    cart_ids = set()
     try:
         logger.info(f"New WebSocket connection from {websocket.remote_address}")
         
@@ -272,14 +310,11 @@ async def websocket_handler(websocket, path):
                     logger.warning("Received message without cart_id")
                     continue
                 
-                # Handle chunked images
+                # Handle chunked images: subscribers only see complete frames
                 if 'chunk' in data:
-                    # Forward the chunk to Socket.IO clients
-                    await forward_to_socketio(data)
-                    
-                    # If this is the final chunk, process the complete image
-                    if data.get('final', False):
-                        logger.info(f"Completed frame from cart {cart_id}")
+                    cart_ids.add(cart_id)
+                    if frame_bridge.add_chunk(cart_id, data['chunk'], data.get('final', False)) is not None:
+                        logger.debug(f"Completed frame from cart {cart_id}")
                 
             except json.JSONDecodeError:
                 logger.error("Failed to parse WebSocket message")
@@ -290,22 +325,39 @@ async def websocket_handler(websocket, path):
         logger.info("WebSocket connection closed")
     except Exception as e:
         logger.error(f"WebSocket handler error: {str(e)}")
+    finally:
+        # A frame cut off by the disconnect is never finished
+        for cart_id in cart_ids:
+            frame_bridge.discard(cart_id)
 
-async def forward_to_socketio(data):
-    """Forward the frame data to Socket.IO clients."""
+@app.websocket("/ws/frames/<cart_id>")
+async def frame_stream(cart_id):
+    """Push complete camera frames for one cart to a browser."""
+    subscription = frame_bridge.subscribe(cart_id)
     try:
-        # Make a POST request to the Socket.IO server
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f'http://localhost:{HTTP_PORT}/esp32_ws_forward', 
-                                  json=data) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to forward frame: {response.status}")
-    except Exception as e:
-        logger.error(f"Error forwarding to Socket.IO: {str(e)}")
+        async for message in subscription:
+            await websocket.send_json({
+                'cart_id': message['cart_id'],
+                'frame': message['frame'],
+                'timestamp': message['timestamp']
+            })
+    finally:
+        subscription.close()
+
+@app.route("/bridge/stats")
+async def bridge_stats():
+    """Report chunk batching and frame forwarding metrics."""
+    return jsonify({
+        'bridge': frame_bridge.stats(),
+        'forwarder': frame_forwarder.stats() if frame_forwarder else None
+    })
 
 async def run_servers():
     """Run both the WebSocket server and Quart app."""
+    global frame_forwarder_task
     ws_server = await websockets.serve(websocket_handler, "0.0.0.0", WEBSOCKET_PORT)
+    if frame_forwarder:
+        frame_forwarder_task = asyncio.create_task(frame_forwarder.run())
     
     print(f"\n🚀 Starting SmartCart server...")
     print(f"📡 Connection Options:")
@@ -0,0 +1,4 @@
+"""
+Benchmarks package initialization.
+Each module can be run directly, e.g. `python -m benchmarks.bench_batching` from backend/.
+"""
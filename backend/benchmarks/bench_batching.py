@@ -0,0 +1,85 @@
+"""
+Frames/sec against cart count, with and without MicroBatcher.
+
+By default the model is simulated with a fixed per-call overhead plus a
+per-frame cost, which is roughly how Keras behaves on CPU. Pass --model to
+benchmark the real product model instead.
+
+    python -m benchmarks.bench_batching --carts 1 4 16 32 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.batching import MicroBatcher
+
+
+def simulated_model(call_overhead_ms, per_frame_ms, num_classes=104):
+    lock = threading.Lock()
+
+    def predict(batch):
+        # A single CPU device runs one forward pass at a time
+        with lock:
+            time.sleep((call_overhead_ms + per_frame_ms * len(batch)) / 1000.0)
+        return np.full((len(batch), num_classes), 1.0 / num_classes, dtype=np.float32)
+    return predict
+
+
+def run_carts(infer, carts, seconds):
+    frame = np.random.rand(224, 224, 3).astype(np.float32)
+    counts = [0] * carts
+    stop = threading.Event()
+
+    def cart_loop(i):
+        while not stop.is_set():
+            infer(frame)
+            counts[i] += 1
+
+    threads = [threading.Thread(target=cart_loop, args=(i,), daemon=True) for i in range(carts)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    completed = sum(counts)
+    stop.set()
+    for t in threads:
+        t.join()
+    return completed / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carts', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--call-overhead-ms', type=float, default=25.0)
+    parser.add_argument('--per-frame-ms', type=float, default=3.0)
+    parser.add_argument('--model', action='store_true', help='Use the real product model from the registry')
+    args = parser.parse_args()
+
+    if args.model:
+        from utils.model_registry import product_model_registry
+        product_model_registry.load()
+        predict = product_model_registry.predict
+    else:
+        predict = simulated_model(args.call_overhead_ms, args.per_frame_ms)
+
+    print(f"{'carts':>6} {'unbatched fps':>14} {'batched fps':>12} {'speedup':>8} {'mean batch':>11} {'queue p99 ms':>13}")
+    for carts in args.carts:
+        unbatched = run_carts(lambda frame: predict(frame[np.newaxis])[0], carts, args.seconds)
+        batcher = MicroBatcher(predict, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, name='bench')
+        batched = run_carts(batcher.predict, carts, args.seconds)
+        stats = batcher.stats()
+        batcher.stop()
+        print(f"{carts:>6} {unbatched:>14.1f} {batched:>12.1f} {batched / unbatched:>7.1f}x "
+              f"{stats['mean_batch_size']:>11} {stats['queue_latency_ms']['p99']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Camera pulls and inference passes per frame as viewers are added.
+
+Starts a fake MJPEG camera (tools/fake_mjpeg_camera.py) and N concurrent
+viewers of CaptureManager.stream, one of them deliberately slow. With the
+shared reader the camera sees one connection and each frame is processed
+once, whatever N is; the slow viewer drops frames instead of lagging.
+The old per-viewer capture would have cost N connections and N passes.
+
+    python -m benchmarks.bench_capture_fanout --viewers 1 3 10 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.fake_mjpeg_camera import start_fake_camera
+from utils.capture_manager import CaptureManager
+
+
+def run(viewers, seconds, fps, process_ms, slow_delay):
+    camera = start_fake_camera(fps=fps)
+    passes = [0]
+
+    def process(camera_id, frame):
+        passes[0] += 1
+        time.sleep(process_ms / 1000)
+        return None
+
+    manager = CaptureManager(process, idle_timeout=0.5)
+    received = [0] * viewers
+    deadline = time.monotonic() + seconds
+
+    def viewer(i):
+        stream = manager.stream(1, camera.url)
+        for _ in stream:
+            received[i] += 1
+            if time.monotonic() > deadline:
+                break
+            if i == viewers - 1 and viewers > 1:
+                time.sleep(slow_delay)
+        stream.close()
+
+    threads = [threading.Thread(target=viewer, args=(i,)) for i in range(viewers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = manager.stats()['cameras']
+    drops = stats[0]['viewer_dropped_frames'] if stats else 0
+    manager.stop_all()
+    camera.shutdown()
+    return camera.connections, camera.frames_sent, passes[0], received, drops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 3, 10])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--process-ms', type=float, default=20.0, help='Simulated inference time per frame')
+    parser.add_argument('--slow-delay', type=float, default=0.25, help='Seconds the slow viewer spends per frame')
+    args = parser.parse_args()
+
+    print(f"{'viewers':>7} {'camera conns':>12} {'frames sent':>11} {'inference passes':>16} {'fast viewer fps':>15} {'slow viewer fps':>15} {'dropped':>8}")
+    for viewers in args.viewers:
+        connections, sent, passes, received, drops = run(viewers, args.seconds, args.fps, args.process_ms, args.slow_delay)
+        slow = f'{received[-1] / args.seconds:.1f}' if viewers > 1 else '-'
+        print(f'{viewers:>7} {connections:>12} {sent:>11} {passes:>16} {received[0] / args.seconds:>15.1f} {slow:>15} {drops:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Add-item latency for carts of 5, 50 and 500 lines.
+
+Drives POST /api/cart/<cart_id>/items through the real blueprint on a
+file-backed SQLite database and compares:
+
+  recompute   the previous handler: re-sum every item, return the full cart
+  full        running totals (one atomic UPDATE), full cart response
+  delta       running totals, ?delta=1 response (changed line + totals)
+
+and counts the SQL statements each request issues.
+
+    python -m benchmarks.bench_cart_totals --lines 5 50 500 --repeat 50
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from flask import Flask, jsonify, request
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event
+
+from backend.models import db, Cart, CartItem, Product
+from backend.routes.cart_routes import cart_bp
+
+
+def create_app(database_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    app.config['JWT_SECRET_KEY'] = 'bench-cart-totals-secret-key-0123456789'
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(cart_bp)
+
+    @app.route('/legacy/<cart_id>/items', methods=['POST'])
+    def legacy_add_item(cart_id):
+        # The handler before running totals, for comparison
+        data = request.get_json()
+        cart = Cart.query.filter_by(cart_id=cart_id).first()
+        product = Product.query.get(data['product_id'])
+        cart_item = CartItem.query.filter_by(cart_id=cart.id, product_id=product.id).first()
+        cart_item.quantity += data['quantity']
+        cart.total_amount = sum(item.price * item.quantity for item in cart.items)
+        db.session.commit()
+        return jsonify(cart.to_dict()), 200
+
+    return app
+
+
+def seed(app, lines_per_cart):
+    with app.app_context():
+        db.create_all()
+        products = [Product(name=f'Product {i}', price=1.0 + i % 50, category='bench') for i in range(max(lines_per_cart))]
+        db.session.add_all(products)
+        db.session.flush()
+        for lines in lines_per_cart:
+            cart = Cart(cart_id=f'bench-{lines}', status='active')
+            db.session.add(cart)
+            db.session.flush()
+            for product in products[:lines]:
+                db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1, price=product.price))
+            cart.total_amount = sum(p.price for p in products[:lines])
+            cart.item_count = lines
+        db.session.commit()
+        return [p.id for p in products]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_cart_totals_')
+    try:
+        app = create_app(os.path.join(workdir, 'bench.db'))
+        product_ids = seed(app, args.lines)
+        statements = [0]
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+            token = create_access_token(identity='1')
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        variants = [
+            ('recompute', '/legacy/{cart}/items'),
+            ('full', '/api/cart/{cart}/items'),
+            ('delta', '/api/cart/{cart}/items?delta=1'),
+        ]
+        print(f"{'lines':>5} {'variant':>10} {'ms/add':>8} {'queries':>8} {'response KB':>12}")
+        for lines in args.lines:
+            for name, path in variants:
+                url = path.format(cart=f'bench-{lines}')
+                body = {'product_id': product_ids[lines // 2], 'quantity': 1}
+                client.post(url, json=body, headers=headers)
+                statements[0] = 0
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    response = client.post(url, json=body, headers=headers)
+                elapsed = (time.perf_counter() - started) / args.repeat * 1000
+                assert response.status_code == 200, response.get_data(as_text=True)
+                print(f'{lines:>5} {name:>10} {elapsed:>8.2f} {statements[0] / args.repeat:>8.1f} {len(response.data) / 1024:>12.1f}')
+
+        with app.app_context():
+            for lines in args.lines:
+                cart = Cart.query.filter_by(cart_id=f'bench-{lines}').first()
+                expected = sum(item.price * item.quantity for item in cart.items)
+                assert abs(cart.total_amount - expected) < 1e-6, f'running total drifted for {lines} lines'
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
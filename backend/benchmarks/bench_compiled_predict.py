@@ -0,0 +1,72 @@
+"""
+Per-call cost of model.predict vs CompiledPredictor for serving-sized batches.
+
+model.predict sets up a data adapter and tf.data pipeline on every call;
+CompiledPredictor runs a pre-traced fixed-shape function per batch bucket
+(padding to 1/4/8/16/32). The difference is pure per-call overhead, so it
+matters most for batch 1.
+
+    python -m benchmarks.bench_compiled_predict                      # MobileNetV2, random weights
+    python -m benchmarks.bench_compiled_predict --model ../ml_models/weights/product_model3_finetuned.h5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.compiled_model import CompiledPredictor
+from utils.model_registry import INPUT_SHAPE
+
+
+def build_model(model_path, alpha):
+    import tensorflow as tf
+
+    if model_path:
+        return tf.keras.models.load_model(model_path, compile=False)
+    # Same architecture as ml_models/training/finetuned.py, untrained
+    base = tf.keras.applications.MobileNetV2(weights=None, include_top=False, input_shape=INPUT_SHAPE, alpha=alpha)
+    return tf.keras.Sequential([
+        base,
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(256, activation='relu'),
+        tf.keras.layers.Dense(104, activation='softmax')
+    ])
+
+
+def ms_per_call(fn, batch, repeat):
+    fn(batch)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(batch)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='Keras .h5 model (default: untrained MobileNetV2)')
+    parser.add_argument('--alpha', type=float, default=1.0, help='MobileNetV2 width when no --model is given')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 3, 8, 16])
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    model = build_model(args.model, args.alpha)
+    started = time.perf_counter()
+    predictor = CompiledPredictor(model).warmup()
+    print(f'warm-up of buckets {predictor.buckets}: {time.perf_counter() - started:.2f}s')
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>5} {'bucket':>6} {'predict ms':>11} {'compiled ms':>12} {'overhead ms':>12} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        batch = rng.random((batch_size,) + INPUT_SHAPE, dtype=np.float32)
+        baseline = ms_per_call(lambda b: model.predict(b, verbose=0), batch, args.repeat)
+        compiled = ms_per_call(predictor.predict, batch, args.repeat)
+        bucket = predictor.bucket_for(batch_size)
+        print(f'{batch_size:>5} {bucket:>6} {baseline:>11.2f} {compiled:>12.2f} {baseline - compiled:>12.2f} {baseline / compiled:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
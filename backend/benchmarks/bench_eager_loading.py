@@ -0,0 +1,111 @@
+"""
+SQL statements and latency of cart endpoints as the row count grows.
+
+Calls GET /admin/carts/active and GET /api/cart/<cart_id> through the real
+blueprints on a file-backed SQLite database, with and without the eager
+loading in Cart.with_items, and counts statements with
+utils.query_counter. The lazy variant is the previous query
+(Cart.query...), serialized the same way.
+
+    python -m benchmarks.bench_eager_loading --carts 10 100 500 --lines 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+
+from backend.models import db, Cart, CartItem, Product, User
+from backend.routes.admin import admin_bp
+from backend.routes.cart_routes import cart_bp
+from utils.query_counter import count_queries
+
+
+def create_app(database_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    app.config['JWT_SECRET_KEY'] = 'bench-eager-loading-secret-key-0123456789'
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(cart_bp)
+
+    @app.route('/lazy/carts/active')
+    def lazy_active_carts():
+        # get_active_carts before eager loading
+        return jsonify({'carts': [cart.to_dict() for cart in Cart.query.filter_by(status='active').all()]})
+
+    @app.route('/lazy/cart/<cart_id>')
+    def lazy_get_cart(cart_id):
+        # get_cart before eager loading
+        return jsonify(Cart.query.filter_by(cart_id=cart_id).first().to_dict())
+
+    return app
+
+
+def seed(carts, lines):
+    products = [Product(name=f'Product {i}', price=1.0 + i % 50, category='bench') for i in range(200)]
+    db.session.add_all(products)
+    db.session.flush()
+    for c in range(carts):
+        cart = Cart(cart_id=f'bench-{c}', status='active')
+        db.session.add(cart)
+        db.session.flush()
+        for line in range(lines):
+            product = products[(c * lines + line) % len(products)]
+            db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1, price=product.price))
+    db.session.commit()
+
+
+def measure(client, url, headers, repeat):
+    client.get(url, headers=headers)
+    with count_queries(db.engine) as queries:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url, headers=headers)
+    return queries.count, (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carts', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--lines', type=int, default=5, help='Lines per cart')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'carts':>6} {'endpoint':>22} {'lazy stmts':>10} {'lazy ms':>9} {'eager stmts':>11} {'eager ms':>9}")
+    for carts in args.carts:
+        workdir = tempfile.mkdtemp(prefix='bench_eager_loading_')
+        try:
+            app = create_app(os.path.join(workdir, 'bench.db'))
+            with app.app_context():
+                db.create_all()
+                admin = User(email='admin@example.com', password_hash='x', is_admin=True)
+                db.session.add(admin)
+                seed(carts, args.lines)
+                token = create_access_token(identity=str(admin.id))
+                client = app.test_client()
+                headers = {'Authorization': f'Bearer {token}'}
+                # admin_required loads the user: one statement on top of the carts
+                lazy = measure(client, '/lazy/carts/active', headers, args.repeat)
+                eager = measure(client, '/admin/carts/active', headers, args.repeat)
+                print(f'{carts:>6} {"/admin/carts/active":>22} {lazy[0]:>10} {lazy[1]:>9.1f} {eager[0] - 1:>11} {eager[1]:>9.1f}')
+                lazy = measure(client, '/lazy/cart/bench-0', headers, args.repeat)
+                eager = measure(client, '/api/cart/bench-0', headers, args.repeat)
+                print(f'{carts:>6} {"/api/cart/<cart_id>":>22} {lazy[0]:>10} {lazy[1]:>9.1f} {eager[0]:>11} {eager[1]:>9.1f}')
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
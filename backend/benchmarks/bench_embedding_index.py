@@ -0,0 +1,65 @@
+"""
+EmbeddingIndex search latency and memory as the catalog grows.
+
+Uses random 1280-d vectors (MobileNetV2's pooled feature size) with several
+reference rows per product and times top-1 search for a single frame and
+for a micro-batch of frames, for float32 and float16 storage.
+
+    python -m benchmarks.bench_embedding_index --products 100 1000 10000 --refs 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embedding_index import EmbeddingIndex
+
+
+def build(products, refs, dim, dtype, rng):
+    index = EmbeddingIndex(dim, dtype=dtype, capacity=products * refs)
+    centers = rng.standard_normal((products, dim)).astype(np.float32)
+    for i in range(products):
+        index.add(i, f'Product {i}', centers[i] + 0.3 * rng.standard_normal((refs, dim)).astype(np.float32))
+    return index, centers
+
+
+def ms_per_call(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--refs', type=int, default=4, help='Reference rows per product')
+    parser.add_argument('--dim', type=int, default=1280)
+    parser.add_argument('--batch', type=int, default=16, help='Queries per batched search')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'products':>9} {'dtype':>8} {'MB':>8} {'1 query ms':>11} {f'{args.batch} queries ms':>15} {'add ms':>7} {'top-1 acc':>10}")
+    for products in args.products:
+        for dtype in (np.float32, np.float16):
+            index, centers = build(products, args.refs, args.dim, dtype, rng)
+            picks = rng.integers(0, products, args.batch)
+            queries = centers[picks] + 0.3 * rng.standard_normal((args.batch, args.dim)).astype(np.float32)
+            single = ms_per_call(lambda: index.search(queries[:1]), args.repeat)
+            batched = ms_per_call(lambda: index.search(queries), args.repeat)
+            started = time.perf_counter()
+            index.add('new', 'New product', rng.standard_normal((args.refs, args.dim)))
+            add_ms = (time.perf_counter() - started) * 1000
+            hits = [result[0][0] == str(pick) for result, pick in zip(index.search(queries), picks)]
+            mb = index.stats()['matrix_bytes'] / 1e6
+            print(f'{products:>9} {np.dtype(dtype).name:>8} {mb:>8.1f} {single:>11.2f} {batched:>15.2f} {add_ms:>7.2f} {np.mean(hits):>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
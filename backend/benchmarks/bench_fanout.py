@@ -0,0 +1,65 @@
+"""
+Per-event cost of finding a cart's connections: linear scan vs ConnectionIndex.
+
+Simulates thousands of Socket.IO connections (3 browsers + 1 ESP32 per cart)
+and times the lookups run.py does for every event: the browser sids of one
+cart (notify_browser_clients / disconnect) and the has-camera check (connect).
+
+    python -m benchmarks.bench_fanout --connections 100 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.connection_index import ConnectionIndex
+
+
+def build(total_connections, browsers_per_cart=3):
+    index = ConnectionIndex()
+    per_cart = browsers_per_cart + 1
+    for i in range(total_connections):
+        cart_id = f'cart_{i // per_cart:06d}'
+        client_type = 'esp32' if i % per_cart == 0 else 'browser'
+        index.add(f'sid_{i}', cart_id, client_type)
+    return index
+
+
+def scan_lookup(connections, cart_id):
+    browser_sids = [sid for sid, conn in connections.items()
+                    if conn['cart_id'] == cart_id and conn['type'] == 'browser']
+    has_camera = any(conn['type'] == 'esp32' and conn['cart_id'] == cart_id
+                     for conn in connections.values())
+    return browser_sids, has_camera
+
+
+def index_lookup(index, cart_id):
+    return index.browser_sids(cart_id), index.has_camera(cart_id)
+
+
+def time_per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'connections':>12} {'scan us/event':>14} {'index us/event':>15} {'speedup':>9}")
+    for total in args.connections:
+        index = build(total)
+        cart_id = f'cart_{(total // 4) // 2:06d}'
+        scan = time_per_call(lambda: scan_lookup(index.connections, cart_id), args.repeat)
+        indexed = time_per_call(lambda: index_lookup(index, cart_id), args.repeat * 50)
+        print(f'{total:>12} {scan:>14.2f} {indexed:>15.3f} {scan / indexed:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+GET /store/products over a large catalog: one jsonify'd list vs streaming.
+
+Seeds a file-backed SQLite database with --products products and compares:
+
+  list       the previous handler: Product.query.all(), one jsonify'd list
+  stream     the same JSON array streamed from a server-side cursor
+  ndjson     ?format=ndjson
+  page       ?limit=100 (first keyset page)
+  304        If-None-Match with the ETag of the previous response
+
+reporting time to first byte and total time, then peak Python memory
+(tracemalloc) while the response is produced and read, in a second run.
+
+    python -m benchmarks.bench_list_endpoints --products 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from flask import Flask, jsonify
+
+from backend.models import db, Product
+import routes.store as store_routes
+
+
+def create_app(database_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    db.init_app(app)
+    app.register_blueprint(store_routes.store_bp, url_prefix='/store')
+
+    @app.route('/legacy/products')
+    def legacy_products():
+        # get_products before streaming
+        return jsonify([{
+            'id': p.id,
+            'name': p.name,
+            'description': p.description,
+            'price': float(p.price),
+            'category': p.category,
+            'image_url': p.image_url
+        } for p in Product.query.all()]), 200
+
+    return app
+
+
+def read(client, url, headers):
+    started = time.perf_counter()
+    response = client.get(url, headers=headers or {}, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - started
+    return response, (first_byte or total) * 1000, total * 1000, size / 2 ** 20
+
+
+def measure(client, url, headers=None):
+    response, first_byte, total, size = read(client, url, headers or {})
+    tracemalloc.start()
+    read(client, url, headers or {})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return response, first_byte, total, peak / 2 ** 20, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_list_endpoints_')
+    try:
+        app = create_app(os.path.join(workdir, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            db.session.bulk_insert_mappings(Product, [{
+                'name': f'Product {i}', 'description': f'Description of product {i}', 'price': 1.0 + i % 100,
+                'category': f'category {i % 20}', 'image_url': f'/images/{i}.jpg'
+            } for i in range(args.products)])
+            db.session.commit()
+        client = app.test_client()
+
+        print(f'{args.products} products')
+        print(f"{'':<8} {'status':>6} {'first byte ms':>14} {'total ms':>9} {'peak MB':>8} {'body MB':>8}")
+        etag = None
+        for name, url in (('list', '/legacy/products'), ('stream', '/store/products'),
+                          ('ndjson', '/store/products?format=ndjson'), ('page', '/store/products?limit=100'),
+                          ('304', '/store/products')):
+            headers = {'If-None-Match': etag} if name == '304' else None
+            response, first_byte, total, peak, size = measure(client, url, headers)
+            if name == 'stream':
+                etag = response.headers['ETag']
+            print(f'{name:<8} {response.status_code:>6} {first_byte:>14.1f} {total:>9.1f} {peak:>8.1f} {size:>8.2f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
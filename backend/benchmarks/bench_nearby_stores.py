@@ -0,0 +1,157 @@
+"""
+/store/nearby latency over 100k stores.
+
+Seeds a file-backed SQLite database with --stores synthetic stores (most of
+them clustered around --cities metro areas, the rest spread over the
+continental US, 0-3 cameras each) and calls GET /store/nearby through the
+real blueprint:
+
+  scan     the previous handler: load every active store, Python haversine
+           per store, lazy-load cameras per match
+  sql      bounding-box query on the (latitude, longitude) index, vectorized
+           haversine over the box, camera counts from a subquery
+  memory   grid index in process memory, vectorized haversine over the
+           covered cells, matches fetched by id
+
+Checks that all three return the same stores, then times a full index
+reload against committing store moves that update the index in place.
+
+    python -m benchmarks.bench_nearby_stores --stores 100000 --radius 2 10 50
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from flask import Flask, jsonify, request
+
+from backend.models import db, Camera, Store
+import routes.store as store_routes
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    # Per-store haversine of the old handler
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def create_app(database_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    db.init_app(app)
+    app.register_blueprint(store_routes.store_bp, url_prefix='/store')
+
+    @app.route('/legacy/nearby')
+    def legacy_nearby():
+        # find_nearby_stores before the spatial index
+        lat = float(request.args.get('latitude'))
+        lon = float(request.args.get('longitude'))
+        radius = float(request.args.get('radius', 10))
+        nearby = []
+        for store in Store.query.filter_by(is_active=True).all():
+            distance = calculate_distance(lat, lon, store.latitude, store.longitude)
+            if distance <= radius:
+                nearby.append({'id': store.id, 'distance': round(distance, 2), 'camera_count': len(store.cameras)})
+        nearby.sort(key=lambda x: x['distance'])
+        return jsonify(nearby)
+
+    return app
+
+
+def seed(stores, cities, rng):
+    centers = [(rng.uniform(26, 48), rng.uniform(-123, -70)) for _ in range(cities)]
+    rows, cameras = [], []
+    for i in range(1, stores + 1):
+        if rng.random() < 0.8:
+            lat, lon = rng.choice(centers)
+            lat, lon = rng.gauss(lat, 0.3), rng.gauss(lon, 0.3)
+        else:
+            lat, lon = rng.uniform(25, 49), rng.uniform(-125, -67)
+        rows.append({'id': i, 'name': f'Store {i}', 'address': f'{i} Main St',
+                     'latitude': lat, 'longitude': lon, 'is_active': rng.random() < 0.95})
+        cameras.extend({'store_id': i, 'name': f'Camera {i}-{c}'} for c in range(rng.randint(0, 3)))
+    db.session.bulk_insert_mappings(Store, rows)
+    db.session.bulk_insert_mappings(Camera, cameras)
+    db.session.commit()
+    return centers
+
+
+def fetch(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stores', type=int, default=100000)
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--radius', type=float, nargs='+', default=[2, 10, 50])
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--moves', type=int, default=1000, help='Stores moved for the incremental update timing')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp(prefix='bench_nearby_stores_')
+    try:
+        app = create_app(os.path.join(workdir, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            centers = seed(args.stores, args.cities, rng)
+        client = app.test_client()
+        points = [(rng.gauss(lat, 0.2), rng.gauss(lon, 0.2)) for lat, lon in
+                  (rng.choice(centers) for _ in range(args.queries))]
+
+        with app.app_context():
+            started = time.perf_counter()
+            store_routes.load_store_index()
+            load_ms = (time.perf_counter() - started) * 1000
+
+        print(f'{args.stores} stores, {args.queries} queries per radius')
+        print(f"{'radius km':>9} {'matches':>8} {'scan ms':>9} {'sql ms':>8} {'memory ms':>10}")
+        for radius in args.radius:
+            urls = [f'?latitude={lat}&longitude={lon}&radius={radius}' for lat, lon in points]
+            timings = {}
+            results = {}
+            for mode in ('scan', 'sql', 'memory'):
+                store_routes.STORE_GEO_INDEX = mode
+                path = '/legacy/nearby' if mode == 'scan' else '/store/nearby'
+                started = time.perf_counter()
+                results[mode] = [fetch(client, path + url) for url in urls]
+                timings[mode] = (time.perf_counter() - started) / len(urls) * 1000
+            for scan, sql, memory in zip(results['scan'], results['sql'], results['memory']):
+                expected = [(s['id'], s['camera_count']) for s in scan]
+                assert sorted(expected) == sorted((s['id'], s['camera_count']) for s in sql), 'sql results differ'
+                assert sorted(expected) == sorted((s['id'], s['camera_count']) for s in memory), 'memory results differ'
+            matches = sum(len(r) for r in results['memory']) / len(urls)
+            print(f'{radius:>9g} {matches:>8.1f} {timings["scan"]:>9.1f} {timings["sql"]:>8.2f} {timings["memory"]:>10.2f}')
+
+        store_routes.STORE_GEO_INDEX = 'memory'
+        with app.app_context():
+            moved = Store.query.filter(Store.is_active.is_(True)).limit(args.moves).all()
+            target_lat, target_lon = 40.0, -100.0
+            started = time.perf_counter()
+            for store in moved:
+                store.latitude = rng.gauss(target_lat, 0.01)
+                store.longitude = rng.gauss(target_lon, 0.01)
+            db.session.commit()
+            commit_ms = (time.perf_counter() - started) * 1000
+            moved_ids = {store.id for store in moved}
+        found = {s['id'] for s in fetch(client, f'/store/nearby?latitude={target_lat}&longitude={target_lon}&radius=10')}
+        assert moved_ids <= found, 'moved stores missing from the index'
+        print(f'full index reload: {load_ms:.0f} ms; commit of {len(moved_ids)} moved stores incl. index update: {commit_ms:.0f} ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Decode + resize cost per frame: the old full-size paths vs utils.preprocessing.
+
+    old cv2   cv2.imdecode at full size, cv2.resize, / 255.0      (run.py, detection.py)
+    old PIL   Image.open, resize, float array, / 255.0            (app.py)
+    reduced   DCT-scaled decode, resize into a pooled float32 buffer
+
+    python -m benchmarks.bench_preprocessing --size 640x480 --repeat 500
+    python -m benchmarks.bench_preprocessing --image frame.jpg
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.preprocessing import InputBufferPool, preprocess_jpeg
+
+
+def synthetic_jpeg(width, height, quality=80):
+    """Smooth noise with some edges, closer to a camera frame than flat colour"""
+    rng = np.random.default_rng(0)
+    img = (rng.random((height // 8, width // 8, 3)) * 255).astype(np.uint8)
+    img = cv2.resize(img, (width, height), interpolation=cv2.INTER_CUBIC)
+    cv2.rectangle(img, (width // 4, height // 4), (width // 2, height // 2), (20, 200, 40), 8)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def old_cv2(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    img = cv2.resize(img, (224, 224))
+    return img / 255.0
+
+
+def old_pil(data):
+    img = Image.open(io.BytesIO(data))
+    img = img.resize((224, 224))
+    return np.asarray(img, dtype=np.float32)[None] / 255.0
+
+
+def time_per_frame(fn, data, repeat):
+    for _ in range(min(20, repeat)):
+        fn(data)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG to use instead of a synthetic frame')
+    parser.add_argument('--size', default='640x480', help='Synthetic frame size, WxH (ESP32 VGA default)')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            data = f.read()
+    else:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        data = synthetic_jpeg(width, height)
+
+    pool = InputBufferPool(preallocate=1)
+
+    def reduced(frame):
+        buf = pool.acquire()
+        preprocess_jpeg(frame, out=buf)
+        pool.release(buf)
+
+    cv2.setNumThreads(1)
+    print(f'frame: {len(data) / 1024:.1f} KB, repeat {args.repeat}, single-threaded OpenCV')
+    baseline = time_per_frame(old_cv2, data, args.repeat)
+    rows = [('old cv2', baseline), ('old PIL', time_per_frame(old_pil, data, args.repeat)),
+            ('reduced', time_per_frame(reduced, data, args.repeat))]
+    print(f"{'path':<10} {'ms/frame':>9} {'vs old cv2':>11}")
+    for name, ms in rows:
+        print(f'{name:<10} {ms:>9.3f} {baseline / ms:>10.2f}x')
+
+
+if __name__ == '__main__':
+    main()
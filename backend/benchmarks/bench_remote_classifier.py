@@ -0,0 +1,123 @@
+"""
+Remote fallback traffic: thread per frame vs RemoteClassifier, against a local generateContent stub.
+
+Simulates several carts sending low-confidence frames of a few distinct
+products and counts the remote calls each approach makes, how many threads
+it needed and how long results took to arrive.
+
+    python -m benchmarks.bench_remote_classifier --carts 4 --fps 5 --seconds 5 --latency 0.3
+"""
+import argparse
+import base64
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.gemini_stub import start_stub
+from utils.remote_classifier import RemoteClassifier, parse_generate_content
+
+
+def frames(carts, fps, seconds, products):
+    """(send_at, cart_id, image_b64, image_hash) in send order; each cart cycles slowly through the products"""
+    schedule = []
+    for cart in range(carts):
+        for i in range(int(fps * seconds)):
+            product = (cart + i // (fps * 2)) % products
+            schedule.append((i / fps, f'cart_{cart:03d}', base64.b64encode(b'frame-%d' % product).decode(), product))
+    return sorted(schedule)
+
+
+def replay(schedule, send):
+    started = time.perf_counter()
+    for send_at, cart_id, image_b64, image_hash in schedule:
+        delay = send_at - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        send(cart_id, image_b64, image_hash)
+
+
+def run_thread_per_frame(url, schedule):
+    latencies = []
+    peak_threads = [0]
+
+    def call(image_b64, sent):
+        # What run.py used to do: a fresh requests.post per frame on its own thread
+        resp = requests.post(url, params={'key': 'test'}, json={'contents': [{'parts': [{'inlineData': {'data': image_b64}}]}]}, timeout=8)
+        parse_generate_content(resp.json())
+        latencies.append(time.perf_counter() - sent)
+
+    def send(cart_id, image_b64, image_hash):
+        threading.Thread(target=call, args=(image_b64, time.perf_counter()), daemon=True).start()
+        peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    replay(schedule, send)
+    deadline = time.time() + 30
+    while len(latencies) < len(schedule) and time.time() < deadline:
+        time.sleep(0.05)
+    return latencies, peak_threads[0], {}
+
+
+def run_remote_classifier(url, schedule, rate, burst, workers):
+    latencies = []
+    peak_threads = [0]
+    sent_at = {}
+
+    def on_result(cart_id, result, confidence_local, latency_ms):
+        latencies.append(time.perf_counter() - sent_at[cart_id])
+
+    classifier = RemoteClassifier(api_key='test', api_url=url, callback=on_result, workers=workers,
+                                  rate=rate, burst=burst, confidence_threshold=0.85)
+
+    def send(cart_id, image_b64, image_hash):
+        sent_at[cart_id] = time.perf_counter()
+        classifier.submit(cart_id, image_b64, image_hash, 0.3)
+        peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    replay(schedule, send)
+    time.sleep(1.0)
+    stats = classifier.stats()
+    classifier.shutdown()
+    return latencies, peak_threads[0], stats
+
+
+def report(name, calls, latencies, peak_threads, frames_sent):
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2] * 1000 if ordered else float('nan')
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000 if ordered else float('nan')
+    print(f'{name:<20} {frames_sent:>7} {calls:>7} {len(latencies):>8} {peak_threads:>8} {p50:>9.1f} {p99:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carts', type=int, default=4)
+    parser.add_argument('--fps', type=int, default=5, help='Low-confidence frames per second per cart')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=3, help='Distinct images in rotation')
+    parser.add_argument('--latency', type=float, default=0.3, help='Stub response time in seconds')
+    parser.add_argument('--rate', type=float, default=2.0, help='RemoteClassifier calls per second')
+    parser.add_argument('--burst', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    schedule = frames(args.carts, args.fps, args.seconds, args.products)
+    print(f"{'mode':<20} {'frames':>7} {'calls':>7} {'results':>8} {'threads':>8} {'p50 ms':>9} {'p99 ms':>9}")
+
+    stub = start_stub(latency=args.latency)
+    latencies, peak, _ = run_thread_per_frame(stub.url, schedule)
+    report('thread per frame', stub.calls, latencies, peak, len(schedule))
+    stub.shutdown()
+
+    stub = start_stub(latency=args.latency)
+    latencies, peak, stats = run_remote_classifier(stub.url, schedule, args.rate, args.burst, args.workers)
+    report('RemoteClassifier', stub.calls, latencies, peak, len(schedule))
+    stub.shutdown()
+    print('RemoteClassifier stats:', {k: stats[k] for k in ('cache_hits', 'coalesced', 'rate_limited', 'stale', 'errors')})
+
+
+if __name__ == '__main__':
+    main()
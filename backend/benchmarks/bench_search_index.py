@@ -0,0 +1,127 @@
+"""
+Search-as-you-type latency: ILIKE / substring scans vs the search index.
+
+Builds --products synthetic product names from the catalog in
+class_indices.json (each base name with pack sizes and variants), then types
+each query one keystroke at a time against:
+
+  ilike    Product-shaped table in a file-backed SQLite database,
+           name ILIKE '%q%' OR category ILIKE '%q%' (the old store search)
+  scan     substring test over every value of a dict (the old inventory search)
+  index    utils.search_index.SearchIndex, first page of 20
+
+and reports the mean ms per keystroke, the results on the final keystroke,
+and the cost of indexing one changed product.
+
+    python -m benchmarks.bench_search_index --products 50000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import Column, Integer, String, create_engine, or_, select
+from sqlalchemy.orm import Session, declarative_base
+
+from utils.search_index import SearchIndex
+
+CLASS_INDICES = os.path.join(BACKEND_DIR, '..', 'class_indices.json')
+VARIANTS = ['', 'Family Pack', 'Value Pack', '100g', '200g', '500g', 'Mini', 'Combo', 'Jar', 'Party Pack']
+CATEGORIES = ['biscuits', 'snacks', 'bakery', 'beverages', 'dairy']
+QUERIES = [
+    'britannia good day',
+    'maska chaska',
+    'britania goodday',   # typo, missing space
+    'tigr kreemz',        # typos
+    'britnia chacalate',  # two edits in each word
+    '5050 maska',         # "50-50" written without the hyphen
+]
+
+Base = declarative_base()
+
+
+class BenchProduct(Base):
+    __tablename__ = 'bench_products'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    category = Column(String(50), nullable=False)
+
+
+def make_products(count, rng):
+    with open(CLASS_INDICES) as f:
+        names = list(json.load(f))
+    return [
+        (i, f'{names[i % len(names)]} {rng.choice(VARIANTS)}'.strip(), rng.choice(CATEGORIES))
+        for i in range(1, count + 1)
+    ]
+
+
+def keystrokes(query):
+    return [query[:i] for i in range(1, len(query) + 1) if not query[:i].endswith(' ')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=50000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    products = make_products(args.products, rng)
+    workdir = tempfile.mkdtemp(prefix='bench_search_index_')
+    try:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.bulk_insert_mappings(BenchProduct, [{'id': i, 'name': n, 'category': c} for i, n, c in products])
+            session.commit()
+        inventory = {str(i): {'name': n, 'category': c} for i, n, c in products}
+
+        index = SearchIndex({'name': 3.0, 'category': 1.5})
+        started = time.perf_counter()
+        index.replace_all((i, {'name': n, 'category': c}) for i, n, c in products)
+        build_s = time.perf_counter() - started
+
+        def ilike(q):
+            with Session(engine) as session:
+                stmt = select(BenchProduct.id).where(or_(BenchProduct.name.ilike(f'%{q}%'), BenchProduct.category.ilike(f'%{q}%')))
+                return len(session.execute(stmt).all())
+
+        def scan(q):
+            q = q.lower()
+            return len([k for k, v in inventory.items() if q in v['name'].lower() or q in v['category'].lower()])
+
+        def search(q):
+            return index.search(q, limit=20)[0]
+
+        print(f'{args.products} products; index built in {build_s:.2f} s ({index.stats()})')
+        print(f"{'query':<20} {'ilike ms':>9} {'scan ms':>8} {'index ms':>9} {'ilike hits':>10} {'index hits':>10}  top result")
+        for query in QUERIES:
+            row = {}
+            for name, fn in (('ilike', ilike), ('scan', scan), ('index', search)):
+                prefixes = keystrokes(query)
+                started = time.perf_counter()
+                for prefix in prefixes:
+                    hits = fn(prefix)
+                row[name] = ((time.perf_counter() - started) / len(prefixes) * 1000, hits)
+            top = index.search(query, limit=1)[1]
+            top_name = products[top[0][0] - 1][1] if top else '-'
+            print(f'{query:<20} {row["ilike"][0]:>9.1f} {row["scan"][0]:>8.1f} {row["index"][0]:>9.2f} '
+                  f'{row["ilike"][1]:>10} {row["index"][1]:>10}  {top_name}')
+
+        started = time.perf_counter()
+        for i in range(1, 1001):
+            index.upsert(i, {'name': f'Renamed Product {i}', 'category': 'snacks'})
+        print(f'incremental update: {(time.perf_counter() - started):.3f} ms per changed product')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Events per frame with and without the CartTracker vote.
+
+Simulates carts streaming noisy per-frame predictions: products are put in
+and taken out over time, the classifier mislabels a share of frames and
+sometimes sees nothing. Without voting every confident frame is a write and
+a Socket.IO event; with voting only confirmed additions and removals are.
+
+    python -m benchmarks.bench_temporal_voting --frames 10000 --noise 0.1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.temporal_voting import CartTracker
+
+
+def simulate(frames, products, noise, change_every, max_items, rng):
+    """Yield (true items, observations) per frame"""
+    present = set()
+    for i in range(frames):
+        if i % change_every == 0:
+            # Shoppers mostly add items; a full cart gets one taken out
+            if present and (len(present) >= max_items or rng.random() < 0.3):
+                present.discard(sorted(present)[int(rng.integers(len(present)))])
+            else:
+                present.add(int(rng.integers(products)))
+        observations = {}
+        for product in present:
+            roll = rng.random()
+            if roll < noise:
+                observations[int(rng.integers(products))] = (float(rng.uniform(0.5, 0.8)), None)
+            elif roll < noise * 1.5:
+                continue
+            else:
+                observations[product] = (float(rng.uniform(0.7, 0.99)), None)
+        yield set(present), observations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--noise', type=float, default=0.1,
+                        help='Share of frames with a wrong label per item (half as many again see nothing)')
+    parser.add_argument('--change-every', type=int, default=150, help='Frames between items being added/removed')
+    parser.add_argument('--max-items', type=int, default=8, help='Items in view at most')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tracker = CartTracker()
+    per_frame_events = 0
+    true_changes = 0
+    wrong_frames = 0
+    previous = set()
+    started = time.perf_counter()
+    for present, observations in simulate(args.frames, args.products, args.noise, args.change_every, args.max_items, rng):
+        per_frame_events += len([c for c, _ in observations.values() if c > 0.5])
+        true_changes += len(present ^ previous)
+        previous = present
+        tracker.update('cart', observations)
+        wrong_frames += {item['label'] for item in tracker.items('cart')} != present
+    elapsed = time.perf_counter() - started
+
+    stats = tracker.stats()
+    print(f"frames: {args.frames}, true add/remove changes: {true_changes}")
+    print(f"  per-frame detections (writes + events): {per_frame_events}")
+    print(f"  confirmed tracker events:               {stats['events']} ({per_frame_events / max(stats['events'], 1):.0f}x fewer)")
+    print(f"  frames where confirmed items differ from truth: {wrong_frames / args.frames:.1%} (mostly confirmation lag)")
+    print(f"  update cost: {elapsed / args.frames * 1e6:.1f} us/frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Cost of tiled multi-object detection vs classifying the crops one by one.
+
+TiledDetector scores every tile of the pyramid (whole frame + 2x2 grid by
+default) in one batched forward pass. The baseline runs the same crops
+through the model as separate batch-1 calls, which is what finding N items
+with the single-label path would cost.
+
+    python -m benchmarks.bench_tiled_detection
+    python -m benchmarks.bench_tiled_detection --grids 1x1 2x2 3x3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_compiled_predict import build_model
+from utils.compiled_model import CompiledPredictor
+from utils.preprocessing import to_model_input
+from utils.tiled_detection import TiledDetector, softmax_labels, tile_boxes
+
+
+def ms_per_call(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='Keras .h5 model (default: untrained MobileNetV2)')
+    parser.add_argument('--grids', nargs='+', default=['1x1', '2x2'], help='Tile grids as COLSxROWS')
+    parser.add_argument('--frame', default='640x480', help='Frame size as WxH')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    grids = [tuple(int(v) for v in g.split('x')) for g in args.grids]
+    width, height = (int(v) for v in args.frame.split('x'))
+    predictor = CompiledPredictor(build_model(args.model, 1.0)).warmup()
+    detector = TiledDetector(softmax_labels(predictor.predict), grids=grids, min_confidence=0.0)
+
+    frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    boxes = tile_boxes(width, height, grids)
+
+    def one_by_one():
+        for x0, y0, x1, y1 in boxes:
+            predictor.predict(to_model_input(frame[y0:y1, x0:x1]))
+
+    batched = ms_per_call(lambda: detector.detect(frame), args.repeat)
+    sequential = ms_per_call(one_by_one, args.repeat)
+    print(f'{len(boxes)} tiles ({" + ".join(args.grids)}) on a {args.frame} frame')
+    print(f'  batched detect:      {batched:8.2f} ms/frame')
+    print(f'  one crop per call:   {sequential:8.2f} ms/frame ({sequential / batched:.2f}x)')
+    print(f'  whole frame only:    {ms_per_call(lambda: predictor.predict(to_model_input(frame)), args.repeat):8.2f} ms/frame')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Detection rows/sec: one commit per row vs the write-behind sink.
+
+Writes --rows Detection rows into a file-backed SQLite database
+(default synchronous=FULL, so each commit syncs to disk, like the old
+per-frame `db.session.add(); db.session.commit()`), then the same rows
+through WriteBehindSink with bulk inserts (Detection.mappings, as
+routes/detection.py does), with and without the disk spool.
+Reports the rate the producer (the frame loop) sees and the end-to-end rate
+until every row is committed.
+
+    python -m benchmarks.bench_write_behind --rows 5000
+    python -m benchmarks.bench_write_behind --rows 5000 --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from flask import Flask
+
+from backend.models import db, AIModel, Camera, Detection, Product, Store
+from utils.write_behind import WriteBehindSink
+
+CAMERAS = 8
+PRODUCTS = 100
+
+
+def create_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def seed():
+    # The rows Detection's foreign keys point at
+    db.session.add(Store(id=1, name='Bench store', address='1 Main St', latitude=0.0, longitude=0.0))
+    db.session.add(AIModel(id=1, name='bench', version='1', model_path='bench.keras', is_active=True))
+    db.session.add_all(Camera(id=i, store_id=1, name=f'Camera {i}') for i in range(1, CAMERAS + 1))
+    db.session.add_all(Product(name=f'Product {i}', price=1.0, category='bench') for i in range(PRODUCTS))
+    db.session.commit()
+
+
+def make_row(i):
+    return {'camera_id': i % CAMERAS + 1, 'product_name': f'Product {i % PRODUCTS}', 'confidence': 0.9,
+            'ai_model_id': 1, 'timestamp': time.time()}
+
+
+def per_row_commits(app, rows):
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(rows):
+            # Old per-frame path: look up the product, add one row, commit
+            row = make_row(i)
+            product = Product.query.filter_by(name=row['product_name']).first()
+            db.session.add(Detection(camera_id=row['camera_id'], product_id=product.id, ai_model_id=row['ai_model_id'],
+                                     confidence=row['confidence'], timestamp=datetime.utcfromtimestamp(row['timestamp'])))
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+def write_behind(app, rows, spool_dir, fsync, batch_size):
+    def flush(batch):
+        with app.app_context():
+            mappings, unresolved = Detection.mappings(batch)
+            assert not unresolved, f'{len(unresolved)} rows did not resolve'
+            db.session.bulk_insert_mappings(Detection, mappings)
+            db.session.commit()
+
+    sink = WriteBehindSink(flush, batch_size=batch_size, flush_interval=0.05, max_queue_size=rows + 1,
+                           spool_dir=spool_dir, fsync=fsync, name='bench').start()
+    started = time.perf_counter()
+    for i in range(rows):
+        sink.put(make_row(i))
+    produced = time.perf_counter() - started
+    sink.close(timeout=600)
+    return produced, time.perf_counter() - started
+
+
+def count_rows(app):
+    with app.app_context():
+        return Detection.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--database-url', help='Default: SQLite file in a temporary directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_write_behind_')
+    app = create_app(args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed()
+    spool_dir = os.path.join(workdir, 'spool')
+
+    cases = [
+        ('per-row commit', lambda: per_row_commits(app, args.rows)),
+        ('write-behind, no spool', lambda: write_behind(app, args.rows, None, False, args.batch_size)),
+        ('write-behind + spool', lambda: write_behind(app, args.rows, spool_dir, False, args.batch_size)),
+        ('write-behind + spool fsync', lambda: write_behind(app, args.rows, spool_dir, True, args.batch_size)),
+    ]
+    print(f"{'':<28} {'producer rows/s':>16} {'committed rows/s':>17}")
+    try:
+        for label, run in cases:
+            before = count_rows(app)
+            produced, committed = run()
+            assert count_rows(app) - before == args.rows, f'{label}: rows missing'
+            print(f'{label:<28} {args.rows / produced:>16,.0f} {args.rows / committed:>17,.0f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Load test: /check-auth latency on the Quart server while frames are classified.
+
+Start the server (`python app.py`), then:
+
+    python -m benchmarks.load_check_auth --url http://localhost:5000 --carts 16 --seconds 10
+
+Samples /check-auth latency once with no frame traffic and once while
+`--carts` clients post frames to /predict back to back. With inference off
+the event loop the two p99 figures should stay close.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import time
+
+import aiohttp
+import numpy as np
+from PIL import Image
+
+
+def make_frame(width=640, height=480, quality=80):
+    pixels = (np.random.rand(height, width, 3) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+async def login(session, url, username, password):
+    async with session.post(f'{url}/login', json={'username': username, 'password': password}) as resp:
+        resp.raise_for_status()
+        return (await resp.json())['token']
+
+
+async def sample_check_auth(session, url, token, seconds, interval):
+    latencies = []
+    headers = {'Authorization': f'Bearer {token}'}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        async with session.get(f'{url}/check-auth', headers=headers) as resp:
+            await resp.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def cart_client(session, url, cart_id, frame, stop, counts):
+    while not stop.is_set():
+        async with session.post(f'{url}/predict', json={'cart_id': cart_id, 'image': frame}) as resp:
+            await resp.read()
+            counts[resp.status] = counts.get(resp.status, 0) + 1
+
+
+async def main(args):
+    frame = make_frame()
+    connector = aiohttp.TCPConnector(limit=args.carts + 4)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = await login(session, args.url, args.username, args.password)
+
+        idle = await sample_check_auth(session, args.url, token, args.seconds, args.interval)
+
+        stop = asyncio.Event()
+        counts = {}
+        carts = [asyncio.create_task(cart_client(session, args.url, f'cart_{i:03d}', frame, stop, counts))
+                 for i in range(args.carts)]
+        loaded = await sample_check_auth(session, args.url, token, args.seconds, args.interval)
+        stop.set()
+        await asyncio.gather(*carts, return_exceptions=True)
+
+        async with session.get(f'{args.url}/inference/stats') as resp:
+            stats = await resp.json()
+
+    print(f"{'phase':>8} {'samples':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, latencies in (('idle', idle), ('loaded', loaded)):
+        print(f'{name:>8} {len(latencies):>8} {percentile(latencies, 0.5):>8.2f} {percentile(latencies, 0.99):>8.2f}')
+    print(f'/predict responses by status: {counts}')
+    print(f"pipeline: processed={stats['processed']} dropped={stats['dropped']} "
+          f"batcher throughput={stats['batcher']['throughput_fps']} fps")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--carts', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=0.02, help='Pause between /check-auth samples')
+    parser.add_argument('--username', default='user')
+    parser.add_argument('--password', default='user123')
+    asyncio.run(main(parser.parse_args()))
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from . import db
 
 class Cart(db.Model):
@@ -8,7 +9,9 @@ class Cart(db.Model):
     cart_id = db.Column(db.String(50), unique=True, nullable=False)  # Physical cart identifier
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     status = db.Column(db.String(20), default='inactive')  # inactive, active, completed
+    # Running totals, kept up to date by cart_routes on every add/remove (no re-summing of items)
     total_amount = db.Column(db.Float, default=0.0)
+    item_count = db.Column(db.Integer, default=0, nullable=False)  # Sum of item quantities
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -17,6 +20,16 @@ class Cart(db.Model):
     items = db.relationship('CartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
     detections = db.relationship('Detection', backref='cart_ref', lazy=True)
 
+    @classmethod
+    def with_items(cls):
+        """Cart query that loads items and their products up front for to_dict.
+
+        Any number of carts and lines then serialize in two statements (carts,
+        then items joined to products) instead of one per cart and per line.
+        """
+        from .cart_item import CartItem
+        return cls.query.options(selectinload(cls.items).joinedload(CartItem.product))
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -24,6 +37,7 @@ class Cart(db.Model):
             'user_id': self.user_id,
             'status': self.status,
             'total_amount': self.total_amount,
+            'item_count': self.item_count,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'items': [item.to_dict() for item in self.items]
@@ -1,11 +1,12 @@
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from . import db
 
 class Detection(db.Model):
     __tablename__ = 'detections'
     
     id = db.Column(db.Integer, primary_key=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=True)  # Null for store camera detections, which belong to no cart
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     camera_id = db.Column(db.Integer, db.ForeignKey('cameras.id'), nullable=False)
     ai_model_id = db.Column(db.Integer, db.ForeignKey('ai_models.id'), nullable=False)
@@ -17,6 +18,44 @@ class Detection(db.Model):
     product = db.relationship('Product')
     ai_model = db.relationship('AIModel')
     
+    @classmethod
+    def with_product(cls):
+        """Detection query that joins the product, so to_dict does not load it row by row"""
+        return cls.query.options(joinedload(cls.product))
+
+    @classmethod
+    def mappings(cls, rows):
+        """bulk_insert_mappings rows for queued detections, and the rows that cannot be stored.
+
+        Each row is {'camera_id', 'product_name', 'confidence', 'timestamp'
+        (epoch seconds), 'ai_model_id' (optional)}. Product names resolve to
+        ids in one query; a missing ai_model_id falls back to the active model.
+        Rows naming an unknown product (or with no model) are returned apart.
+        """
+        from .product import Product
+        from .ai_model import AIModel
+        names = {row['product_name'] for row in rows}
+        product_ids = dict(Product.query.with_entities(Product.name, Product.id).filter(Product.name.in_(names)).all())
+        active_model_id = None
+        if any(not row.get('ai_model_id') for row in rows):
+            active = AIModel.query.with_entities(AIModel.id).filter_by(is_active=True).first()
+            active_model_id = active[0] if active else None
+        mappings, unresolved = [], []
+        for row in rows:
+            product_id = product_ids.get(row['product_name'])
+            ai_model_id = row.get('ai_model_id') or active_model_id
+            if product_id is None or ai_model_id is None:
+                unresolved.append(row)
+                continue
+            mappings.append({
+                'camera_id': row['camera_id'],
+                'product_id': product_id,
+                'ai_model_id': ai_model_id,
+                'confidence': row['confidence'],
+                'timestamp': datetime.utcfromtimestamp(row['timestamp'])
+            })
+        return mappings, unresolved
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -3,6 +3,10 @@ from . import db
 
 class Store(db.Model):
     __tablename__ = 'stores'
+    __table_args__ = (
+        # Bounding-box lookups for /store/nearby
+        db.Index('ix_stores_latitude_longitude', 'latitude', 'longitude'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -16,8 +20,17 @@ class Store(db.Model):
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
     # Relationships
-    cameras = db.relationship('Camera', backref='store', lazy=True)
+    cameras = db.relationship('Camera', back_populates='store', lazy=True)
     item_locations = db.relationship('ItemLocation', backref='store', lazy=True)
 
     def __repr__(self):
-        return f'<Store {self.name}>' 
\ No newline at end of file
+        return f'<Store {self.name}>'
+
+    @classmethod
+    def camera_count(cls):
+        """Correlated COUNT of a store's cameras, to select alongside stores with add_columns"""
+        from .camera import Camera
+        return (db.select(db.func.count(Camera.id))
+                .where(Camera.store_id == cls.id)
+                .correlate(cls)
+                .scalar_subquery()) 
\ No newline at end of file
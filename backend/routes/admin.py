@@ -5,9 +5,13 @@ from functools import wraps
 import os
 import json
 from datetime import datetime
+from utils.listing import keyset, list_response, not_modified, table_etag, track_table_versions
+from utils.state_store import get_state_store
 
 admin_bp = Blueprint('admin', __name__)
 
+track_table_versions(get_state_store(), Store, Camera, AIModel, User)
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -46,17 +50,21 @@ def manage_stores():
             'longitude': store.longitude
         }), 201
     
-    # GET method
-    stores = Store.query.all()
-    return jsonify([{
-        'id': s.id,
-        'name': s.name,
-        'address': s.address,
-        'latitude': s.latitude,
-        'longitude': s.longitude,
-        'is_active': s.is_active,
-        'camera_count': len(s.cameras)
-    } for s in stores]), 200
+    # GET method: streamed, ?limit=&after= for keyset pages, ?format=ndjson, ETag
+    etag = table_etag(Store, Camera)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    rows, next_cursor = keyset(Store.query.add_columns(Store.camera_count()), Store.id, key=lambda row: row[0].id)
+    return list_response(rows, lambda row: {
+        'id': row[0].id,
+        'name': row[0].name,
+        'address': row[0].address,
+        'latitude': row[0].latitude,
+        'longitude': row[0].longitude,
+        'is_active': row[0].is_active,
+        'camera_count': row[1]
+    }, etag, next_cursor)
 
 # Camera management
 @admin_bp.route('/cameras', methods=['GET', 'POST'])
@@ -89,21 +97,25 @@ def manage_cameras():
             'status': camera.status
         }), 201
     
-    # GET method
+    # GET method: streamed, ?limit=&after= for keyset pages, ?format=ndjson, ETag
+    etag = table_etag(Camera)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     store_id = request.args.get('store_id')
     query = Camera.query
     if store_id:
         query = query.filter_by(store_id=store_id)
     
-    cameras = query.all()
-    return jsonify([{
+    cameras, next_cursor = keyset(query, Camera.id)
+    return list_response(cameras, lambda c: {
         'id': c.id,
         'store_id': c.store_id,
         'name': c.name,
         'ip_address': c.ip_address,
         'status': c.status,
         'last_seen': c.last_seen.isoformat() if c.last_seen else None
-    } for c in cameras]), 200
+    }, etag, next_cursor)
 
 # AI Model management
 @admin_bp.route('/models', methods=['GET', 'POST'])
@@ -151,15 +163,19 @@ def manage_models():
             'is_active': model.is_active
         }), 201
     
-    # GET method
-    models = AIModel.query.all()
-    return jsonify([{
+    # GET method: streamed, ?limit=&after= for keyset pages, ?format=ndjson, ETag
+    etag = table_etag(AIModel)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    models, next_cursor = keyset(AIModel.query, AIModel.id)
+    return list_response(models, lambda m: {
         'id': m.id,
         'name': m.name,
         'version': m.version,
         'is_active': m.is_active,
         'created_at': m.created_at.isoformat()
-    } for m in models]), 200
+    }, etag, next_cursor)
 
 @admin_bp.route('/models/<int:model_id>/activate', methods=['POST'])
 @jwt_required()
@@ -234,18 +250,20 @@ def get_dashboard():
 @jwt_required()
 @admin_required
 def get_users():
-    """Get all users"""
-    users = User.query.all()
-    return jsonify({
-        'users': [user.to_dict() for user in users]
-    }), 200
+    """Get all users: streamed, ?limit=&after= for keyset pages, ?format=ndjson, ETag"""
+    etag = table_etag(User)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    users, next_cursor = keyset(User.query, User.id)
+    return list_response(users, lambda user: user.to_dict(), etag, next_cursor, wrap='users')
 
 @admin_bp.route('/carts/active', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_active_carts():
     """Get all active carts"""
-    carts = Cart.query.filter_by(status='active').all()
+    carts = Cart.with_items().filter_by(status='active').all()
     return jsonify({
         'carts': [cart.to_dict() for cart in carts]
     }), 200 
\ No newline at end of file
@@ -11,11 +11,16 @@ import tensorflow as tf
 from datetime import datetime
 import json
 import os
+from utils.state_store import get_state_store
+from utils.preprocessing import to_model_input
+from utils.compiled_model import CompiledPredictor
+from utils.tiled_detection import TiledDetector, softmax_labels
+from utils.temporal_voting import CartTracker
 
 camera = Blueprint('camera', __name__)
 
-# Store connected carts and their sessions
-connected_carts = {}
+# Connected carts and their sessions, shared between workers (hash: cart_id -> info)
+state_store = get_state_store()
 
 # Load the product detection model
 try:
@@ -30,6 +35,16 @@ except:
         tf.keras.layers.Dense(10, activation='softmax')
     ])
 
+# Fixed-shape compiled calls instead of model.predict, traced now rather than on the first frame
+model_predictor = CompiledPredictor(model).warmup()
+
+# 'tiled' reports every product in the frame (one batched pass over crops); 'single' classifies the whole frame
+DETECTION_MODE = os.environ.get('DETECTION_MODE', 'single')
+tiled_detector = TiledDetector(softmax_labels(model_predictor.predict), min_confidence=0.7)
+
+# Per-cart moving-average vote so carts hear about confirmed changes, not every frame
+cart_tracker = CartTracker()
+
 # Load product database
 def load_products():
     try:
@@ -81,13 +96,27 @@ def detect_qr_codes(img):
 
 def detect_products(img):
     """Detect products using the trained model"""
+    if DETECTION_MODE == 'tiled':
+        detections = []
+        for hit in tiled_detector.detect(img):
+            product_id = f"product_{hit['label']}"
+            product = get_product_details(product_id)
+            if product:
+                detections.append({
+                    'product_id': product_id,
+                    'name': product['name'],
+                    'price': product['price'],
+                    'confidence': hit['confidence'],
+                    'box': hit['box'],
+                    'detection_type': 'model'
+                })
+        return detections
+
     # Preprocess image
-    img = cv2.resize(img, (224, 224))
-    img = img / 255.0
-    img = np.expand_dims(img, axis=0)
+    img = np.expand_dims(to_model_input(img), axis=0)
     
     # Get predictions
-    predictions = model.predict(img)[0]
+    predictions = model_predictor.predict(img)[0]
     max_pred_idx = np.argmax(predictions)
     confidence = float(predictions[max_pred_idx])
     
@@ -114,10 +143,10 @@ def connect_cart():
     if not cart_id:
         return jsonify({'error': 'Cart ID required'}), 400
     
-    connected_carts[cart_id] = {
-        'connected_at': datetime.now(),
+    state_store.hset('connected_carts', cart_id, {
+        'connected_at': datetime.now().isoformat(),
         'last_detection': None
-    }
+    })
     
     return jsonify({
         'message': f'Cart {cart_id} connected successfully',
@@ -135,21 +164,35 @@ def handle_frame(data):
     # Process frame
     detections = process_frame(image_data)
     
-    if detections:
+    # Vote over frames; only confirmed additions/removals are sent on
+    observations = {}
+    for item in detections:
+        if item['product_id'] not in observations or item['confidence'] > observations[item['product_id']][0]:
+            observations[item['product_id']] = (item['confidence'], item)
+    events = cart_tracker.update(cart_id, observations)
+    # Events carry the detection fields of the product (name, price, box, ...)
+    added = [dict(event, confidence=event['score']) for event in events if event['event'] == 'added']
+    removed = [event['label'] for event in events if event['event'] == 'removed']
+    
+    if added or removed:
         # Emit detection results back to the cart
         emit('cart_update', {
             'cart_id': cart_id,
             'cart_updated': True,
-            'detections': detections,
+            'detections': added,
+            'removed': removed,
             'timestamp': datetime.now().isoformat()
         })
         
         # Update cart's last detection
-        if cart_id in connected_carts:
-            connected_carts[cart_id]['last_detection'] = datetime.now()
+        cart_info = state_store.hget('connected_carts', cart_id)
+        if cart_info is not None:
+            cart_info['last_detection'] = datetime.now().isoformat()
+            state_store.hset('connected_carts', cart_id, cart_info)
             
+    if added:
         # Emit to frontend clients
         emit('product_detected', {
             'cart_id': cart_id,
-            'detections': detections
-        }, broadcast=True) 
\ No newline at end of file
+            'detections': added
+        }, broadcast=True)
@@ -1,9 +1,51 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
 from backend.models import db, Cart, CartItem, Product
 
 cart_bp = Blueprint('cart', __name__)
 
+def _wants_delta():
+    """?delta=1 asks for just the changed line and the new totals instead of the full cart"""
+    return request.args.get('delta', '').lower() in ('1', 'true', 'yes')
+
+def _adjust_totals(cart, amount, quantity):
+    """Apply a change to the cart's running totals in one atomic UPDATE and return the new (total_amount, item_count)
+
+    The increment happens in the database, so concurrent adds to the same cart
+    cannot overwrite each other, and the item list is never loaded. Must be
+    followed by a commit.
+    """
+    Cart.query.filter_by(id=cart.id).update({
+        Cart.total_amount: db.func.coalesce(Cart.total_amount, 0.0) + amount,
+        Cart.item_count: db.func.coalesce(Cart.item_count, 0) + quantity,
+        Cart.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    # Our UPDATE holds the row until commit, so this read sees exactly our result
+    return db.session.query(Cart.total_amount, Cart.item_count).filter_by(id=cart.id).one()
+
+def _recalculate_totals(cart):
+    """Recompute the running totals from the items with one aggregate query (used at checkout)"""
+    total_amount, item_count = db.session.query(
+        db.func.coalesce(db.func.sum(CartItem.price * CartItem.quantity), 0.0),
+        db.func.coalesce(db.func.sum(CartItem.quantity), 0)
+    ).filter(CartItem.cart_id == cart.id).one()
+    cart.total_amount = total_amount
+    cart.item_count = item_count
+
+def _delta_response(cart_id, totals, item=None, removed_item_id=None):
+    total_amount, item_count = totals
+    delta = {
+        'cart_id': cart_id,
+        'total_amount': total_amount,
+        'item_count': item_count
+    }
+    if item is not None:
+        delta['item'] = item
+    if removed_item_id is not None:
+        delta['removed_item_id'] = removed_item_id
+    return jsonify(delta), 200
+
 @cart_bp.route('/api/cart/start', methods=['POST'])
 @jwt_required()
 def start_cart():
@@ -35,7 +77,7 @@ def start_cart():
 @jwt_required()
 def get_cart(cart_id):
     """Get cart details"""
-    cart = Cart.query.filter_by(cart_id=cart_id).first()
+    cart = Cart.with_items().filter_by(cart_id=cart_id).first()
     if not cart:
         return jsonify({'error': 'Cart not found'}), 404
         
@@ -62,7 +104,7 @@ def add_item(cart_id):
         return jsonify({'error': 'Product not found'}), 404
         
     # Check if item already exists in cart
-    cart_item = CartItem.query.filter_by(cart_id=cart.id, product_id=product.id).first()
+    cart_item = CartItem.query.filter_by(cart_id=cart.id, product_id=product.id).with_for_update().first()
     if cart_item:
         cart_item.quantity += data['quantity']
     else:
@@ -73,13 +115,17 @@ def add_item(cart_id):
             price=product.price
         )
         db.session.add(cart_item)
+    cart_item.product = product
     
-    # Update cart total
-    cart.total_amount = sum(item.price * item.quantity for item in cart.items)
+    # Update cart totals by this line's change only
+    totals = _adjust_totals(cart, cart_item.price * data['quantity'], data['quantity'])
+    item = cart_item.to_dict()
     
     db.session.commit()
     
-    return jsonify(cart.to_dict()), 200
+    if _wants_delta():
+        return _delta_response(cart_id, totals, item=item)
+    return jsonify(Cart.with_items().filter_by(cart_id=cart_id).one().to_dict()), 200
 
 @cart_bp.route('/api/cart/<cart_id>/items/<int:item_id>', methods=['DELETE'])
 @jwt_required()
@@ -92,18 +138,20 @@ def remove_item(cart_id, item_id):
     if cart.status != 'active':
         return jsonify({'error': 'Cart is not active'}), 400
         
-    cart_item = CartItem.query.get(item_id)
+    cart_item = CartItem.query.filter_by(id=item_id).with_for_update().first()
     if not cart_item or cart_item.cart_id != cart.id:
         return jsonify({'error': 'Item not found in cart'}), 404
         
     db.session.delete(cart_item)
     
-    # Update cart total
-    cart.total_amount = sum(item.price * item.quantity for item in cart.items)
+    # Update cart totals by the removed line only
+    totals = _adjust_totals(cart, -cart_item.price * cart_item.quantity, -cart_item.quantity)
     
     db.session.commit()
     
-    return jsonify(cart.to_dict()), 200
+    if _wants_delta():
+        return _delta_response(cart_id, totals, removed_item_id=item_id)
+    return jsonify(Cart.with_items().filter_by(cart_id=cart_id).one().to_dict()), 200
 
 @cart_bp.route('/api/cart/<cart_id>/complete', methods=['POST'])
 @jwt_required()
@@ -116,7 +164,9 @@ def complete_cart(cart_id):
     if cart.status != 'active':
         return jsonify({'error': 'Cart is not active'}), 400
         
+    # Checkout charges the authoritative sum, not the running total
+    _recalculate_totals(cart)
     cart.status = 'completed'
     db.session.commit()
     
-    return jsonify(cart.to_dict()), 200 
\ No newline at end of file
+    return jsonify(Cart.with_items().filter_by(cart_id=cart_id).one().to_dict()), 200 
\ No newline at end of file
@@ -7,22 +7,80 @@ import tensorflow as tf
 import json
 from datetime import datetime
 import os
+import time
+import atexit
 from app import socketio
+from utils.batching import MicroBatcher
+from utils.frame_gate import FrameGate, frame_signature
+from utils.preprocessing import decode_image, to_model_input, input_buffers
+from utils.compiled_model import CompiledPredictor
+from utils.tiled_detection import TiledDetector, softmax_labels
+from utils.temporal_voting import CartTracker
+from utils.write_behind import WriteBehindSink
+from utils.capture_manager import CaptureManager
 
 detection_bp = Blueprint('detection', __name__)
 
-# Global variables for model and camera streams
+# Global variables for the model
 model = None
+model_predictor = None
 model_classes = []
-camera_streams = {}
+model_id = None  # AIModel row of the loaded model, recorded on every Detection
+
+def _predict_batch(batch):
+    return model_predictor.predict(batch)
+
+# Frames from every camera share batched forward passes
+detection_batcher = MicroBatcher(_predict_batch, max_batch_size=16, max_wait_ms=5, name='detection')
+
+# 'tiled' finds every product in the frame with one batched pass over crops; 'single' classifies the whole frame
+DETECTION_MODE = os.environ.get('DETECTION_MODE', 'single')
+tiled_detector = TiledDetector(softmax_labels(_predict_batch), min_confidence=0.5)
+
+# Per-camera motion gate: unchanged frames reuse the last detection
+frame_gate = FrameGate()
+
+# Per-camera moving-average vote: a product becomes a Detection row once confirmed, not on every frame
+camera_tracker = CartTracker()
+
+# Detection rows are written behind the frame loop: bulk inserts from a background worker,
+# spooled to disk first (set DETECTION_SPOOL_DIR='' to disable) and replayed after a restart.
+# Rows the database rejects go to detections.dead.jsonl in the spool directory
+DETECTION_SPOOL_DIR = os.environ.get('DETECTION_SPOOL_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'detection_spool'))
+detection_app = None
+
+@detection_bp.record_once
+def _bind_app(state):
+    global detection_app
+    detection_app = state.app
+
+def _insert_detections(rows):
+    with detection_app.app_context():
+        mappings, unresolved = Detection.mappings(rows)
+        if unresolved:
+            detection_sink.dead_letter(unresolved, 'no matching product or AI model')
+        if mappings:
+            db.session.bulk_insert_mappings(Detection, mappings)
+            db.session.commit()
+
+detection_sink = WriteBehindSink(
+    _insert_detections,
+    batch_size=int(os.environ.get('DETECTION_SINK_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('DETECTION_SINK_FLUSH_INTERVAL', 1.0)),
+    spool_dir=DETECTION_SPOOL_DIR or None,
+    name='detections'
+)
+atexit.register(detection_sink.close)
 
 def load_active_model():
     """Load the currently active AI model"""
-    global model, model_classes
+    global model, model_predictor, model_classes, model_id
     active_model = AIModel.query.filter_by(is_active=True).first()
     if active_model and os.path.exists(active_model.file_path):
         model = tf.keras.models.load_model(active_model.file_path)
+        model_predictor = CompiledPredictor(model).warmup()
         model_classes = json.loads(active_model.classes)
+        model_id = active_model.id
         return True
     return False
 
@@ -34,74 +92,102 @@ def process_frame(frame, camera_id):
         if not load_active_model():
             return None
     
-    # Preprocess the frame
-    processed_frame = cv2.resize(frame, (224, 224))  # Adjust size based on your model
-    processed_frame = processed_frame / 255.0  # Normalize
-    processed_frame = np.expand_dims(processed_frame, axis=0)
+    # Skip inference when nothing changed in view; the unchanged frame still votes below
+    signature = frame_signature(frame)
+    result = frame_gate.lookup(camera_id, signature)
+    if result is None:
+        result = classify_frame(frame)
+        # Cache "nothing detected" too, as an empty dict
+        frame_gate.store(camera_id, signature, result)
     
-    # Run inference
-    predictions = model.predict(processed_frame)
-    class_idx = np.argmax(predictions[0])
-    confidence = float(predictions[0][class_idx])
-    
-    if confidence > 0.5:  # Confidence threshold
-        product_name = model_classes[class_idx]
-        
-        # Save detection to database
-        detection = Detection(
-            camera_id=camera_id,
-            product_name=product_name,
-            confidence_score=confidence,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(detection)
-        db.session.commit()
+    # Only confirmed changes are written and emitted, not every frame
+    observations = {}
+    for item in result.get('detections', []):
+        if item['product_name'] not in observations or item['confidence'] > observations[item['product_name']][0]:
+            observations[item['product_name']] = (item['confidence'], {'box': item['box']})
+    events = camera_tracker.update(camera_id, observations)
+    for event in events:
+        if event['event'] == 'added':
+            # Queue the detection for the database; the frame does not wait for the commit
+            detection_sink.put({
+                'camera_id': camera_id,
+                'product_name': event['label'],
+                'confidence': event['score'],
+                'ai_model_id': model_id,
+                'timestamp': time.time()
+            })
         
-        # Emit detection via WebSocket
-        socketio.emit('detection', {
+        # Emit confirmed detections (and removals) via WebSocket
+        socketio.emit('detection' if event['event'] == 'added' else 'detection_removed', {
             'camera_id': camera_id,
-            'product_name': product_name,
-            'confidence': confidence,
-            'timestamp': detection.timestamp.isoformat()
+            'product_name': event['label'],
+            'confidence': event['score'],
+            'box': event.get('box'),
+            'timestamp': datetime.utcnow().isoformat()
         })
+    
+    return result or None
+
+def classify_frame(frame):
+    """Run the model on a frame: {'product_name', 'confidence', 'detections'}, or {} if nothing passes the threshold"""
+    if DETECTION_MODE == 'tiled':
+        hits = [(h['label'], h['confidence'], h['box']) for h in tiled_detector.detect(frame)]
+    else:
+        # Preprocess the frame into a pooled input buffer
+        processed_frame = to_model_input(frame, out=input_buffers.acquire())
         
-        return {
-            'product_name': product_name,
-            'confidence': confidence
-        }
+        # Run inference; the buffer is reused once the batch is done with it
+        future = detection_batcher.submit(processed_frame)
+        input_buffers.release_after(processed_frame, future)
+        predictions = future.result(timeout=30)
+        class_idx = int(np.argmax(predictions))
+        confidence = float(predictions[class_idx])
+        hits = [(class_idx, confidence, None)] if confidence > 0.5 else []  # Confidence threshold
     
-    return None
+    if not hits:
+        return {}
+    detections = [{
+        'product_name': model_classes[class_idx],
+        'confidence': confidence,
+        'box': box
+    } for class_idx, confidence, box in hits]
+    # Best item at the top level as before; every item (with its box in tiled mode) under 'detections'
+    return {
+        'product_name': detections[0]['product_name'],
+        'confidence': detections[0]['confidence'],
+        'detections': detections
+    }
+
+def annotate_frame(frame, detection):
+    """Draw detection results on a frame (boxes in tiled mode, labels otherwise)"""
+    for i, item in enumerate(detection['detections']):
+        text = f"{item['product_name']}: {item['confidence']:.2f}"
+        if item['box']:
+            x0, y0, x1, y1 = item['box']
+            cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 0), 2)
+            cv2.putText(frame, text, (x0 + 5, y0 + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        else:
+            cv2.putText(frame, text, (10, 30 + 35 * i), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+def _process_camera_frame(camera_id, frame):
+    # Runs on the camera's reader thread, outside any request
+    with detection_app.app_context():
+        return process_frame(frame, camera_id)
+
+# One reader per camera runs detection once per frame; every viewer of the camera shares its annotated JPEG
+capture_manager = CaptureManager(
+    _process_camera_frame,
+    annotate_fn=annotate_frame,
+    idle_timeout=float(os.environ.get('CAMERA_IDLE_TIMEOUT', 10))
+)
+atexit.register(capture_manager.stop_all)
 
 def generate_frames(camera_id):
-    """Generate frames for MJPEG stream"""
+    """Generate frames for MJPEG stream from the camera's shared capture"""
     camera = Camera.query.get(camera_id)
     if not camera:
-        return
-    
-    # Initialize video capture
-    cap = cv2.VideoCapture(f'http://{camera.ip_address}/video')
-    
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        
-        # Process frame for detection
-        detection = process_frame(frame, camera_id)
-        
-        # Draw detection results on frame if available
-        if detection:
-            text = f"{detection['product_name']}: {detection['confidence']:.2f}"
-            cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        
-        # Encode frame to JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        
-        # Yield frame for streaming
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        return iter(())
+    return capture_manager.stream(camera_id, f'http://{camera.ip_address}/video')
 
 @detection_bp.route('/video_feed/<int:camera_id>')
 @jwt_required()
@@ -128,8 +214,9 @@ def detect():
     
     # Read and process the image
     file = request.files['image']
-    nparr = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    frame = decode_image(file.read())
+    if frame is None:
+        return jsonify({'error': 'Could not decode image'}), 400
     
     # Process the frame
     result = process_frame(frame, int(camera_id))
@@ -138,6 +225,30 @@ def detect():
         return jsonify(result), 200
     return jsonify({'message': 'No detection above threshold'}), 200
 
+@detection_bp.route('/gate/<int:camera_id>', methods=['GET', 'POST'])
+@jwt_required()
+def camera_frame_gate(camera_id):
+    """Get or update the motion gate settings and skip rate for a camera"""
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        try:
+            frame_gate.configure(camera_id, data.get('threshold'), data.get('max_age'), data.get('enabled'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid frame gate configuration'}), 400
+    return jsonify(frame_gate.stats(camera_id)), 200
+
+@detection_bp.route('/capture', methods=['GET'])
+@jwt_required()
+def capture_stats():
+    """Shared camera readers: viewers, frames processed and frames dropped by slow viewers"""
+    return jsonify(capture_manager.stats()), 200
+
+@detection_bp.route('/sink', methods=['GET'])
+@jwt_required()
+def detection_sink_stats():
+    """Write-behind queue depth, batch sizes and spool state for Detection rows"""
+    return jsonify(detection_sink.stats()), 200
+
 @detection_bp.route('/recent', methods=['GET'])
 @jwt_required()
 def get_recent_detections():
@@ -145,7 +256,7 @@ def get_recent_detections():
     camera_id = request.args.get('camera_id')
     limit = min(int(request.args.get('limit', 10)), 50)  # Max 50 results
     
-    query = Detection.query.order_by(Detection.timestamp.desc())
+    query = Detection.with_product().order_by(Detection.timestamp.desc())
     if camera_id:
         query = query.filter_by(camera_id=camera_id)
     
@@ -154,7 +265,7 @@ def get_recent_detections():
     return jsonify([{
         'id': d.id,
         'camera_id': d.camera_id,
-        'product_name': d.product_name,
-        'confidence_score': d.confidence_score,
+        'product_name': d.product.name,
+        'confidence': d.confidence,
         'timestamp': d.timestamp.isoformat()
     } for d in detections]), 200 
\ No newline at end of file
@@ -1,10 +1,33 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+import heapq
+import os
+import threading
+import time
+from utils.listing import bump_version, list_response, make_etag, not_modified, page_args, version_key
+from utils.search_index import SearchIndex, parse_page
+from utils.state_store import get_state_store
 
 inventory = Blueprint('inventory', __name__)
 
-# In-memory inventory (replace with database in production)
-product_inventory = {}
+# Inventory hash (product_id -> product info), shared between workers
+# (replace with database in production)
+INVENTORY_KEY = 'product_inventory'
+state_store = get_state_store()
+
+# Full-text index of the inventory, kept up to date by this worker's writes
+# and reloaded every INVENTORY_SEARCH_TTL seconds to pick up other workers'
+inventory_search = SearchIndex({'name': 3.0, 'category': 1.5})
+INVENTORY_SEARCH_TTL = float(os.environ.get('INVENTORY_SEARCH_TTL', 60))
+inventory_search_loaded_at = None
+inventory_search_lock = threading.Lock()
+
+def _ensure_inventory_search():
+    global inventory_search_loaded_at
+    with inventory_search_lock:
+        if inventory_search_loaded_at is None or (INVENTORY_SEARCH_TTL and time.monotonic() - inventory_search_loaded_at > INVENTORY_SEARCH_TTL):
+            inventory_search.replace_all(state_store.hgetall(INVENTORY_KEY).items())
+            inventory_search_loaded_at = time.monotonic()
 
 @inventory.route('/add', methods=['POST'])
 def add_product():
@@ -26,62 +49,94 @@ def add_product():
         'image_url': data.get('image_url')
     }
     
-    if product_id in product_inventory:
-        product_inventory[product_id]['quantity'] += product_info['quantity']
-        product_inventory[product_id]['last_updated'] = product_info['last_updated']
-    else:
-        product_inventory[product_id] = product_info
+    def merge(product):
+        if product is None:
+            return product_info
+        product['quantity'] += product_info['quantity']
+        product['last_updated'] = product_info['last_updated']
+        return product
+
+    # Read-modify-write in one atomic step so concurrent adds on other workers are not lost
+    product = state_store.hupdate(INVENTORY_KEY, product_id, merge)
+    bump_version(state_store, INVENTORY_KEY)
+    inventory_search.upsert(product_id, product)
     
     return jsonify({
         'message': 'Product added/updated successfully',
-        'product': product_inventory[product_id]
+        'product': product
     })
 
 @inventory.route('/remove/<product_id>', methods=['POST'])
 def remove_product(product_id):
     """Remove product from inventory"""
-    if product_id not in product_inventory:
-        return jsonify({'error': 'Product not found'}), 404
-        
     quantity = request.json.get('quantity', 1)
-    
-    if product_inventory[product_id]['quantity'] <= quantity:
-        del product_inventory[product_id]
+    found = []
+
+    def take(product):
+        # May be retried, so only the last attempt's view counts
+        found[:] = [] if product is None else [product]
+        if product is None:
+            return None
+        if product['quantity'] <= quantity:
+            return None
+        product['quantity'] -= quantity
+        product['last_updated'] = datetime.now().isoformat()
+        return product
+
+    product = state_store.hupdate(INVENTORY_KEY, product_id, take)
+    if not found:
+        return jsonify({'error': 'Product not found'}), 404
+    bump_version(state_store, INVENTORY_KEY)
+    if product is None:
+        inventory_search.remove(product_id)
         message = 'Product removed from inventory'
     else:
-        product_inventory[product_id]['quantity'] -= quantity
-        product_inventory[product_id]['last_updated'] = datetime.now().isoformat()
         message = 'Product quantity updated'
     
     return jsonify({'message': message})
 
 @inventory.route('/list', methods=['GET'])
 def list_products():
-    """List all products in inventory"""
+    """List all products in inventory: streamed, ?limit=&after= for keyset pages, ?format=ndjson, ETag"""
+    etag = make_etag(state_store.get(version_key(INVENTORY_KEY), 0))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
     category = request.args.get('category')
-    if category:
-        filtered_products = {
-            k: v for k, v in product_inventory.items()
-            if v['category'] == category
-        }
-        return jsonify(filtered_products)
+    products = (
+        (k, v) for k, v in state_store.hscan(INVENTORY_KEY)
+        if not category or v['category'] == category
+    )
+    limit, after = page_args(str)
+    next_cursor = None
+    if limit is not None:
+        # Page in product_id order, holding only limit + 1 products
+        products = heapq.nsmallest(limit + 1, (item for item in products if after is None or str(item[0]) > after),
+                                   key=lambda item: str(item[0]))
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = products[-1][0]
     
-    return jsonify(product_inventory)
+    return list_response(products, lambda item: item, etag, next_cursor, as_object=True)
 
 @inventory.route('/update/<product_id>', methods=['PUT'])
 def update_product(product_id):
     """Update product information"""
-    if product_id not in product_inventory:
+    product = state_store.hget(INVENTORY_KEY, product_id)
+    if product is None:
         return jsonify({'error': 'Product not found'}), 404
         
     data = request.json
-    product = product_inventory[product_id]
     
     for key, value in data.items():
         if key in product and key != 'product_id':
             product[key] = value
     
     product['last_updated'] = datetime.now().isoformat()
+    state_store.hset(INVENTORY_KEY, product_id, product)
+    bump_version(state_store, INVENTORY_KEY)
+    inventory_search.upsert(product_id, product)
     
     return jsonify({
         'message': 'Product updated successfully',
@@ -90,23 +145,41 @@ def update_product(product_id):
 
 @inventory.route('/search', methods=['GET'])
 def search_products():
-    """Search products by name or category"""
-    query = request.args.get('q', '').lower()
+    """Search products by name or category (prefix and typo tolerant).
+
+    Returns {product_id: product} for every match, as always; ?limit=&offset=
+    page the matches. ?ranked=1 returns a list of products (with product_id),
+    best match first, one page of ?limit= (default 20) at a time.
+    """
+    query = request.args.get('q', '').strip()
     
     if not query:
         return jsonify({'error': 'Search query required'}), 400
-        
-    results = {
-        k: v for k, v in product_inventory.items()
-        if query in v['name'].lower() or query in v['category'].lower()
-    }
     
-    return jsonify(results)
+    _ensure_inventory_search()
+    ranked = request.args.get('ranked') in ('1', 'true')
+    if ranked or 'limit' in request.args:
+        limit, offset = parse_page(request.args)
+    else:
+        limit, offset = max(len(inventory_search), 1), 0
+    total, page = inventory_search.search(query, limit=limit, offset=offset)
+    
+    # Only the matches are read back from the store
+    results = []
+    for product_id, score in page:
+        product = state_store.hget(INVENTORY_KEY, product_id)
+        if product is not None:
+            results.append((product_id, product))
+    
+    if ranked:
+        return jsonify([dict(product, product_id=product_id) for product_id, product in results]), 200, {'X-Total-Count': str(total)}
+    return jsonify(dict(results)), 200, {'X-Total-Count': str(total)}
 
 @inventory.route('/<product_id>', methods=['GET'])
 def get_product(product_id):
     """Get specific product details"""
-    if product_id not in product_inventory:
+    product = state_store.hget(INVENTORY_KEY, product_id)
+    if product is None:
         return jsonify({'error': 'Product not found'}), 404
         
-    return jsonify(product_inventory[product_id]) 
\ No newline at end of file
+    return jsonify(product)
\ No newline at end of file
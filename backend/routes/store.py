@@ -1,23 +1,180 @@
+import logging
+import math
+import os
+import threading
+import time
+
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Store, Item, ItemLocation, db, Product, Category
-from math import radians, sin, cos, sqrt, atan2
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, selectinload
+
+from utils.geo_index import GeoIndex, bounding_box, haversine_km
+from utils.listing import keyset, list_response, not_modified, table_etag, track_table_versions
+from utils.search_index import SearchIndex, parse_page
+from utils.state_store import get_state_store
+
+logger = logging.getLogger(__name__)
 
 store_bp = Blueprint('store', __name__)
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    distance = R * c
-    
-    return distance
+track_table_versions(get_state_store(), Product, Category)
+
+# 'memory' answers /nearby from an in-process grid index of active stores;
+# 'sql' runs a bounding-box query on the (latitude, longitude) index instead
+STORE_GEO_INDEX = os.environ.get('STORE_GEO_INDEX', 'memory')
+# Full reload interval, for stores changed by other processes or bulk UPDATEs
+STORE_GEO_INDEX_TTL = float(os.environ.get('STORE_GEO_INDEX_TTL', 300))
+STORE_ID_CHUNK = 500
+# Full reload interval of the search indexes, like STORE_GEO_INDEX_TTL
+SEARCH_INDEX_TTL = float(os.environ.get('SEARCH_INDEX_TTL', 300))
+
+store_index = GeoIndex(cell_deg=float(os.environ.get('STORE_GEO_CELL_DEG', 0.1)))
+store_index_loaded_at = None
+store_index_lock = threading.Lock()
+
+def load_store_index():
+    """(Re)load the grid index with every active store"""
+    global store_index_loaded_at
+    rows = Store.query.with_entities(Store.id, Store.latitude, Store.longitude).filter(Store.is_active.is_(True)).all()
+    store_index.replace_all(rows)
+    store_index_loaded_at = time.monotonic()
+    logger.info(f'[Store] Loaded {len(rows)} active stores into the geo index')
+
+def _ensure_store_index():
+    with store_index_lock:
+        if store_index_loaded_at is None or (STORE_GEO_INDEX_TTL and time.monotonic() - store_index_loaded_at > STORE_GEO_INDEX_TTL):
+            load_store_index()
+
+def _item_document(item):
+    return {'name': item.name, 'category': item.category, 'description': item.description}
+
+def _store_document(store):
+    return {'name': store.name, 'address': store.address}
+
+def _product_document(product):
+    return {'name': product.name, 'category': product.category, 'description': product.description}
+
+# Full-text indexes per model: (index, document builder, rows it holds)
+search_indexes = {
+    Item: (SearchIndex({'name': 3.0, 'category': 1.5, 'description': 1.0}), _item_document, lambda: Item.query),
+    Store: (SearchIndex({'name': 3.0, 'address': 1.0}), _store_document, lambda: Store.query.filter(Store.is_active.is_(True))),
+    Product: (SearchIndex({'name': 3.0, 'category': 1.5, 'description': 1.0}), _product_document, lambda: Product.query),
+}
+search_loaded_at = {}
+# Guards the references in search_indexes and the change logs below; held only to swap or log
+search_lock = threading.Lock()
+# One reload at a time, built outside search_lock so searches keep using the old index
+search_reload_lock = threading.Lock()
+# model -> changes committed while its replacement index is being built
+search_missed_changes = {}
+
+def load_search_index(model):
+    """(Re)load a model's full-text index from the database and swap it in"""
+    index, document, rows = search_indexes[model]
+    with search_lock:
+        search_missed_changes[model] = []
+    try:
+        fresh = SearchIndex(index.fields, index.min_prefix, index.max_expansions)
+        objs = rows().all()
+        fresh.replace_all((obj.id, document(obj)) for obj in objs)
+    except Exception:
+        with search_lock:
+            search_missed_changes.pop(model, None)
+        raise
+    with search_lock:
+        # Commits that landed after the query went to the old index; replay them
+        for obj_id, value in search_missed_changes.pop(model):
+            if value is None:
+                fresh.remove(obj_id)
+            else:
+                fresh.upsert(obj_id, value)
+        search_indexes[model] = (fresh, document, rows)
+        search_loaded_at[model] = time.monotonic()
+    logger.info(f'[Store] Loaded {len(objs)} {model.__tablename__} into the search index')
+
+def _search_stale(model):
+    loaded_at = search_loaded_at.get(model)
+    return loaded_at is None or (SEARCH_INDEX_TTL and time.monotonic() - loaded_at > SEARCH_INDEX_TTL)
+
+def _search_index(model):
+    if _search_stale(model):
+        # A stale index keeps serving while another request rebuilds it; a missing one is waited for
+        if search_reload_lock.acquire(blocking=model not in search_loaded_at):
+            try:
+                if _search_stale(model):
+                    load_search_index(model)
+            finally:
+                search_reload_lock.release()
+    return search_indexes[model][0]
+
+@event.listens_for(Session, 'after_flush')
+def _collect_index_changes(session, flush_context):
+    """Remember flushed Store/Item/Product changes; they reach the indexes only if the transaction commits"""
+    for obj in session.new | session.dirty | session.deleted:
+        model = type(obj)
+        if model not in search_indexes:
+            continue
+        changes = session.info.setdefault('index_changes', {})
+        active = obj not in session.deleted and (model is not Store or obj.is_active is not False)
+        # Documents are built now; attributes are expired after the commit
+        changes[model, obj.id] = search_indexes[model][1](obj) if active else None
+        if model is Store:
+            changes['geo', obj.id] = (obj.latitude, obj.longitude) if active else None
+
+@event.listens_for(Session, 'after_commit')
+def _apply_index_changes(session):
+    changes = session.info.pop('index_changes', None)
+    if not changes:
+        return
+    for (kind, obj_id), value in changes.items():
+        if kind == 'geo':
+            if store_index_loaded_at is None:
+                continue
+            if value is None:
+                store_index.remove(obj_id)
+            else:
+                store_index.upsert(obj_id, *value)
+        elif kind in search_loaded_at or kind in search_missed_changes:
+            with search_lock:
+                index = search_indexes[kind][0]
+                if kind in search_missed_changes:
+                    search_missed_changes[kind].append((obj_id, value))
+            if value is None:
+                index.remove(obj_id)
+            else:
+                index.upsert(obj_id, value)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_index_changes(session):
+    session.info.pop('index_changes', None)
+
+def _nearby_from_index(lat, lon, radius):
+    _ensure_store_index()
+    ids, distances = store_index.query(lat, lon, radius)
+    ids, distances = ids.tolist(), distances.tolist()
+    rows = {}
+    for start in range(0, len(ids), STORE_ID_CHUNK):
+        chunk = ids[start:start + STORE_ID_CHUNK]
+        for store, camera_count in (Store.query.add_columns(Store.camera_count())
+                                    .filter(Store.id.in_(chunk), Store.is_active.is_(True)).all()):
+            rows[store.id] = (store, camera_count)
+    return [rows[i] + (d,) for i, d in zip(ids, distances) if i in rows]
+
+def _nearby_from_bounding_box(lat, lon, radius):
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius)
+    rows = Store.query.add_columns(Store.camera_count()).filter(
+        Store.is_active.is_(True),
+        Store.latitude.between(min_lat, max_lat),
+        or_(*[Store.longitude.between(lo, hi) for lo, hi in lon_ranges])
+    ).all()
+    if not rows:
+        return []
+    distances = haversine_km(lat, lon, [s.latitude for s, _ in rows], [s.longitude for s, _ in rows]).tolist()
+    nearby = [(s, count, d) for (s, count), d in zip(rows, distances) if d <= radius]
+    nearby.sort(key=lambda row: row[2])
+    return nearby
 
 @store_bp.route('/nearby', methods=['GET'])
 def find_nearby_stores():
@@ -26,41 +183,59 @@ def find_nearby_stores():
         lat = float(request.args.get('latitude'))
         lon = float(request.args.get('longitude'))
         radius = float(request.args.get('radius', 10))  # Default 10km radius
+        if not all(map(math.isfinite, (lat, lon, radius))) or radius < 0:
+            raise ValueError('Coordinates and radius must be finite')
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid coordinates or radius'}), 400
     
-    stores = Store.query.filter_by(is_active=True).all()
+    # Nearest first
+    if STORE_GEO_INDEX == 'sql':
+        nearby = _nearby_from_bounding_box(lat, lon, radius)
+    else:
+        nearby = _nearby_from_index(lat, lon, radius)
     
-    nearby_stores = []
-    for store in stores:
-        distance = calculate_distance(lat, lon, store.latitude, store.longitude)
-        if distance <= radius:
-            nearby_stores.append({
-                'id': store.id,
-                'name': store.name,
-                'address': store.address,
-                'latitude': store.latitude,
-                'longitude': store.longitude,
-                'distance': round(distance, 2),
-                'camera_count': len(store.cameras)
-            })
-    
-    # Sort by distance
-    nearby_stores.sort(key=lambda x: x['distance'])
-    
-    return jsonify(nearby_stores), 200
+    return jsonify([{
+        'id': store.id,
+        'name': store.name,
+        'address': store.address,
+        'latitude': store.latitude,
+        'longitude': store.longitude,
+        'distance': round(distance, 2),
+        'camera_count': camera_count
+    } for store, camera_count, distance in nearby]), 200
+
+@store_bp.route('/nearby/index', methods=['GET'])
+def nearby_index_stats():
+    """Geo index size and age"""
+    return jsonify(dict(
+        store_index.stats(),
+        mode=STORE_GEO_INDEX,
+        age_s=round(time.monotonic() - store_index_loaded_at, 1) if store_index_loaded_at is not None else None
+    )), 200
+
+def _search_page(model, where=None):
+    """Ranked ids of one page of ?q= matches and the total, or None without a query"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return None
+    limit, offset = parse_page(request.args)
+    total, page = _search_index(model).search(query, limit=limit, offset=offset, where=where)
+    return [doc_id for doc_id, _ in page], total
+
+def _in_order(ids, rows, key=lambda row: row.id):
+    """`rows` sorted like `ids`, skipping ids without a row"""
+    by_id = {key(row): row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
 
 @store_bp.route('/search', methods=['GET'])
 def search_stores():
-    """Search stores by name or address"""
-    query = request.args.get('q', '').lower()
-    if not query:
+    """Search stores by name or address (prefix and typo tolerant, ranked, ?limit=&offset=)"""
+    result = _search_page(Store)
+    if result is None:
         return jsonify({'error': 'Search query required'}), 400
+    ids, total = result
     
-    stores = Store.query.filter(
-        (Store.name.ilike(f'%{query}%') | Store.address.ilike(f'%{query}%')) &
-        Store.is_active.is_(True)
-    ).all()
+    rows = Store.query.add_columns(Store.camera_count()).filter(Store.id.in_(ids), Store.is_active.is_(True)).all() if ids else []
     
     return jsonify([{
         'id': s.id,
@@ -68,8 +243,8 @@ def search_stores():
         'address': s.address,
         'latitude': s.latitude,
         'longitude': s.longitude,
-        'camera_count': len(s.cameras)
-    } for s in stores]), 200
+        'camera_count': camera_count
+    } for s, camera_count in _in_order(ids, rows, key=lambda row: row[0].id)]), 200, {'X-Total-Count': str(total)}
 
 @store_bp.route('/<int:store_id>', methods=['GET'])
 def get_store_details(store_id):
@@ -96,33 +271,30 @@ def get_store_details(store_id):
 @store_bp.route('/items/search', methods=['GET'])
 @jwt_required()
 def search_items():
-    query = request.args.get('q', '').strip()
     store_id = request.args.get('store_id')
     
-    if not query:
-        return jsonify({'error': 'Search query is required'}), 400
-    
-    # Base query for items
-    items_query = Item.query
-    
-    # Apply search filter
-    search_filter = Item.name.ilike(f'%{query}%')
-    items_query = items_query.filter(search_filter)
-    
     # If store_id is provided, only show items available in that store
+    where = None
     if store_id:
-        items_query = items_query.join(ItemLocation).filter(ItemLocation.store_id == store_id)
+        in_store = {item_id for (item_id,) in ItemLocation.query.with_entities(ItemLocation.item_id).filter_by(store_id=store_id)}
+        where = in_store.__contains__
     
-    items = items_query.all()
+    result = _search_page(Item, where)
+    if result is None:
+        return jsonify({'error': 'Search query is required'}), 400
+    ids, total = result
+    
+    # Locations and their stores are loaded in one extra statement
+    items = _in_order(ids, Item.query.options(selectinload(Item.locations).joinedload(ItemLocation.store))
+                      .filter(Item.id.in_(ids)).all() if ids else [])
     
     results = []
     for item in items:
         locations = []
         for loc in item.locations:
-            store = Store.query.get(loc.store_id)
             locations.append({
                 'store_id': loc.store_id,
-                'store_name': store.name,
+                'store_name': loc.store.name,
                 'aisle_number': loc.aisle_number,
                 'shelf_number': loc.shelf_number,
                 'section': loc.section,
@@ -142,7 +314,7 @@ def search_items():
             'locations': locations
         })
     
-    return jsonify(results)
+    return jsonify(results), 200, {'X-Total-Count': str(total)}
 
 @store_bp.route('/items/<int:item_id>/location', methods=['GET'])
 @jwt_required()
@@ -185,28 +357,63 @@ def get_item_location(item_id):
         }
     })
 
+def _product_dict(p):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'description': p.description,
+        'price': float(p.price),
+        'category': p.category,
+        'image_url': p.image_url
+    }
+
 @store_bp.route('/products', methods=['GET'])
 def get_products():
+    """All products, streamed; ?limit=&after= for keyset pages, ?format=ndjson, ETag"""
     try:
-        products = Product.query.all()
-        return jsonify([{
-            'id': p.id,
-            'name': p.name,
-            'description': p.description,
-            'price': float(p.price),
-            'category': p.category,
-            'image_url': p.image_url
-        } for p in products]), 200
+        etag = table_etag(Product)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        products, next_cursor = keyset(Product.query, Product.id)
+        return list_response(products, _product_dict, etag, next_cursor)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@store_bp.route('/products/search', methods=['GET'])
+def search_products():
+    """Search products by name, category or description (prefix and typo tolerant, ranked, ?limit=&offset=)"""
+    result = _search_page(Product)
+    if result is None:
+        return jsonify({'error': 'Search query required'}), 400
+    ids, total = result
+    
+    products = _in_order(ids, Product.query.filter(Product.id.in_(ids)).all() if ids else [])
+    return jsonify([_product_dict(p) for p in products]), 200, {'X-Total-Count': str(total)}
+
+@store_bp.route('/search/index', methods=['GET'])
+def search_index_stats():
+    """Full-text index sizes and ages"""
+    now = time.monotonic()
+    return jsonify({
+        model.__tablename__: dict(
+            index.stats(),
+            age_s=round(now - search_loaded_at[model], 1) if model in search_loaded_at else None
+        ) for model, (index, _, _) in search_indexes.items()
+    }), 200
+
 @store_bp.route('/categories', methods=['GET'])
 def get_categories():
+    """All categories, streamed; ?limit=&after= for keyset pages, ?format=ndjson, ETag"""
     try:
-        categories = Category.query.all()
-        return jsonify([{
+        etag = table_etag(Category)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        categories, next_cursor = keyset(Category.query, Category.id)
+        return list_response(categories, lambda c: {
             'id': c.id,
             'name': c.name
-        } for c in categories]), 200
+        }, etag, next_cursor)
     except Exception as e:
         return jsonify({'error': str(e)}), 500 
\ No newline at end of file
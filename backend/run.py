@@ -7,15 +7,13 @@ import eventlet
 # eventlet.patcher.monkey_patch_all(socket=True, select=True, time=True, thread=True, os=True)
 
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 import datetime
 import logging
-from collections import defaultdict
 import time
 import base64
-import cv2
 import numpy as np
 from PIL import Image
 import io
@@ -24,8 +22,20 @@ import sys
 import os
 import json
 import threading
-import requests
 from dotenv import load_dotenv
+from utils.model_registry import product_model_registry, MODEL_WEIGHTS_DIR
+from utils.batching import MicroBatcher
+from utils.frame_protocol import FrameProtocolError, parse_chunk
+from utils.reassembly import FrameReassembler
+from utils.frame_gate import FrameGate, frame_signature, dhash
+from utils.connection_index import ConnectionIndex, cart_room, camera_room
+from utils.state_store import get_state_store, socketio_message_queue
+from utils.prediction_store import PredictionStore
+from utils.remote_classifier import RemoteClassifier, DEFAULT_API_URL
+from utils.preprocessing import decode_image, to_model_input, preprocess_batch, input_buffers
+from utils.embedding_index import EmbeddingIndex, model_name
+from utils.tiled_detection import TiledDetector, softmax_labels
+from utils.temporal_voting import CartTracker
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
@@ -51,9 +61,14 @@ app = Flask(__name__)
 CORS(app)
 
 # Connection management
-active_connections = {}
-cart_connections = defaultdict(set)
-connection_attempts = defaultdict(lambda: {"count": 0, "last_attempt": 0})
+# Shared across workers when STATE_STORE_URL points at Redis
+state_store = get_state_store()
+
+# sid -> connection info for this worker, plus per-cart browser/ESP32 sid sets; in the
+# store a sid counts until CONNECTION_TTL seconds after this worker last refreshed it
+CONNECTION_TTL = 60
+connection_index = ConnectionIndex(store=state_store, ttl=CONNECTION_TTL)
+active_connections = connection_index.connections
 
 # Rate limiting configuration
 RATE_LIMIT_WINDOW = 300
@@ -65,6 +80,7 @@ socketio = SocketIO(
     app,
     cors_allowed_origins="*",
     async_mode='eventlet',
+    message_queue=socketio_message_queue(),
     logger=True,
     engineio_logger=True,
     ping_timeout=120,
@@ -85,34 +101,53 @@ socketio = SocketIO(
 )
 
 def notify_browser_clients(cart_id, event, data):
-    browser_sids = [sid for sid, conn in active_connections.items()
-                   if conn['cart_id'] == cart_id and conn['type'] == 'browser']
+    # Browsers of a cart share the cart room; ESP32s are kept out of it
     data.update({
         'cart_id': cart_id,
         'timestamp': datetime.datetime.now().isoformat()
     })
-    for browser_sid in browser_sids:
-        socketio.emit(event, data, room=browser_sid)
+    socketio.emit(event, data, room=cart_room(cart_id))
+
+# Chunked frames from every cart, keyed by (cart_id, frame_seq)
+frame_reassembler = FrameReassembler()
+# Frame numbering for esp32_frame senders that carry no frame_seq (the firmware
+# sends only chunk/final): cart_id -> {'seq', 'seen' chunk indexes, 'next' index}
+legacy_frames = {}
+JPEG_BASE64_START = '/9j/'  # base64 of the JPEG start-of-image marker
+
+def legacy_frame_position(cart_id, chunk_index):
+    """(frame_seq, chunk_index) for a chunk without frame_seq.
+
+    Chunk 0, or an index already seen in the current frame, starts a new
+    frame; chunks without an index are numbered in arrival order.
+    """
+    state = legacy_frames.setdefault(cart_id, {'seq': 0, 'seen': set(), 'next': 0})
+    if chunk_index is None:
+        chunk_index = state['next']
+    if chunk_index == 0 or chunk_index in state['seen']:
+        state['seq'] += 1
+        state['seen'] = set()
+    state['seen'].add(chunk_index)
+    state['next'] = chunk_index + 1
+    return state['seq'], chunk_index
 
-frame_buffers = defaultdict(lambda: {
-    'buffer': '',
-    'last_chunk': -1,
-    'timestamp': time.time(),
-    'chunks_received': 0,
-    'total_chunks': 0
-})
+def end_legacy_frame(cart_id):
+    # The next chunk without an index is chunk 0 of a new frame
+    state = legacy_frames.get(cart_id)
+    if state is not None:
+        state['next'] = 0
 
 def can_connect(cart_id):
     now = time.time()
-    cart_data = connection_attempts[cart_id]
+    cart_data = state_store.hget('connection_attempts', cart_id, {"count": 0, "last_attempt": 0})
     if now - cart_data["last_attempt"] > RATE_LIMIT_WINDOW:
         cart_data["count"] = 0
     if now - cart_data["last_attempt"] < RECONNECTION_COOLDOWN:
         return False
-    if len(cart_connections[cart_id]) >= MAX_CONNECTIONS_PER_CART:
-        return False
+    # The per-cart connection limit is enforced atomically by connection_index.add
     cart_data["count"] += 1
     cart_data["last_attempt"] = now
+    state_store.hset('connection_attempts', cart_id, cart_data)
     return True
 
 @app.route('/')
@@ -124,53 +159,109 @@ os.makedirs(RECEIVED_IMAGE_DIR, exist_ok=True)
 latest_image_path = os.path.join(RECEIVED_IMAGE_DIR, 'latest.jpg')
 latest_image_lock = threading.Lock()
 
-# Store the latest prediction result
-default_prediction = {'product_id': None, 'product_name': None, 'confidence': None, 'cart_id': None}
-latest_prediction = default_prediction.copy()
-latest_prediction_lock = threading.Lock()
-
-def call_gemini_api(image_b64):
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
-        logger.error('GEMINI_API_KEY not set!')
-        return None
-    # Use the new Gemini model endpoint
-    url = 'https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key=' + api_key
-    headers = {'Content-Type': 'application/json'}
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": "What product is in this image?think only about products in any shopping store or grocery items  Return a JSON with product_name and confidence (0-1)."},
-                    {"inlineData": {"mimeType": "image/jpeg", "data": image_b64}}
-                ]
-            }
-        ]
-    }
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=8)
-        logger.info(f'[Gemini API] Status: {resp.status_code}, Response: {resp.text}')
-        resp.raise_for_status()
-        data = resp.json()
-        # Parse Gemini response for product_name and confidence
-        text = data['candidates'][0]['content']['parts'][0]['text']
-        import re, json as pyjson
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            result = pyjson.loads(match.group(0))
-            return {
-                'product_name': result.get('product_name'),
-                'confidence': float(result.get('confidence', 0)),
-                'source': 'gemini'
-            }
-        else:
-            logger.error(f'[Gemini API] No JSON found in response text: {text}')
-    except Exception as e:
-        logger.error(f'Gemini API error: {e}')
+# Frames from all carts share batched forward passes of the product model
+product_batcher = MicroBatcher(product_model_registry.predict, max_batch_size=16, max_wait_ms=5, name='product')
+
+# Embedding mode: match the model's pooled features against reference embeddings of each
+# catalog product (cosine similarity) instead of using the softmax head
+CLASSIFIER_MODE = os.environ.get('CLASSIFIER_MODE', 'softmax')
+EMBEDDING_INDEX_PATH = os.environ.get('EMBEDDING_INDEX_PATH', os.path.join(MODEL_WEIGHTS_DIR, 'product_embeddings.npz'))
+EMBEDDING_MIN_SIMILARITY = float(os.environ.get('EMBEDDING_MIN_SIMILARITY', 0.6))
+embedding_batcher = MicroBatcher(product_model_registry.embed, max_batch_size=16, max_wait_ms=5, name='embedding')
+embedding_index = EmbeddingIndex.load(EMBEDDING_INDEX_PATH) if os.path.exists(EMBEDDING_INDEX_PATH) else None
+embedding_index_lock = threading.Lock()
+
+def embeddings_unavailable(loaded_model=None):
+    """Why embedding mode cannot serve the current model (None if it can)"""
+    if embedding_index is None or len(embedding_index) == 0:
+        return 'no reference embeddings'
+    loaded_model = loaded_model or product_model_registry.get()
+    if not loaded_model.can_embed:
+        return f'the {loaded_model.backend} model cannot compute embeddings'
+    if embedding_index.model is not None and embedding_index.model != model_name(loaded_model.model_path):
+        # Features of a different model are not comparable: the references must be rebuilt
+        return f'reference embeddings were built with {embedding_index.model}'
     return None
 
-def async_gemini_update(image_b64, cart_id, confidence_local):
-    gemini_result = call_gemini_api(image_b64)
+def use_embeddings(loaded_model=None):
+    # Falls back to the softmax head whenever the embeddings do not fit the served model
+    return CLASSIFIER_MODE == 'embedding' and embeddings_unavailable(loaded_model) is None
+
+# Detection mode: 'tiled' scores a pyramid of crops in one batched pass and reports every product
+# in the frame (with boxes) under 'detections'; 'single' classifies the whole frame
+DETECTION_MODE = os.environ.get('DETECTION_MODE', 'single')
+DETECTION_MIN_CONFIDENCE = float(os.environ.get('DETECTION_MIN_CONFIDENCE', 0.7))
+
+def embedding_labels(batch):
+    matches = embedding_index.search(product_model_registry.embed(batch))
+    return [m[0][0] for m in matches], [m[0][2] for m in matches]
+
+softmax_detector = TiledDetector(softmax_labels(product_model_registry.predict), min_confidence=DETECTION_MIN_CONFIDENCE)
+embedding_detector = TiledDetector(embedding_labels, min_confidence=EMBEDDING_MIN_SIMILARITY)
+
+def detect_products(img, embedding_mode):
+    """All products in a BGR frame as dicts with product_id, product_name, confidence and box"""
+    if embedding_mode:
+        products = embedding_index.products()
+        return [{
+            'product_id': d['label'],
+            'product_name': products.get(d['label'], {}).get('name'),
+            'confidence': d['confidence'],
+            'box': d['box']
+        } for d in embedding_detector.detect(img)]
+    loaded_model = product_model_registry.get()
+    return [{
+        'product_id': d['label'],
+        'product_name': loaded_model.label(d['label']),
+        'confidence': d['confidence'],
+        'box': d['box']
+    } for d in softmax_detector.detect(img)]
+
+# Static baskets reuse the previous prediction instead of re-running the model
+frame_gate = FrameGate(threshold=float(os.environ.get('FRAME_GATE_THRESHOLD', 0.02)))
+
+# Latest prediction and recent history per cart
+PREDICTION_MAX_AGE = 3600
+prediction_store = PredictionStore(
+    history_size=int(os.environ.get('PREDICTION_HISTORY_SIZE', 32)),
+    shared_store=state_store if state_store.shared else None,
+    ttl=PREDICTION_MAX_AGE
+)
+# Long-poll and SSE waiters are woken by other workers' records instead of polling the store
+prediction_store.subscribe()
+
+# Per-cart moving-average vote over frames: clients get confirmed item added/removed
+# events instead of every frame's (flickering) label
+cart_tracker = CartTracker(
+    alpha=float(os.environ.get('TRACKER_ALPHA', 0.2)),
+    add_threshold=float(os.environ.get('TRACKER_ADD_THRESHOLD', 0.5)),
+    remove_threshold=float(os.environ.get('TRACKER_REMOVE_THRESHOLD', 0.2))
+)
+
+def track_prediction(cart_id, result):
+    """Feed one frame's result to the cart tracker and notify the cart's browsers of confirmed changes"""
+    detections = result.get('detections')
+    if detections is None:
+        detections = [result]
+    observations = {}
+    for d in detections:
+        if d['product_id'] is None:
+            continue
+        # Several identical items in one frame still vote once
+        if d['product_id'] not in observations or d['confidence'] > observations[d['product_id']][0]:
+            observations[d['product_id']] = (d['confidence'], {'product_id': d['product_id'], 'product_name': d['product_name']})
+    for event in cart_tracker.update(cart_id, observations):
+        logger.info(f"[CartTracker] Cart {cart_id}: {event['event']} {event['product_name']} (score {event['score']:.2f})")
+        notify_browser_clients(cart_id, f"cart_item_{event['event']}", event)
+
+def record_prediction(cart_id, result, source, started):
+    """Track and store a frame's result; the stored and returned copy carries the cart's confirmed items"""
+    track_prediction(cart_id, result)
+    result = dict(result, cart_items=cart_tracker.items(cart_id))
+    prediction_store.record(cart_id, result, source, latency_ms=(time.perf_counter() - started) * 1000)
+    return result
+
+def apply_remote_result(cart_id, gemini_result, confidence_local, latency_ms):
     if gemini_result and gemini_result['confidence'] > confidence_local:
         best_result = {
             'cart_id': cart_id,
@@ -179,10 +270,78 @@ def async_gemini_update(image_b64, cart_id, confidence_local):
             'confidence': gemini_result['confidence']
             # 'source' removed
         }
-        with latest_prediction_lock:
-            latest_prediction.update(best_result)
+        prediction_store.record(cart_id, best_result, 'gemini', latency_ms=latency_ms)
         logger.info(f"[Async Gemini] Updated prediction: {best_result['product_name']} | Confidence: {best_result['confidence']:.3f} | Source: gemini")
 
+# Gemini fallback for low-confidence frames: bounded pool, rate limited, coalesced per cart, cached by image hash
+remote_classifier = RemoteClassifier(
+    api_key=os.environ.get('GEMINI_API_KEY'),
+    api_url=os.environ.get('GEMINI_API_URL', DEFAULT_API_URL),
+    callback=apply_remote_result,
+    workers=int(os.environ.get('GEMINI_WORKERS', 2)),
+    rate=float(os.environ.get('GEMINI_RATE_PER_SEC', 1.0)),
+    burst=int(os.environ.get('GEMINI_BURST', 3)),
+    confidence_threshold=float(os.environ.get('GEMINI_CONFIDENCE_THRESHOLD', 0.85))
+)
+if not remote_classifier.api_key:
+    logger.error('GEMINI_API_KEY not set!')
+
+def classify_image(img, cart_id):
+    """Run the local product model on a decoded BGR frame (see decode_image) and store the result.
+
+    Frames nearly identical to the cart's last classified frame skip the model
+    and return that frame's prediction with 'cached': True.
+    """
+    started = time.perf_counter()
+    signature = frame_signature(img)
+    cached = frame_gate.lookup(cart_id, signature)
+    if cached is not None:
+        # Static frames keep voting for what they show
+        return dict(record_prediction(cart_id, cached, 'cache', started), cached=True)
+    # One model serves the frame end to end, even if a reload lands while it is queued
+    loaded_model = product_model_registry.get()
+    embedding_mode = use_embeddings(loaded_model)
+    if DETECTION_MODE == 'tiled':
+        detections = detect_products(img, embedding_mode)
+        best = detections[0] if detections else {'product_id': None, 'product_name': 'Unknown or Not Recognized', 'confidence': 0.0}
+        local_result = {
+            'cart_id': cart_id,
+            'product_id': best['product_id'],
+            'product_name': best['product_name'],
+            'confidence': best['confidence'],
+            'detections': detections
+        }
+        frame_gate.store(cart_id, signature, local_result)
+        return record_prediction(cart_id, local_result, 'tiled', started)
+    model_input = to_model_input(img, out=input_buffers.acquire())
+    future = (embedding_batcher if embedding_mode else product_batcher).submit(model_input, pin=loaded_model)
+    input_buffers.release_after(model_input, future)
+    if embedding_mode:
+        embedding = future.result(timeout=30)
+    else:
+        predictions = future.result(timeout=30)
+    if embedding_mode:
+        matches = embedding_index.search(embedding)[0]
+        product_id, product_name, similarity = matches[0]
+        if similarity < EMBEDDING_MIN_SIMILARITY:
+            product_id, product_name = None, 'Unknown or Not Recognized'
+        local_result = {
+            'cart_id': cart_id,
+            'product_id': product_id,
+            'product_name': product_name,
+            'confidence': similarity
+        }
+    else:
+        max_pred_idx = int(np.argmax(predictions))
+        local_result = {
+            'cart_id': cart_id,
+            'product_id': max_pred_idx,
+            'product_name': loaded_model.label(max_pred_idx),
+            'confidence': float(predictions[max_pred_idx])
+        }
+    frame_gate.store(cart_id, signature, local_result)
+    return record_prediction(cart_id, local_result, 'embedding' if embedding_mode else 'local', started)
+
 @app.route('/predict_product', methods=['POST'])
 def predict_product():
     try:
@@ -193,47 +352,144 @@ def predict_product():
         image_b64 = data.get('image_base64') or data.get('image')
         if not cart_id or not image_b64:
             return jsonify({'error': 'cart_id and image are required'}), 400
-        # Decode base64 image
+        # Decode base64 image at reduced resolution
         img_bytes = base64.b64decode(image_b64)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        # Save the image as latest.jpg (thread-safe)
+        img = decode_image(img_bytes)
+        if img is None:
+            return jsonify({'error': 'Could not decode image'}), 400
+        # Save the received JPEG as latest.jpg (thread-safe)
         with latest_image_lock:
-            cv2.imwrite(latest_image_path, img)
+            with open(latest_image_path, 'wb') as f:
+                f.write(img_bytes)
         # --- Local model prediction ---
-        img_resized = cv2.resize(img, (224, 224))
-        img_resized = img_resized / 255.0
-        img_resized = np.expand_dims(img_resized, axis=0)
-        model_path = os.path.join(os.path.dirname(__file__), '..', 'ml_models', 'weights', 'product_model3_finetuned.h5')
-        model_path = os.path.abspath(model_path)
-        import tensorflow as tf
-        model = tf.keras.models.load_model(model_path)
-        predictions = model.predict(img_resized)[0]
-        max_pred_idx = int(np.argmax(predictions))
-        confidence_local = float(predictions[max_pred_idx] ) 
-        class_indices_path = os.path.join(os.path.dirname(__file__), '..', 'ml_models', 'training', 'class_indices.json')
-        with open(class_indices_path, 'r') as f:
-            class_indices = json.load(f)
-        idx_to_class = {int(v): k for k, v in class_indices.items()}
-        product_name_local = idx_to_class.get(max_pred_idx, 'Unknown or Not Recognized')
-        local_result = {
-            'cart_id': cart_id,
-            'product_id': max_pred_idx,
-            'product_name': product_name_local,
-            'confidence': confidence_local
-        }
-        # Store the local prediction immediately
-        with latest_prediction_lock:
-            latest_prediction.update(local_result)
+        local_result = classify_image(img, cart_id)
         elapsed = _time.time() - start_time
+        if local_result.get('cached'):
+            return jsonify(local_result)
         logger.info(f"Predicted product: {local_result['product_name']} | Confidence: {local_result['confidence']:.3f} | Source: local | Time: {elapsed:.2f}s")
-        # Start Gemini API call in a background thread
-        threading.Thread(target=async_gemini_update, args=(image_b64, cart_id, confidence_local), daemon=True).start()
+        # Ask Gemini in the background if the local model is unsure
+        remote_classifier.submit(cart_id, image_b64, dhash(img), local_result['confidence'])
         return jsonify(local_result)
     except Exception as e:
         logger.error(f'/predict_product error: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    # Hot-swap the product model; in-flight requests finish on the old one
+    data = request.get_json(silent=True) or {}
+    model_path = None
+    if data.get('model_file'):
+        # Only files already placed in the weights directory can be loaded
+        model_path = os.path.join(MODEL_WEIGHTS_DIR, os.path.basename(data['model_file']))
+        if not os.path.exists(model_path):
+            return jsonify({'error': 'Model file not found'}), 404
+    try:
+        loaded_model = product_model_registry.swap(model_path=model_path)
+        info = product_model_registry.info()
+        if CLASSIFIER_MODE == 'embedding':
+            reason = embeddings_unavailable(loaded_model)
+            if reason is not None:
+                logger.warning(f'[Embeddings] Using softmax after reload: {reason}')
+            info['embeddings'] = {'active': reason is None, 'reason': reason}
+        return jsonify(info)
+    except Exception as e:
+        logger.error(f'/model/reload error: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/model/info', methods=['GET'])
+def model_info():
+    return jsonify(product_model_registry.info())
+
+@app.route('/embeddings', methods=['GET'])
+def embedding_catalog():
+    if embedding_index is None:
+        return jsonify({'mode': CLASSIFIER_MODE, 'active': False, 'products': {}})
+    return jsonify(dict(embedding_index.stats(), mode=CLASSIFIER_MODE, active=use_embeddings(),
+                        reason=embeddings_unavailable(), products=embedding_index.products()))
+
+@app.route('/embeddings/products', methods=['POST'])
+def add_embedding_product():
+    # Register a product from a few reference images; takes effect without reloading the model
+    global embedding_index
+    data = request.get_json(silent=True) or {}
+    product_id = data.get('product_id')
+    name = data.get('name')
+    images = data.get('images') or []
+    if product_id is None or not name or not images:
+        return jsonify({'error': 'product_id, name and images are required'}), 400
+    loaded_model = product_model_registry.get()
+    model = model_name(loaded_model.model_path)
+    if embedding_index is not None and len(embedding_index) and embedding_index.model not in (None, model):
+        return jsonify({'error': f'Reference embeddings were built with {embedding_index.model}; '
+                                 f'rebuild them for {model} (tools/build_embedding_index.py)'}), 409
+    try:
+        batch = preprocess_batch([base64.b64decode(image) for image in images])
+        embeddings = loaded_model.embed(batch)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except NotImplementedError as e:
+        return jsonify({'error': str(e)}), 409
+    info = {k: v for k, v in data.items() if k not in ('product_id', 'name', 'images')}
+    with embedding_index_lock:
+        if embedding_index is None or len(embedding_index) == 0:
+            embedding_index = EmbeddingIndex(embeddings.shape[1], model=model)
+        product = embedding_index.add(product_id, name, embeddings, **info)
+        embedding_index.save(EMBEDDING_INDEX_PATH)
+    logger.info(f'[Embeddings] Added {len(images)} reference image(s) for product {product_id} ({name})')
+    return jsonify({'product_id': str(product_id), **product}), 201
+
+@app.route('/embeddings/products/<product_id>', methods=['DELETE'])
+def remove_embedding_product(product_id):
+    with embedding_index_lock:
+        if embedding_index is None or not embedding_index.remove(product_id):
+            return jsonify({'error': 'Product not found'}), 404
+        embedding_index.save(EMBEDDING_INDEX_PATH)
+    logger.info(f'[Embeddings] Removed product {product_id}')
+    return jsonify({'message': f'Product {product_id} removed'})
+
+@app.route('/inference/stats', methods=['GET'])
+def inference_stats():
+    return jsonify(product_batcher.stats())
+
+@app.route('/remote_classifier/stats', methods=['GET'])
+def remote_classifier_stats():
+    return jsonify(remote_classifier.stats())
+
+@app.route('/esp32_ws_forward', methods=['POST'])
+def esp32_ws_forward():
+    # Complete base64 frames relayed by the Quart websockets bridge (app.py)
+    data = request.get_json(silent=True) or {}
+    cart_id = data.get('cart_id')
+    if not cart_id or not data.get('frame'):
+        return jsonify({'error': 'cart_id and frame are required'}), 400
+    socketio.emit('frame_update', {
+        'cart_id': cart_id,
+        'frame': data['frame'],
+        'timestamp': datetime.datetime.now().isoformat()
+    }, room=cart_room(cart_id))
+    return jsonify({'status': 'ok'})
+
+@app.route('/frame_gate', methods=['GET'])
+def frame_gate_stats():
+    return jsonify(frame_gate.stats())
+
+@app.route('/frame_gate/<cart_id>', methods=['GET', 'POST'])
+def frame_gate_config(cart_id):
+    # POST {"threshold": 0.03, "max_age": 10, "enabled": true} to tune one cart
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            frame_gate.configure(cart_id, data.get('threshold'), data.get('max_age'), data.get('enabled'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid frame gate configuration'}), 400
+    return jsonify(frame_gate.stats(cart_id))
+
+@app.route('/reassembly/stats', methods=['GET'])
+def reassembly_stats():
+    cart_id = request.args.get('cart_id')
+    return jsonify(frame_reassembler.stats(cart_id))
+
 @app.route('/latest_image')
 def latest_image():
     # Serve the latest image as JPEG
@@ -244,11 +500,63 @@ def latest_image():
 
 @app.route('/latest_prediction', methods=['GET'])
 def get_latest_prediction():
-    with latest_prediction_lock:
-        if latest_prediction['product_id'] is not None:
-            return jsonify(latest_prediction)
-        else:
-            return jsonify({'error': 'No prediction available'}), 404
+    # Without ?cart_id= this is whichever cart predicted last; prefer /latest_prediction/<cart_id>
+    cart_id = request.args.get('cart_id') or prediction_store.last_cart_id()
+    latest_prediction = prediction_store.latest(cart_id) if cart_id else None
+    if latest_prediction is not None:
+        return jsonify(latest_prediction)
+    else:
+        return jsonify({'error': 'No prediction available'}), 404
+
+@app.route('/latest_prediction/<cart_id>', methods=['GET'])
+def get_cart_prediction(cart_id):
+    latest_prediction = prediction_store.latest(cart_id)
+    if latest_prediction is None:
+        return jsonify({'error': 'No prediction available', 'cart_id': cart_id}), 404
+    return jsonify(latest_prediction)
+
+@app.route('/latest_prediction/<cart_id>/history', methods=['GET'])
+def get_cart_prediction_history(cart_id):
+    limit = request.args.get('limit', type=int)
+    return jsonify({'cart_id': cart_id, 'predictions': prediction_store.history(cart_id, limit)})
+
+@app.route('/latest_prediction/<cart_id>/wait', methods=['GET'])
+def wait_cart_prediction(cart_id):
+    # Long poll: answers as soon as the cart has a prediction newer than ?since=<seq>, 204 on timeout
+    since = request.args.get('since', 0, type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    latest_prediction = prediction_store.wait_for(cart_id, since, timeout, sleep=socketio.sleep)
+    if latest_prediction is None:
+        return '', 204
+    return jsonify(latest_prediction)
+
+@app.route('/latest_prediction/<cart_id>/stream', methods=['GET'])
+def stream_cart_predictions(cart_id):
+    # Server-sent events: one 'prediction' event per new record, keep-alive comment while idle.
+    # EventSource resumes from Last-Event-ID after a reconnect.
+    since = request.args.get('since', type=int) or request.headers.get('Last-Event-ID', 0, type=int)
+
+    def events():
+        seq = since
+        while True:
+            latest_prediction = prediction_store.wait_for(cart_id, seq, 15, sleep=socketio.sleep)
+            if latest_prediction is None:
+                yield ': keep-alive\n\n'
+                continue
+            seq = latest_prediction['seq']
+            yield f"id: {seq}\nevent: prediction\ndata: {json.dumps(latest_prediction)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/predictions/stats', methods=['GET'])
+def prediction_stats():
+    return jsonify(dict(prediction_store.stats(), tracker=cart_tracker.stats()))
+
+@app.route('/cart_items/<cart_id>', methods=['GET'])
+def get_cart_items(cart_id):
+    """Products confirmed in the cart by the temporal vote"""
+    return jsonify({'cart_id': cart_id, 'items': cart_tracker.items(cart_id)})
 
 # --- AUTHENTICATION HANDLER FOR ESP32 ---
 @socketio.on('authenticate')
@@ -285,26 +593,26 @@ def handle_connect(auth=None):
             logger.warning(f'[SocketIO] Connection rejected for cart_id {cart_id} (rate limit)')
             return False
         client_type = 'esp32' if auth else 'browser'
+        conn = connection_index.add(
+            request.sid, cart_id, client_type, limit=MAX_CONNECTIONS_PER_CART,
+            connected_at=datetime.datetime.now(),
+            last_activity=datetime.datetime.now(),
+            is_camera_connected=client_type == 'esp32'
+        )
+        if conn is None:
+            logger.warning(f'[SocketIO] Connection rejected for cart_id {cart_id} (max {MAX_CONNECTIONS_PER_CART} connections)')
+            return False
         logger.info(f'[SocketIO] {client_type} client connected with cart_id: {cart_id}')
-        if cart_id not in cart_connections:
-            cart_connections[cart_id] = set()
-        active_connections[request.sid] = {
-            'cart_id': cart_id,
-            'connected_at': datetime.datetime.now(),
-            'type': client_type,
-            'last_activity': datetime.datetime.now(),
-            'is_camera_connected': client_type == 'esp32'
-        }
-        cart_connections[cart_id].add(request.sid)
         if client_type == 'esp32':
+            join_room(camera_room(cart_id))
             socketio.emit('camera_status', {
                 'cart_id': cart_id,
                 'status': 'connected',
                 'timestamp': datetime.datetime.now().isoformat()
-            }, room=cart_id)
+            }, room=cart_room(cart_id))
         elif client_type == 'browser':
-            has_camera = any(conn['type'] == 'esp32' and conn['cart_id'] == cart_id
-                           for conn in active_connections.values())
+            join_room(cart_room(cart_id))
+            has_camera = connection_index.has_camera(cart_id)
             socketio.emit('camera_status', {
                 'cart_id': cart_id,
                 'status': 'connected' if has_camera else 'waiting_for_camera',
@@ -328,25 +636,19 @@ def handle_connect(auth=None):
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    if request.sid in active_connections:
-        disconnecting_conn = active_connections[request.sid]
+    # Socket.IO removes the sid from its rooms itself on disconnect
+    disconnecting_conn = connection_index.remove(request.sid)
+    if disconnecting_conn is not None:
         cart_id = disconnecting_conn['cart_id']
         client_type = disconnecting_conn['type']
         logger.info(f'[SocketIO] {client_type} client disconnected: {cart_id}')
-        cart_connections[cart_id].discard(request.sid)
-        if not cart_connections[cart_id]:
-            del cart_connections[cart_id]
         if client_type == 'esp32':
-            browser_sids = [sid for sid, conn in active_connections.items()
-                          if conn['cart_id'] == cart_id and conn['type'] == 'browser']
-            for browser_sid in browser_sids:
-                socketio.emit('camera_status', {
-                    'cart_id': cart_id,
-                    'status': 'disconnected',
-                    'message': 'Camera connection lost. Waiting for reconnection...',
-                    'timestamp': datetime.datetime.now().isoformat()
-                }, room=browser_sid)
-        del active_connections[request.sid]
+            socketio.emit('camera_status', {
+                'cart_id': cart_id,
+                'status': 'disconnected',
+                'message': 'Camera connection lost. Waiting for reconnection...',
+                'timestamp': datetime.datetime.now().isoformat()
+            }, room=cart_room(cart_id))
     else:
         logger.warning('[SocketIO] Unknown client disconnected')
 
@@ -363,39 +665,36 @@ def handle_esp32_frame(data):
         conn = active_connections[request.sid]
         conn['last_activity'] = datetime.datetime.now()
         conn['is_camera_connected'] = True
-        if cart_id in connection_attempts:
-            connection_attempts[cart_id]['count'] = 0
+        cart_data = state_store.hget('connection_attempts', cart_id)
+        if cart_data and cart_data['count']:
+            cart_data['count'] = 0
+            state_store.hset('connection_attempts', cart_id, cart_data)
         if 'chunk' in data:
-            chunk_index = data.get('chunk_index', 0)
-            total_chunks = data.get('total_chunks', 1)
-            buffer_data = frame_buffers[cart_id]
-            if time.time() - buffer_data['timestamp'] > 5:
-                logger.warning(f'[SocketIO] Stale buffer detected for cart {cart_id}, resetting')
-                buffer_data['buffer'] = ''
-                buffer_data['last_chunk'] = -1
-                buffer_data['chunks_received'] = 0
-                buffer_data['total_chunks'] = total_chunks
-            if chunk_index != buffer_data['last_chunk'] + 1:
-                logger.warning(f'[SocketIO] Out of order chunk received for cart {cart_id}')
-                buffer_data['buffer'] = ''
-                buffer_data['last_chunk'] = -1
-                buffer_data['chunks_received'] = 0
-                return
-            buffer_data['buffer'] += data['chunk']
-            buffer_data['last_chunk'] = chunk_index
-            buffer_data['timestamp'] = time.time()
-            buffer_data['chunks_received'] += 1
-            if buffer_data['chunks_received'] >= total_chunks:
+            chunk_index = data.get('chunk_index')
+            total_chunks = data.get('total_chunks')
+            final = bool(data.get('final'))
+            if total_chunks is None and 'final' not in data:
+                # Neither a count nor a final flag: a single-chunk frame
+                total_chunks = 1
+            if 'frame_seq' in data:
+                frame_seq = data['frame_seq']
+                chunk_index = chunk_index or 0
+            else:
+                if chunk_index is None and data['chunk'].startswith(JPEG_BASE64_START):
+                    # Start of a JPEG, so chunk 0 even if the previous frame's final chunk was lost
+                    chunk_index = 0
+                frame_seq, chunk_index = legacy_frame_position(cart_id, chunk_index)
+                if final or total_chunks == chunk_index + 1:
+                    end_legacy_frame(cart_id)
+            frame = frame_reassembler.add(cart_id, frame_seq, chunk_index, total_chunks,
+                                          data['chunk'].encode('ascii'), final=final)
+            if frame is not None:
                 try:
-                    frame_data = buffer_data['buffer']
-                    buffer_data['buffer'] = ''
-                    buffer_data['last_chunk'] = -1
-                    buffer_data['chunks_received'] = 0
                     socketio.emit('frame_update', {
                         'cart_id': cart_id,
-                        'frame': frame_data,
+                        'frame': frame.decode('ascii'),
                         'timestamp': datetime.datetime.now().isoformat()
-                    }, room=cart_id)
+                    }, room=cart_room(cart_id))
                     logger.info(f'[SocketIO] Complete frame processed for cart {cart_id}')
                 except Exception as frame_error:
                     logger.error(f'[SocketIO] Frame processing error: {str(frame_error)}')
@@ -409,26 +708,78 @@ def handle_esp32_frame(data):
         logger.error(f'[SocketIO] Error in handle_esp32_frame: {str(e)}')
         socketio.emit('error', {'message': 'Frame processing error'}, room=request.sid)
 
+def classify_esp32_frame(cart_id, jpeg_bytes):
+    try:
+        img = decode_image(jpeg_bytes)
+        if img is None:
+            logger.warning(f'[SocketIO] Could not decode binary frame from cart {cart_id}')
+            return
+        classify_image(img, cart_id)
+    except Exception as e:
+        logger.error(f'[SocketIO] Classification error for cart {cart_id}: {str(e)}')
+
+@socketio.on('esp32_frame_bin')
+def handle_esp32_frame_bin(message):
+    # Binary counterpart of esp32_frame: see utils/frame_protocol.py for the layout
+    try:
+        conn = active_connections.get(request.sid)
+        if conn is None or conn['type'] != 'esp32':
+            logger.warning(f'[SocketIO] Non-ESP32 client tried to send frame: {request.sid}')
+            return
+        if not isinstance(message, (bytes, bytearray)):
+            logger.warning('[SocketIO] esp32_frame_bin payload is not binary')
+            return
+        chunk = parse_chunk(message)
+        if chunk.cart_id != conn['cart_id']:
+            logger.warning(f'[SocketIO] Frame for cart {chunk.cart_id} sent on connection of cart {conn["cart_id"]}')
+            return
+        conn['last_activity'] = datetime.datetime.now()
+        conn['is_camera_connected'] = True
+        frame = frame_reassembler.add_chunk(chunk)
+        if frame is None:
+            return
+        # One immutable copy of the reassembled JPEG is shared by the fan-out and the decoder
+        jpeg_bytes = bytes(frame)
+        socketio.emit('frame_update', {
+            'cart_id': chunk.cart_id,
+            'frame': jpeg_bytes,
+            'encoding': 'jpeg',
+            'frame_seq': chunk.frame_seq,
+            'timestamp': datetime.datetime.now().isoformat()
+        }, room=cart_room(chunk.cart_id))
+        socketio.start_background_task(classify_esp32_frame, chunk.cart_id, jpeg_bytes)
+    except (FrameProtocolError, ValueError) as e:
+        logger.warning(f'[SocketIO] Malformed binary frame chunk: {str(e)}')
+    except Exception as e:
+        logger.error(f'[SocketIO] Error in handle_esp32_frame_bin: {str(e)}')
+        socketio.emit('error', {'message': 'Frame processing error'}, room=request.sid)
+
 def cleanup_stale_connections():
     now = datetime.datetime.now()
     stale_sids = []
-    for sid, conn in active_connections.items():
+    for sid, conn in connection_index.items():
         if (now - conn['last_activity']).total_seconds() > 30:
             stale_sids.append(sid)
     for sid in stale_sids:
-        conn = active_connections[sid]
+        conn = connection_index.remove(sid)
+        if conn is None:
+            continue
         logger.warning(f'[SocketIO] Cleaning up stale connection: {conn["cart_id"]} ({conn["type"]})')
         cart_id = conn['cart_id']
-        cart_connections[cart_id].discard(sid)
-        if not cart_connections[cart_id]:
-            del cart_connections[cart_id]
-            if cart_id in frame_buffers:
-                del frame_buffers[cart_id]
-        del active_connections[sid]
+        room = camera_room(cart_id) if conn['type'] == 'esp32' else cart_room(cart_id)
+        socketio.server.leave_room(sid, room, namespace='/')
+        if not connection_index.has_cart(cart_id):
+            frame_reassembler.discard(cart_id)
+            legacy_frames.pop(cart_id, None)
+            frame_gate.forget(cart_id)
 
 def cleanup_task():
     while True:
         cleanup_stale_connections()
+        connection_index.heartbeat()
+        frame_reassembler.expire()
+        prediction_store.expire(PREDICTION_MAX_AGE)
+        cart_tracker.expire(PREDICTION_MAX_AGE)
         eventlet.sleep(10)
 
 
@@ -450,6 +801,10 @@ def handle_authenticate(data):
 if __name__ == '__main__':
     try:
         port = get_available_port()
+        try:
+            product_model_registry.load()
+        except Exception as e:
+            logger.error(f'[Flask] Could not preload product model, will retry on first request: {str(e)}')
         logger.info(f'[Flask] Starting Flask-SocketIO server with eventlet on port {port}...')
         eventlet.spawn(cleanup_task)
         socketio.run(
@@ -0,0 +1,4 @@
+"""
+Tools package initialization.
+Developer utilities such as simulated ESP32 clients; run from backend/ with `python -m tools.<name>`.
+"""
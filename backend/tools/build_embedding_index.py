@@ -0,0 +1,74 @@
+"""
+Build the reference embedding index used by CLASSIFIER_MODE=embedding.
+
+Walks a directory laid out like the training set (one sub-directory of
+images per product), embeds up to --per-product images of each product with
+the served model's GlobalAveragePooling output and writes the index. Product
+ids follow class_indices.json where the folder is a known class, so results
+keep the same product_id as softmax mode.
+
+    python -m tools.build_embedding_index --dataset ../ml_models/training/dataset
+    python -m tools.build_embedding_index --dataset new_skus/ --append
+"""
+import argparse
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.embedding_index import EmbeddingIndex, model_name
+from utils.model_registry import DEFAULT_CLASS_INDICES_PATH, MODEL_WEIGHTS_DIR, load_class_indices, product_model_registry
+from utils.preprocessing import preprocess_batch
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def product_images(dataset, per_product):
+    for name in sorted(os.listdir(dataset)):
+        folder = os.path.join(dataset, name)
+        if not os.path.isdir(folder):
+            continue
+        paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+        if paths:
+            yield name, paths[:per_product]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', required=True, help='Directory with one sub-directory of images per product')
+    parser.add_argument('--output', default=os.path.join(MODEL_WEIGHTS_DIR, 'product_embeddings.npz'))
+    parser.add_argument('--per-product', type=int, default=8, help='Reference images per product')
+    parser.add_argument('--dtype', choices=('float32', 'float16'), default='float32',
+                        help='float16 halves memory but searches slower')
+    parser.add_argument('--append', action='store_true', help='Add to an existing index instead of replacing it')
+    args = parser.parse_args()
+
+    class_ids = {label: idx for idx, label in load_class_indices(DEFAULT_CLASS_INDICES_PATH).items()}
+    index = EmbeddingIndex.load(args.output) if args.append and os.path.exists(args.output) else None
+
+    for name, paths in product_images(args.dataset, args.per_product):
+        frames = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                frames.append(f.read())
+        embeddings = product_model_registry.embed(preprocess_batch(frames))
+        if index is None:
+            index = EmbeddingIndex(embeddings.shape[1], dtype=args.dtype,
+                                   model=model_name(product_model_registry.get().model_path))
+        product_id = class_ids.get(name, name)
+        index.remove(product_id)
+        index.add(product_id, name, embeddings)
+        print(f'{name:<40} {len(paths):>3} reference image(s)')
+
+    if index is None:
+        print('No product images found')
+        return 1
+    index.save(args.output)
+    stats = index.stats()
+    print(f"✅ {stats['products']} products, {stats['reference_rows']} rows ({stats['matrix_bytes'] / 1e6:.1f} MB) saved to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
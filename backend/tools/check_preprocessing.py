@@ -0,0 +1,113 @@
+"""
+Golden check: serving tensors must match the tensors the model was trained on.
+
+For each image, builds the training tensor the way finetuned.py's
+ImageDataGenerator does (Keras load_img in RGB with the training resize
+filter, then rescale=1/255) and the serving tensor through
+utils.preprocessing, and fails if they differ by more than the tolerance.
+Also checks that the single-frame and batch paths agree exactly, that the
+NCHW batch is the NHWC batch transposed, and that everything is float32 and
+contiguous.
+
+    python -m tools.check_preprocessing                       # synthetic frames
+    python -m tools.check_preprocessing --dataset ../ml_models/training/dataset --limit 50
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.preprocessing import INPUT_SIZE, preprocess_batch, preprocess_jpeg
+
+TRAINING_INTERPOLATION = 'box'  # finetuned.py INTERPOLATION
+
+
+def training_tensor(data):
+    """What flow_from_directory feeds the model for this image"""
+    try:
+        from tensorflow.keras.utils import img_to_array, load_img
+        img = load_img(io.BytesIO(data), target_size=(INPUT_SIZE[1], INPUT_SIZE[0]), interpolation=TRAINING_INTERPOLATION)
+        return img_to_array(img, dtype='float32') * np.float32(1.0 / 255)
+    except ImportError:
+        # Same steps as keras load_img without TensorFlow installed
+        img = Image.open(io.BytesIO(data)).convert('RGB')
+        if img.size != INPUT_SIZE:
+            img = img.resize(INPUT_SIZE, Image.BOX)
+        return np.asarray(img, dtype=np.float32) * np.float32(1.0 / 255)
+
+
+def synthetic_frames():
+    """Saturated colour blocks (catch channel swaps) plus textured camera-like frames"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for width, height in ((640, 480), (1600, 1200), (320, 240), (224, 224)):
+        img = np.zeros((height, width, 3), np.uint8)
+        img[:, :width // 3] = (0, 0, 255)
+        img[:, width // 3:2 * width // 3] = (0, 255, 0)
+        img[height // 2:, 2 * width // 3:] = (255, 0, 0)
+        noise = cv2.resize((rng.random((height // 16, width // 16, 3)) * 255).astype(np.uint8), (width, height))
+        frames.append((f'blocks {width}x{height}', cv2.addWeighted(img, 0.7, noise, 0.3, 0)))
+        frames.append((f'texture {width}x{height}', noise))
+    return [(name, cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()) for name, img in frames]
+
+
+def dataset_frames(dataset, limit):
+    paths = sorted(glob.glob(os.path.join(dataset, '**', '*.jpg'), recursive=True))[:limit]
+    frames = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            frames.append((os.path.relpath(path, dataset), f.read()))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', help='Check JPEGs from this directory instead of synthetic frames')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--mean-tolerance', type=float, default=0.01, help='Max mean absolute difference (0-1 scale)')
+    parser.add_argument('--channel-tolerance', type=float, default=0.01, help='Max per-channel mean difference')
+    args = parser.parse_args()
+
+    frames = dataset_frames(args.dataset, args.limit) if args.dataset else synthetic_frames()
+    if not frames:
+        print('No images found')
+        return 1
+
+    failures = 0
+    print(f"{'image':<40} {'mean abs':>9} {'max abs':>8} {'channel':>8}")
+    for name, data in frames:
+        train = training_tensor(data)
+        serve = preprocess_jpeg(data)
+        diff = np.abs(train - serve)
+        channel = float(np.abs(train.mean(axis=(0, 1)) - serve.mean(axis=(0, 1))).max())
+        ok = serve.dtype == np.float32 and diff.mean() <= args.mean_tolerance and channel <= args.channel_tolerance
+        failures += not ok
+        print(f'{name[:40]:<40} {diff.mean():>9.4f} {diff.max():>8.3f} {channel:>8.4f} {"" if ok else "FAIL"}')
+
+    encoded = [data for _, data in frames]
+    nhwc = preprocess_batch(encoded)
+    nchw = preprocess_batch(encoded, layout='NCHW')
+    singles = np.stack([preprocess_jpeg(data) for data in encoded])
+    checks = {
+        'batch == single frames': np.array_equal(nhwc, singles),
+        'NCHW == NHWC transposed': np.array_equal(nchw, nhwc.transpose(0, 3, 1, 2)),
+        'float32 and contiguous': all(b.dtype == np.float32 and b.flags.c_contiguous for b in (nhwc, nchw)),
+        'range [0, 1]': float(nhwc.min()) >= 0.0 and float(nhwc.max()) <= 1.0
+    }
+    for check, ok in checks.items():
+        failures += not ok
+        print(f'{check:<30} {"ok" if ok else "FAIL"}')
+
+    print('PASS' if not failures else f'{failures} FAILED')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
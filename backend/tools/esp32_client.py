@@ -0,0 +1,105 @@
+"""
+Simulated ESP32-CAM that streams JPEG frames using the binary frame protocol.
+
+Mimics the firmware: connects over the Socket.IO websocket transport with a
+cart_id, authenticates, then sends one frame per interval split into 8 KB
+chunks as `esp32_frame_bin` events.
+
+    python -m tools.esp32_client --url http://localhost:5000 --cart-id cart_001 --image sample.jpg
+    python -m tools.esp32_client --dry-run --image sample.jpg   # wire-size comparison only
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.frame_protocol import DEFAULT_CHUNK_SIZE, encode_frame
+
+
+def load_frames(image_paths, synthetic_size):
+    if image_paths:
+        frames = []
+        for path in image_paths:
+            with open(path, 'rb') as f:
+                frames.append(f.read())
+        return frames
+    # JPEG SOI/EOI markers around random bytes are enough to exercise the transport
+    return [b'\xff\xd8' + os.urandom(synthetic_size - 4) + b'\xff\xd9']
+
+
+def legacy_wire_size(cart_id, jpeg_bytes, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Bytes the firmware's base64 JSON chunks put on the wire for the same frame"""
+    encoded = base64.b64encode(jpeg_bytes).decode('ascii')
+    chunks = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+    total = 0
+    for i, chunk in enumerate(chunks):
+        doc = json.dumps({'cart_id': cart_id, 'chunk': chunk, 'final': i == len(chunks) - 1})
+        total += len('42["esp32_frame",' + doc + ']')
+    return total
+
+
+def report_wire_size(cart_id, frames, chunk_size):
+    for i, jpeg_bytes in enumerate(frames):
+        legacy = legacy_wire_size(cart_id, jpeg_bytes, chunk_size)
+        binary = sum(len(c) for c in encode_frame(cart_id, i, jpeg_bytes, chunk_size))
+        print(f'frame {i}: jpeg={len(jpeg_bytes)}B base64-json={legacy}B binary={binary}B '
+              f'saving={(1 - binary / legacy) * 100:.1f}%')
+
+
+def stream(url, cart_id, frames, chunk_size, interval, count, shuffle=False, drop_rate=0.0):
+    import socketio
+
+    sio = socketio.Client()
+    confirmed = []
+    sio.on('connection_confirmed', lambda data: confirmed.append(data))
+    sio.connect(f'{url}?cart_id={cart_id}', auth={'cart_id': cart_id}, transports=['websocket'])
+    sio.emit('authenticate', {'cart_id': cart_id})
+
+    frame_seq = 0
+    try:
+        while count is None or frame_seq < count:
+            jpeg_bytes = frames[frame_seq % len(frames)]
+            started = time.perf_counter()
+            chunks = encode_frame(cart_id, frame_seq, jpeg_bytes, chunk_size)
+            if shuffle:
+                # Simulate Wi-Fi reordering
+                random.shuffle(chunks)
+            for chunk in chunks:
+                if drop_rate and random.random() < drop_rate:
+                    continue
+                sio.emit('esp32_frame_bin', chunk)
+            print(f'sent frame {frame_seq} ({len(jpeg_bytes)}B) in {(time.perf_counter() - started) * 1000:.1f}ms')
+            frame_seq += 1
+            time.sleep(interval)
+    finally:
+        sio.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--cart-id', default='cart_001')
+    parser.add_argument('--image', nargs='*', help='JPEG files to cycle through')
+    parser.add_argument('--synthetic-size', type=int, default=30 * 1024, help='Size of the generated frame if no image is given')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between frames (firmware default: 1)')
+    parser.add_argument('--count', type=int, help='Number of frames to send (default: run forever)')
+    parser.add_argument('--shuffle', action='store_true', help='Send each frame\'s chunks in random order')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Fraction of chunks to drop')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the wire size comparison')
+    args = parser.parse_args()
+
+    frames = load_frames(args.image, args.synthetic_size)
+    report_wire_size(args.cart_id, frames, args.chunk_size)
+    if not args.dry_run:
+        stream(args.url, args.cart_id, frames, args.chunk_size, args.interval, args.count,
+               shuffle=args.shuffle, drop_rate=args.drop_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Local stand-in for an ESP32-CAM MJPEG stream.
+
+Serves GET /video as multipart/x-mixed-replace JPEGs at a fixed frame rate,
+like the camera firmware, and counts the stream connections it received
+(one per reader the backend opens). Frames are synthetic: a moving block and
+the frame number, so consecutive frames differ. Register a camera with
+ip_address localhost:<port> to stream from it:
+
+    python -m tools.fake_mjpeg_camera --port 8090 --fps 15
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BOUNDARY = 'frame'
+
+
+def synthetic_frame(index, width=640, height=480):
+    frame = np.full((height, width, 3), 40, np.uint8)
+    x = (index * 8) % (width - 120)
+    cv2.rectangle(frame, (x, 160), (x + 120, 320), (0, 160, 255), -1)
+    cv2.putText(frame, f'#{index}', (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+    return frame
+
+
+class FakeCameraServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fps=15.0, width=640, height=480, max_frames=None):
+        super().__init__(address, FakeCameraHandler)
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.max_frames = max_frames
+        self.connections = 0
+        self.frames_sent = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/video'
+
+    @property
+    def address(self):
+        """host:port, as stored in Camera.ip_address"""
+        host, port = self.server_address[:2]
+        return f'{host}:{port}'
+
+
+class FakeCameraHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/video':
+            self.send_error(404)
+            return
+        with self.server._lock:
+            self.server.connections += 1
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.end_headers()
+        interval = 1.0 / self.server.fps
+        index = 0
+        next_at = time.monotonic()
+        try:
+            while self.server.max_frames is None or index < self.server.max_frames:
+                ok, jpeg = cv2.imencode('.jpg', synthetic_frame(index, self.server.width, self.server.height))
+                self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n'.encode())
+                self.wfile.write(jpeg.tobytes() + b'\r\n')
+                with self.server._lock:
+                    self.server.frames_sent += 1
+                index += 1
+                next_at += interval
+                time.sleep(max(0.0, next_at - time.monotonic()))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_camera(port=0, **kwargs):
+    """Run a fake camera on a background thread; returns it (see .url, .address, .connections)"""
+    server = FakeCameraServer(('127.0.0.1', port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--size', default='640x480', help='Frame size as WxH')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    server = FakeCameraServer(('0.0.0.0', args.port), fps=args.fps, width=width, height=height)
+    print(f'Fake camera streaming on http://localhost:{args.port}/video')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'{server.connections} stream connections, {server.frames_sent} frames sent')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Local stand-in for the Gemini generateContent endpoint.
+
+Answers every POST with the same response shape as the real API, after an
+optional artificial latency, and counts the calls it received. Point the
+server at it with GEMINI_API_URL and any GEMINI_API_KEY:
+
+    python -m tools.gemini_stub --port 8089 --latency 0.3
+    GEMINI_API_URL=http://localhost:8089/v1/models/stub:generateContent GEMINI_API_KEY=test python run.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def generate_content_response(product_name, confidence):
+    text = f'```json\n{json.dumps({"product_name": product_name, "confidence": confidence})}\n```'
+    return {
+        'candidates': [
+            {
+                'content': {'parts': [{'text': text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0
+            }
+        ]
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, product_name='Stub Product', confidence=0.95, latency=0.0, status=200):
+        super().__init__(address, StubHandler)
+        self.product_name = product_name
+        self.confidence = confidence
+        self.latency = latency
+        self.status = status
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1/models/stub:generateContent'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with self.server._lock:
+            self.server.calls += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.status != 200 or 'contents' not in body:
+            payload = json.dumps({'error': {'code': self.server.status, 'message': 'stub error'}}).encode()
+            self.send_response(self.server.status if self.server.status != 200 else 400)
+        else:
+            payload = json.dumps(generate_content_response(self.server.product_name, self.server.confidence)).encode()
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, **kwargs):
+    """Run a stub server on a background thread; returns it (see .url, .calls)"""
+    server = StubServer(('127.0.0.1', port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--product-name', default='Stub Product')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--status', type=int, default=200, help='HTTP status to answer with')
+    args = parser.parse_args()
+
+    server = StubServer(('0.0.0.0', args.port), product_name=args.product_name, confidence=args.confidence,
+                        latency=args.latency, status=args.status)
+    print(f'Gemini stub listening on http://localhost:{args.port}/v1/models/stub:generateContent')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'{server.calls} calls served')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""
+Utils package initialization.
+Shared helpers used by the Flask/Quart servers and the route blueprints.
+"""
+
+# This file makes the utils directory a Python package
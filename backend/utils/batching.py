@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Gather single frames from concurrent callers into batched forward passes.
+
+    Callers `submit` one preprocessed frame of shape (H, W, C) and get back a
+    Future resolving to that frame's prediction row. A background worker takes
+    up to `max_batch_size` queued frames, waiting at most `max_wait_ms` after
+    the oldest one arrived, runs `predict_fn` once on the stacked batch and
+    hands each row back to its caller.
+
+    Frames submitted with a `pin` (e.g. the LoadedModel the caller will label
+    the result with) are only batched with frames carrying the same pin, and
+    `predict_fn` is called as predict_fn(batch, pin) for them.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, max_queue_size=1024, name='inference'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # Stats
+        self._stats_lock = threading.Lock()
+        self._started_at = time.time()
+        self._frames = 0
+        self._batches = 0
+        self._errors = 0
+        self._inference_time = 0.0
+        self._queue_latencies = deque(maxlen=2048)
+        self._recent_batches = deque(maxlen=256)
+
+    def _ensure_started(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, frame, pin=None):
+        """Queue one frame and return a Future for its prediction row.
+
+        The frame is not copied: the caller must leave its buffer untouched
+        until the Future resolves (see InputBufferPool.release_after).
+        Cancelling the Future before its batch starts drops the frame.
+        """
+        self._ensure_started()
+        future = Future()
+        frame = np.asarray(frame, dtype=np.float32)
+        if frame.ndim == 4 and frame.shape[0] == 1:
+            frame = frame[0]
+        self._queue.put((frame, future, time.perf_counter(), pin))
+        return future
+
+    def predict(self, frame, timeout=None, pin=None):
+        """Blocking helper around `submit`"""
+        return self.submit(frame, pin).result(timeout=timeout)
+
+    def stop(self):
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join(timeout=1)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        pending = [first]
+        deadline = first[2] + self.max_wait
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    pending.append(self._queue.get_nowait())
+                else:
+                    pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # Frames whose callers cancelled while queued are dropped; the rest
+            # can no longer be cancelled, so resolving them below cannot raise
+            pending = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            groups = {}
+            for item in pending:
+                groups.setdefault(id(item[3]), []).append(item)
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, pending):
+        dequeued_at = time.perf_counter()
+        pin = pending[0][3]
+        try:
+            batch = np.stack([frame for frame, _, _, _ in pending])
+            outputs = np.asarray(self.predict_fn(batch) if pin is None else self.predict_fn(batch, pin))
+        except Exception as e:
+            logger.error(f'[MicroBatcher:{self.name}] Batch of {len(pending)} failed: {str(e)}')
+            with self._stats_lock:
+                self._errors += len(pending)
+            for _, future, _, _ in pending:
+                future.set_exception(e)
+            return
+        finished_at = time.perf_counter()
+        for i, (_, future, _, _) in enumerate(pending):
+            future.set_result(outputs[i])
+        with self._stats_lock:
+            self._frames += len(pending)
+            self._batches += 1
+            self._inference_time += finished_at - dequeued_at
+            self._queue_latencies.extend(dequeued_at - enqueued_at for _, _, enqueued_at, _ in pending)
+            self._recent_batches.append((finished_at, len(pending)))
+
+    def stats(self):
+        """Return throughput and queue-latency statistics"""
+        with self._stats_lock:
+            latencies = sorted(self._queue_latencies)
+            recent = list(self._recent_batches)
+            frames, batches, errors = self._frames, self._batches, self._errors
+            inference_time = self._inference_time
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        throughput = None
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            throughput = sum(n for _, n in recent[1:]) / (recent[-1][0] - recent[0][0])
+
+        return {
+            'name': self.name,
+            'frames': frames,
+            'batches': batches,
+            'errors': errors,
+            'mean_batch_size': round(frames / batches, 2) if batches else 0,
+            'throughput_fps': round(throughput, 2) if throughput else 0,
+            'queue_depth': self._queue.qsize(),
+            'queue_latency_ms': {
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99)
+            },
+            'mean_inference_ms': round(inference_time / batches * 1000, 3) if batches else None,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'uptime_s': round(time.time() - self._started_at, 1)
+        }
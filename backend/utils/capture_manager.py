@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = b'frame'
+
+
+class FrameSlot:
+    """Latest published frame of one camera.
+
+    Holds only the newest frame: a viewer asks for anything newer than the
+    seq it last sent and gets the current frame, so a slow viewer skips the
+    frames it missed instead of queueing them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.jpeg = None
+        self.result = None
+        self.published_at = None
+        self.closed = False
+
+    def publish(self, frame, jpeg, result):
+        with self._cond:
+            self.seq += 1
+            self.frame = frame
+            self.jpeg = jpeg
+            self.result = result
+            self.published_at = time.time()
+            self._cond.notify_all()
+
+    def wait_newer(self, seq, timeout):
+        """(seq, jpeg) of the latest frame once it is newer than `seq`; None on timeout or close"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > seq or self.closed, timeout)
+            if self.seq > seq:
+                return self.seq, self.jpeg
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CameraWorker:
+    """Background reader for one camera: read, process once, annotate, encode, publish"""
+
+    def __init__(self, manager, camera_id, source):
+        self.manager = manager
+        self.camera_id = camera_id
+        self.source = source
+        self.slot = FrameSlot()
+        self.subscribers = 0
+        self.idle_since = time.monotonic()
+        self.frames = 0
+        self.process_errors = 0
+        self.reconnects = 0
+        self.viewer_drops = 0
+        self.process_time = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{camera_id}-reader', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.slot.close()
+
+    @property
+    def alive(self):
+        return self._thread.is_alive() and not self._stopped.is_set()
+
+    def _should_stop(self):
+        return self._stopped.is_set() or self.manager._retire_if_idle(self)
+
+    def _run(self):
+        try:
+            while not self._should_stop():
+                cap = self.manager.open_fn(self.source)
+                if not cap.isOpened():
+                    logger.warning(f'[CaptureManager] Could not open camera {self.camera_id} at {self.source}')
+                    self.reconnects += 1
+                    self._stopped.wait(self.manager.reconnect_delay)
+                    continue
+                logger.info(f'[CaptureManager] Reading camera {self.camera_id} from {self.source}')
+                try:
+                    while not self._should_stop():
+                        success, frame = cap.read()
+                        if not success:
+                            logger.warning(f'[CaptureManager] Stream of camera {self.camera_id} ended, reconnecting')
+                            self.reconnects += 1
+                            self._stopped.wait(self.manager.reconnect_delay)
+                            break
+                        self._handle(frame)
+                finally:
+                    cap.release()
+        finally:
+            self.slot.close()
+            logger.info(f'[CaptureManager] Stopped reader for camera {self.camera_id}')
+
+    def _handle(self, frame):
+        # Inference runs here once per frame, however many viewers there are
+        started = time.perf_counter()
+        result = None
+        try:
+            result = self.manager.process_fn(self.camera_id, frame)
+        except Exception as e:
+            self.process_errors += 1
+            logger.error(f'[CaptureManager] Processing frame of camera {self.camera_id} failed: {str(e)}')
+        self.process_time += time.perf_counter() - started
+        annotated = frame
+        if result and self.manager.annotate_fn is not None:
+            annotated = frame.copy()
+            self.manager.annotate_fn(annotated, result)
+        ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, self.manager.jpeg_quality])
+        if ok:
+            self.frames += 1
+            self.slot.publish(frame, buffer.tobytes(), result)
+
+    def stats(self):
+        return {
+            'camera_id': self.camera_id,
+            'source': self.source,
+            'subscribers': self.subscribers,
+            'frames': self.frames,
+            'seq': self.slot.seq,
+            'viewer_dropped_frames': self.viewer_drops,
+            'process_errors': self.process_errors,
+            'reconnects': self.reconnects,
+            'mean_process_ms': round(self.process_time / self.frames * 1000, 3) if self.frames else None,
+            'last_frame_age_s': round(time.time() - self.slot.published_at, 3) if self.slot.published_at else None
+        }
+
+
+class CaptureManager:
+    """One shared capture per camera for any number of viewers.
+
+    The first `subscribe` for a camera starts a CameraWorker that reads the
+    stream, runs `process_fn(camera_id, frame)` once per frame, draws the
+    result with `annotate_fn(frame, result)` and publishes the raw frame,
+    result and annotated JPEG in the camera's FrameSlot. Viewers (see
+    `stream`) send that shared JPEG; nothing is decoded, run through the
+    model or encoded per viewer. A reader with no subscribers for
+    `idle_timeout` seconds shuts down and releases the camera. `open_fn`
+    defaults to cv2.VideoCapture.
+    """
+
+    def __init__(self, process_fn, annotate_fn=None, idle_timeout=10.0, reconnect_delay=2.0,
+                 jpeg_quality=80, open_fn=cv2.VideoCapture):
+        self.process_fn = process_fn
+        self.annotate_fn = annotate_fn
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.jpeg_quality = jpeg_quality
+        self.open_fn = open_fn
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, camera_id, source):
+        """Register a viewer of a camera, starting its reader if needed; returns the worker"""
+        with self._lock:
+            worker = self._workers.get(camera_id)
+            if worker is None or not worker.alive or worker.source != source:
+                if worker is not None:
+                    worker.stop()
+                worker = self._workers[camera_id] = CameraWorker(self, camera_id, source).start()
+            worker.subscribers += 1
+            return worker
+
+    def unsubscribe(self, worker):
+        with self._lock:
+            worker.subscribers -= 1
+            if worker.subscribers == 0:
+                worker.idle_since = time.monotonic()
+
+    def _retire_if_idle(self, worker):
+        with self._lock:
+            if worker.subscribers or time.monotonic() - worker.idle_since < self.idle_timeout:
+                return False
+            if self._workers.get(worker.camera_id) is worker:
+                del self._workers[worker.camera_id]
+            worker.stop()
+            return True
+
+    def latest(self, camera_id):
+        """(seq, frame, result) of a camera's most recent frame, or None if it is not being read"""
+        with self._lock:
+            worker = self._workers.get(camera_id)
+        if worker is None or worker.slot.seq == 0:
+            return None
+        slot = worker.slot
+        return slot.seq, slot.frame, slot.result
+
+    def stream(self, camera_id, source, wait_timeout=5.0):
+        """MJPEG multipart body for one viewer; ends when the reader stops or the client disconnects"""
+        worker = self.subscribe(camera_id, source)
+        try:
+            seq = 0
+            while True:
+                item = worker.slot.wait_newer(seq, wait_timeout)
+                if item is None:
+                    if not worker.alive:
+                        break
+                    continue
+                if seq and item[0] > seq + 1:
+                    worker.viewer_drops += item[0] - seq - 1
+                seq, jpeg = item
+                yield b'--' + MJPEG_BOUNDARY + b'\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+        finally:
+            self.unsubscribe(worker)
+
+    def stats(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        return {'cameras': [worker.stats() for worker in workers]}
+
+    def stop_all(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from utils.model_registry import INPUT_SHAPE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (1, 4, 8, 16, 32)
+
+
+def bucket_for(batch_size, buckets=DEFAULT_BUCKETS):
+    """Smallest bucket that holds the batch (the largest one if none does)"""
+    for bucket in buckets:
+        if batch_size <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def chunk_sizes(batch_size, buckets=DEFAULT_BUCKETS, max_padding=0.25):
+    """How a batch is split into calls: padded up to a bucket unless that wastes too many rows"""
+    sizes = []
+    while batch_size > 0:
+        bucket = bucket_for(batch_size, buckets)
+        if batch_size < bucket and bucket - batch_size > max_padding * bucket:
+            bucket = max([b for b in buckets if b <= batch_size], default=bucket)
+        sizes.append(min(bucket, batch_size))
+        batch_size -= sizes[-1]
+    return sizes
+
+
+class CompiledPredictor:
+    """Low-overhead replacement for `model.predict` on small serving batches.
+
+    `model.predict` builds a data adapter and a tf.data pipeline on every
+    call, which dominates the cost of a single frame. Here the model is traced
+    once per batch-size bucket into a concrete function with a fixed input
+    signature; a batch is zero-padded up to the next bucket, run, and the
+    padding rows dropped from the output. Batches above the largest bucket are
+    split, and so are batches that would be more than `max_padding` padding
+    (5 frames run as 4 + 1 rather than as 8). Call `warmup` at startup so no
+    request pays for tracing.
+    """
+
+    def __init__(self, model, input_shape=INPUT_SHAPE, buckets=DEFAULT_BUCKETS, max_padding=0.25):
+        import tensorflow as tf
+
+        self.model = model
+        self.input_shape = tuple(input_shape)
+        self.buckets = tuple(sorted(buckets))
+        self.max_padding = max_padding
+        self._tf = tf
+        self._call = tf.function(lambda images: model(images, training=False))
+        self._functions = {}
+        self._trace_lock = threading.Lock()
+        self._pad_buffers = threading.local()
+        self.warmed_up = False
+
+    def _function(self, bucket):
+        fn = self._functions.get(bucket)
+        if fn is None:
+            with self._trace_lock:
+                fn = self._functions.get(bucket)
+                if fn is None:
+                    spec = self._tf.TensorSpec((bucket,) + self.input_shape, self._tf.float32)
+                    fn = self._functions[bucket] = self._call.get_concrete_function(spec)
+        return fn
+
+    def bucket_for(self, batch_size):
+        return bucket_for(batch_size, self.buckets)
+
+    def chunk_sizes(self, batch_size):
+        return chunk_sizes(batch_size, self.buckets, self.max_padding)
+
+    def _padded(self, batch, bucket):
+        # Per-thread pad buffer per bucket; only the padding rows are zeroed
+        buffers = getattr(self._pad_buffers, 'by_bucket', None)
+        if buffers is None:
+            buffers = self._pad_buffers.by_bucket = {}
+        padded = buffers.get(bucket)
+        if padded is None:
+            padded = buffers[bucket] = np.zeros((bucket,) + self.input_shape, np.float32)
+        n = len(batch)
+        padded[:n] = batch
+        padded[n:] = 0
+        return padded
+
+    def _run(self, batch):
+        n = len(batch)
+        bucket = self.bucket_for(n)
+        inputs = batch if n == bucket else self._padded(batch, bucket)
+        return self._function(bucket)(self._tf.constant(inputs)).numpy()[:n]
+
+    def predict(self, batch):
+        """(N, H, W, C) float32 batch -> (N, classes) NumPy array, like model.predict"""
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == len(self.input_shape):
+            batch = batch[None]
+        sizes = self.chunk_sizes(len(batch))
+        if len(sizes) == 1:
+            return self._run(batch)
+        offsets = np.cumsum([0] + sizes)
+        return np.concatenate([self._run(batch[start:end]) for start, end in zip(offsets[:-1], offsets[1:])])
+
+    def warmup(self):
+        """Trace and run every bucket once"""
+        started = time.time()
+        for bucket in self.buckets:
+            self._function(bucket)(self._tf.zeros((bucket,) + self.input_shape, self._tf.float32))
+        self.warmed_up = True
+        logger.info(f'[CompiledPredictor] Warmed up buckets {self.buckets} in {time.time() - started:.2f}s')
+        return self
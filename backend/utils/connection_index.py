@@ -0,0 +1,135 @@
+import threading
+import time
+
+BROWSER = 'browser'
+ESP32 = 'esp32'
+
+
+def cart_room(cart_id):
+    """Socket.IO room joined by every browser watching a cart"""
+    return cart_id
+
+
+def camera_room(cart_id):
+    """Socket.IO room joined by the cart's ESP32 camera(s)"""
+    return f'{cart_id}:esp32'
+
+
+class ConnectionIndex:
+    """Socket.IO connections indexed by sid and by cart.
+
+    `connections` maps sid -> connection dict (same shape run.py always used).
+    Browser and ESP32 sids are also kept in per-cart sets so lookups for one
+    cart cost O(connections of that cart) instead of O(all connections).
+
+    With a `store` (see utils/state_store.py) the per-cart sets are mirrored
+    there as sorted sets scored by last-seen time, so counts and camera checks
+    cover every worker while `connections` only holds this worker's sids.
+    Each worker re-scores its sids with `heartbeat`; sids not seen for `ttl`
+    seconds (a crashed worker's) no longer count and are dropped on the next add.
+    """
+
+    def __init__(self, store=None, ttl=60):
+        self.connections = {}
+        self.store = store
+        self.ttl = ttl
+        self._browsers = {}
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _store_key(cart_id, client_type):
+        return f'cart:{cart_id}:{client_type}'
+
+    def _sets_for(self, client_type):
+        return self._cameras if client_type == ESP32 else self._browsers
+
+    def add(self, sid, cart_id, client_type, limit=None, **info):
+        """Register a connection; returns its dict, or None if the cart already has `limit` connections.
+
+        The limit check and the add are one atomic step, across workers with a store.
+        """
+        conn = dict(info, cart_id=cart_id, type=client_type)
+        if self.store is not None:
+            now = time.time()
+            other_type = BROWSER if client_type == ESP32 else ESP32
+            added = self.store.zadd_capped(
+                self._store_key(cart_id, client_type), sid, now,
+                limit if limit is not None else float('inf'), now - self.ttl, ttl=self.ttl,
+                shared_with=(self._store_key(cart_id, other_type),)
+            )
+            if not added:
+                return None
+        with self._lock:
+            if self.store is None and limit is not None and self._local_count(cart_id) >= limit:
+                return None
+            self.connections[sid] = conn
+            self._sets_for(client_type).setdefault(cart_id, set()).add(sid)
+        return conn
+
+    def heartbeat(self):
+        """Mark this worker's sids as alive in the store; call well within `ttl`"""
+        if self.store is None:
+            return
+        now = time.time()
+        for sid, conn in self.items():
+            self.store.zadd(self._store_key(conn['cart_id'], conn['type']), sid, now, ttl=self.ttl)
+
+    def remove(self, sid):
+        """Drop a connection; returns its dict, or None if the sid is unknown"""
+        with self._lock:
+            conn = self.connections.pop(sid, None)
+            if conn is None:
+                return None
+            sets = self._sets_for(conn['type'])
+            sids = sets.get(conn['cart_id'])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del sets[conn['cart_id']]
+        if self.store is not None:
+            self.store.zrem(self._store_key(conn['cart_id'], conn['type']), sid)
+        return conn
+
+    def get(self, sid):
+        return self.connections.get(sid)
+
+    def _live_sids(self, cart_id, client_type):
+        return self.store.zmembers(self._store_key(cart_id, client_type), time.time() - self.ttl)
+
+    def _local_count(self, cart_id):
+        return len(self._browsers.get(cart_id, ())) + len(self._cameras.get(cart_id, ()))
+
+    def browser_sids(self, cart_id):
+        if self.store is not None:
+            return self._live_sids(cart_id, BROWSER)
+        return set(self._browsers.get(cart_id, ()))
+
+    def camera_sids(self, cart_id):
+        if self.store is not None:
+            return self._live_sids(cart_id, ESP32)
+        return set(self._cameras.get(cart_id, ()))
+
+    def has_camera(self, cart_id):
+        if self.store is not None:
+            return bool(self._live_sids(cart_id, ESP32))
+        return bool(self._cameras.get(cart_id))
+
+    def count(self, cart_id):
+        if self.store is not None:
+            return len(self._live_sids(cart_id, BROWSER)) + len(self._live_sids(cart_id, ESP32))
+        return self._local_count(cart_id)
+
+    def has_cart(self, cart_id):
+        """Whether this worker holds any connection for the cart"""
+        return cart_id in self._browsers or cart_id in self._cameras
+
+    def items(self):
+        with self._lock:
+            return list(self.connections.items())
+
+    def __contains__(self, sid):
+        return sid in self.connections
+
+    def __len__(self):
+        return len(self.connections)
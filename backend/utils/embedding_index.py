@@ -0,0 +1,203 @@
+"""
+Nearest-neighbour product recognition over model embeddings.
+
+Instead of the fixed softmax head, a frame is embedded with the network's
+GlobalAveragePooling output and compared by cosine similarity with
+reference embeddings of every catalog product. New products only need a few
+reference images; nothing is retrained and the network is not reloaded.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BLOCK_ROWS = 4096
+
+
+def embedding_submodel(model):
+    """Keras model that outputs `model`'s GlobalAveragePooling2D features.
+
+    Shares layers (and weights) with the classifier, so no extra memory is
+    used for the backbone.
+    """
+    import tensorflow as tf
+
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D):
+            return tf.keras.Sequential(model.layers[:i + 1])
+    raise ValueError('Model has no GlobalAveragePooling2D layer to take embeddings from')
+
+
+def model_name(model_path):
+    """How an index records the model it was built with"""
+    return os.path.basename(model_path) if model_path else None
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _Snapshot:
+    """Immutable view published to readers: rows [0, count) of `matrix` are live"""
+
+    __slots__ = ('matrix', 'count', 'row_products', 'products')
+
+    def __init__(self, matrix, count, row_products, products):
+        self.matrix = matrix
+        self.count = count
+        self.row_products = row_products
+        self.products = products
+
+
+class EmbeddingIndex:
+    """In-memory cosine-similarity index of product reference embeddings.
+
+    Each product may have several reference rows (e.g. different angles); a
+    query's score for a product is its best row. Rows are L2-normalised.
+    Search is an exact vectorized matmul against the whole matrix: about a
+    millisecond per frame for a few thousand float32 rows (see
+    benchmarks/bench_embedding_index.py). float16 storage halves the memory
+    but searches slower, since NumPy has to upcast rows to use BLAS.
+
+    Readers work on an immutable snapshot and never lock. `add` appends into
+    spare capacity and publishes a new snapshot; `remove` rebuilds the matrix.
+
+    `model` names the model file whose features the rows are (see
+    `model_name`); embeddings of another model are not comparable.
+    """
+
+    def __init__(self, dim, dtype=np.float32, capacity=256, model=None):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.model = model
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot(np.zeros((capacity, dim), self.dtype), 0, np.empty(capacity, dtype=object), {})
+
+    def __len__(self):
+        return len(self._snapshot.products)
+
+    def add(self, product_id, name, embeddings, **info):
+        """Add reference embeddings for a product (appends to an existing product's rows)"""
+        rows = normalize(np.atleast_2d(embeddings))
+        if rows.shape[1] != self.dim:
+            raise ValueError(f'Expected {self.dim}-dimensional embeddings, got {rows.shape[1]}')
+        product_id = str(product_id)
+        with self._lock:
+            current = self._snapshot
+            count = current.count + len(rows)
+            matrix, row_products = current.matrix, current.row_products
+            if count > len(matrix):
+                capacity = max(count, 2 * len(matrix))
+                matrix = np.zeros((capacity, self.dim), self.dtype)
+                matrix[:current.count] = current.matrix[:current.count]
+                row_products = np.empty(capacity, dtype=object)
+                row_products[:current.count] = current.row_products[:current.count]
+            # Rows past current.count are invisible to existing snapshots, so writing them in place is safe
+            matrix[current.count:count] = rows
+            row_products[current.count:count] = product_id
+            products = dict(current.products)
+            previous = products.get(product_id, {})
+            products[product_id] = dict(previous, **info, name=name, references=previous.get('references', 0) + len(rows))
+            self._snapshot = _Snapshot(matrix, count, row_products, products)
+        return products[product_id]
+
+    def remove(self, product_id):
+        """Drop a product and all its reference rows; returns False if it was not indexed"""
+        product_id = str(product_id)
+        with self._lock:
+            current = self._snapshot
+            if product_id not in current.products:
+                return False
+            keep = current.row_products[:current.count] != product_id
+            live = current.matrix[:current.count][keep]
+            capacity = max(len(current.matrix), 1)
+            matrix = np.zeros((capacity, self.dim), self.dtype)
+            matrix[:len(live)] = live
+            row_products = np.empty(capacity, dtype=object)
+            row_products[:len(live)] = current.row_products[:current.count][keep]
+            products = dict(current.products)
+            del products[product_id]
+            self._snapshot = _Snapshot(matrix, len(live), row_products, products)
+        return True
+
+    def products(self):
+        return dict(self._snapshot.products)
+
+    def _scores(self, snapshot, queries):
+        # float16 rows are upcast a block at a time so the temporary stays small
+        scores = np.empty((len(queries), snapshot.count), np.float32)
+        for start in range(0, snapshot.count, SEARCH_BLOCK_ROWS):
+            block = snapshot.matrix[start:min(start + SEARCH_BLOCK_ROWS, snapshot.count)]
+            np.matmul(queries, block.astype(np.float32, copy=False).T, out=scores[:, start:start + len(block)])
+        return scores
+
+    def search(self, queries, k=1):
+        """Top-k products for each query embedding.
+
+        Returns one list per query of (product_id, name, similarity) tuples,
+        best first, with one entry per product.
+        """
+        snapshot = self._snapshot
+        queries = normalize(np.atleast_2d(queries))
+        if snapshot.count == 0:
+            return [[] for _ in range(len(queries))]
+        scores = self._scores(snapshot, queries)
+        results = []
+        for row_scores in scores:
+            # Products can own several rows, so look a little past k rows before de-duplicating
+            candidates = min(snapshot.count, k * 8)
+            if candidates < snapshot.count:
+                top = np.argpartition(-row_scores, candidates - 1)[:candidates]
+            else:
+                top = np.arange(snapshot.count)
+            best = {}
+            for row in top[np.argsort(-row_scores[top])]:
+                product_id = snapshot.row_products[row]
+                if product_id not in best:
+                    best[product_id] = float(row_scores[row])
+                    if len(best) == k:
+                        break
+            results.append([(pid, snapshot.products[pid]['name'], score) for pid, score in best.items()])
+        return results
+
+    def save(self, path):
+        """Write the index to an .npz file (matrix + product metadata)"""
+        snapshot = self._snapshot
+        np.savez_compressed(
+            path,
+            matrix=snapshot.matrix[:snapshot.count],
+            row_products=np.asarray(snapshot.row_products[:snapshot.count], dtype=str),
+            products=np.asarray(json.dumps(snapshot.products)),
+            model=np.asarray(self.model or '')
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        matrix = data['matrix']
+        # Indexes saved before the model was recorded have none
+        model = str(data['model']) if 'model' in data.files else ''
+        index = cls(matrix.shape[1], dtype=matrix.dtype, capacity=max(len(matrix), 256), model=model or None)
+        index._snapshot.matrix[:len(matrix)] = matrix
+        index._snapshot.row_products[:len(matrix)] = data['row_products']
+        index._snapshot = _Snapshot(index._snapshot.matrix, len(matrix), index._snapshot.row_products,
+                                    json.loads(str(data['products'])))
+        logger.info(f'[EmbeddingIndex] Loaded {len(index)} products ({len(matrix)} reference rows) from {path}')
+        return index
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'products': len(snapshot.products),
+            'reference_rows': snapshot.count,
+            'dim': self.dim,
+            'dtype': self.dtype.name,
+            'model': self.model,
+            'matrix_bytes': snapshot.count * self.dim * self.dtype.itemsize
+        }
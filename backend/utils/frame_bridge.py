@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _percentiles(samples):
+    if not samples:
+        return {'p50': None, 'p99': None}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+    return {'p50': pick(0.50), 'p99': pick(0.99)}
+
+
+class Subscription:
+    """Bounded per-subscriber frame queue; a slow consumer loses its oldest frames"""
+
+    def __init__(self, bridge, cart_id, maxsize):
+        self.bridge = bridge
+        self.cart_id = cart_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.bridge.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class FrameBridge:
+    """In-process pub/sub between the ESP32 websockets server and frame consumers.
+
+    Chunks are collected per cart until the final one arrives and the whole
+    frame is published once, so consumers (browser websockets, inference,
+    an optional remote forwarder) never see individual chunks and nothing
+    goes over loopback HTTP. Must be used from a single event loop.
+
+    Unfinished frames are dropped once older than `max_frame_age` seconds,
+    larger than `max_frame_bytes`, or (oldest first) when all carts together
+    buffer more than `max_pending_bytes`.
+    """
+
+    def __init__(self, subscriber_queue_size=2, max_frame_age=2.0, max_frame_bytes=4 * 1024 * 1024,
+                 max_pending_bytes=32 * 1024 * 1024):
+        self.subscriber_queue_size = subscriber_queue_size
+        self.max_frame_age = max_frame_age
+        self.max_frame_bytes = max_frame_bytes
+        self.max_pending_bytes = max_pending_bytes
+        self._pending = {}  # cart_id -> [first_chunk_at, [chunks], nbytes], oldest first
+        self._pending_bytes = 0
+        self._skipping = set()  # carts whose current frame was dropped: ignore chunks up to its final one
+        self._subscribers = {}  # cart_id or None (all carts) -> set of Subscription
+        self._chunks = 0
+        self._frames = 0
+        self._dropped_frames = 0
+        self._latencies = deque(maxlen=2048)
+
+    def _drop_pending(self, cart_id):
+        pending = self._pending.pop(cart_id, None)
+        if pending is not None:
+            self._pending_bytes -= pending[2]
+        return pending
+
+    def _evict(self, now, incoming):
+        while self._pending:
+            cart_id, (first_chunk_at, _, _) = next(iter(self._pending.items()))
+            if now - first_chunk_at <= self.max_frame_age and self._pending_bytes + incoming <= self.max_pending_bytes:
+                break
+            self._drop_pending(cart_id)
+            self._skipping.add(cart_id)
+            self._dropped_frames += 1
+            logger.warning(f'[FrameBridge] Dropped unfinished frame from cart {cart_id}')
+
+    def add_chunk(self, cart_id, chunk, final):
+        """Buffer one chunk; publish and return the joined frame when `final` is set"""
+        self._chunks += 1
+        now = time.perf_counter()
+        self._evict(now, len(chunk))
+        if cart_id in self._skipping:
+            if final:
+                self._skipping.discard(cart_id)
+            return None
+        pending = self._pending.get(cart_id)
+        if pending is None:
+            pending = self._pending[cart_id] = [now, [], 0]
+        pending[1].append(chunk)
+        pending[2] += len(chunk)
+        self._pending_bytes += len(chunk)
+        if pending[2] > self.max_frame_bytes:
+            self._drop_pending(cart_id)
+            if not final:
+                self._skipping.add(cart_id)
+            self._dropped_frames += 1
+            logger.warning(f'[FrameBridge] Frame from cart {cart_id} exceeds {self.max_frame_bytes} bytes, dropped')
+            return None
+        if not final:
+            return None
+        first_chunk_at, chunks, _ = self._drop_pending(cart_id)
+        frame = ''.join(chunks) if isinstance(chunk, str) else b''.join(chunks)
+        self.publish(cart_id, frame, first_chunk_at=first_chunk_at, chunk_count=len(chunks))
+        return frame
+
+    def publish(self, cart_id, frame, first_chunk_at=None, chunk_count=1):
+        message = {
+            'cart_id': cart_id,
+            'frame': frame,
+            'chunks': chunk_count,
+            'timestamp': time.time()
+        }
+        for subscription in self._subscribers.get(cart_id, ()):
+            subscription._offer(message)
+        for subscription in self._subscribers.get(None, ()):
+            subscription._offer(message)
+        self._frames += 1
+        if first_chunk_at is not None:
+            self._latencies.append(time.perf_counter() - first_chunk_at)
+
+    def subscribe(self, cart_id=None):
+        """Subscribe to one cart's frames, or to every cart with cart_id=None"""
+        subscription = Subscription(self, cart_id, self.subscriber_queue_size)
+        self._subscribers.setdefault(cart_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.cart_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.cart_id]
+
+    def discard(self, cart_id):
+        """Forget a cart's unfinished frame, e.g. when its camera disconnects"""
+        self._drop_pending(cart_id)
+        self._skipping.discard(cart_id)
+
+    def stats(self):
+        subscriptions = [s for subs in self._subscribers.values() for s in subs]
+        return {
+            'chunks': self._chunks,
+            'frames': self._frames,
+            'pending_frames': len(self._pending),
+            'pending_bytes': self._pending_bytes,
+            'dropped_frames': self._dropped_frames,
+            'subscribers': len(subscriptions),
+            'dropped_for_slow_subscribers': sum(s.dropped for s in subscriptions),
+            'assemble_latency_ms': _percentiles(self._latencies)
+        }
+
+
+class HTTPForwarder:
+    """Forward whole frames from a FrameBridge to a remote Socket.IO server.
+
+    Uses one long-lived, pooled aiohttp session instead of a session per chunk.
+    """
+
+    def __init__(self, bridge, url, pool_size=4, timeout=5):
+        self.bridge = bridge
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._latencies = deque(maxlen=2048)
+        self._forwarded = 0
+        self._failed = 0
+
+    async def run(self):
+        import aiohttp
+
+        subscription = self.bridge.subscribe()
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                async for message in subscription:
+                    started = time.perf_counter()
+                    try:
+                        async with session.post(self.url, json=message) as response:
+                            await response.read()
+                            if response.status != 200:
+                                raise RuntimeError(f'HTTP {response.status}')
+                        self._forwarded += 1
+                        self._latencies.append(time.perf_counter() - started)
+                    except Exception as e:
+                        self._failed += 1
+                        logger.error(f'[HTTPForwarder] Failed to forward frame for cart {message["cart_id"]}: {e}')
+        finally:
+            subscription.close()
+
+    def stats(self):
+        return {
+            'url': self.url,
+            'forwarded': self._forwarded,
+            'failed': self._failed,
+            'forward_latency_ms': _percentiles(self._latencies)
+        }
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = 32
+
+
+def frame_signature(img, size=SIGNATURE_SIZE):
+    """Downscaled grayscale thumbnail of a BGR frame, as float32 in [0, 1]"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32) * (1.0 / 255.0)
+
+
+def dhash(img, hash_size=8):
+    """64-bit difference hash of a BGR frame, stable under small lighting and JPEG changes"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class FrameGate:
+    """Skip inference for frames that look like the last classified one.
+
+    State is kept per key (cart id or camera id). A frame whose signature
+    differs from the last classified frame's by less than `threshold` (mean
+    absolute difference, 0-1) reuses that frame's prediction, unless the cached
+    prediction is older than `max_age` seconds. Thresholds can be overridden
+    per key with `configure`.
+    """
+
+    def __init__(self, threshold=0.02, max_age=5.0):
+        self.threshold = threshold
+        self.max_age = max_age
+        self._config = {}
+        self._entries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def configure(self, key, threshold=None, max_age=None, enabled=None):
+        with self._lock:
+            config = self._config.setdefault(key, {})
+            if threshold is not None:
+                config['threshold'] = float(threshold)
+            if max_age is not None:
+                config['max_age'] = float(max_age)
+            if enabled is not None:
+                config['enabled'] = bool(enabled)
+            return self._config_for(key)
+
+    def _config_for(self, key):
+        config = self._config.get(key, {})
+        return {
+            'threshold': config.get('threshold', self.threshold),
+            'max_age': config.get('max_age', self.max_age),
+            'enabled': config.get('enabled', True)
+        }
+
+    def lookup(self, key, signature, now=None):
+        """Return the cached prediction if `signature` matches the last classified frame, else None"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._stats.setdefault(key, {'frames': 0, 'skipped': 0})
+            stats['frames'] += 1
+            config = self._config_for(key)
+            entry = self._entries.get(key)
+            if not config['enabled'] or entry is None or now - entry['classified_at'] > config['max_age']:
+                return None
+            if entry['signature'].shape != signature.shape:
+                return None
+            if float(np.mean(np.abs(entry['signature'] - signature))) >= config['threshold']:
+                return None
+            stats['skipped'] += 1
+            return entry['result']
+
+    def store(self, key, signature, result, now=None):
+        """Remember the prediction made for the frame with this signature"""
+        with self._lock:
+            self._entries[key] = {
+                'signature': signature,
+                'result': result,
+                'classified_at': time.time() if now is None else now
+            }
+
+    def forget(self, key):
+        """Drop everything kept for a key: last frame, counters and per-key config"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stats.pop(key, None)
+            self._config.pop(key, None)
+
+    def stats(self, key=None):
+        with self._lock:
+            keys = [key] if key is not None else list(self._stats)
+            report = {}
+            for k in keys:
+                stats = self._stats.get(k, {'frames': 0, 'skipped': 0})
+                report[str(k)] = dict(stats, skip_rate=round(stats['skipped'] / stats['frames'], 3) if stats['frames'] else 0.0,
+                                      **self._config_for(k))
+            total_frames = sum(s['frames'] for s in self._stats.values())
+            total_skipped = sum(s['skipped'] for s in self._stats.values())
+        if key is not None:
+            return report[str(key)]
+        return {
+            'frames': total_frames,
+            'skipped': total_skipped,
+            'skip_rate': round(total_skipped / total_frames, 3) if total_frames else 0.0,
+            'keys': report
+        }
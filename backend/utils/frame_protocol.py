@@ -0,0 +1,90 @@
+"""
+Binary frame transport between the ESP32 cameras and the server.
+
+Each websocket/Socket.IO binary message carries one chunk of one JPEG frame:
+
+    +----------------+---------------------------------------------+---------------+
+    | header_len u16 | header (HEADER struct + cart_id utf-8 bytes) | JPEG payload  |
+    +----------------+---------------------------------------------+---------------+
+
+All integers are big-endian. The payload is raw JPEG bytes, so a frame costs
+about 25% fewer bytes on the wire than the base64 JSON chunks it replaces.
+"""
+import struct
+
+MAGIC = b'SC'
+PROTOCOL_VERSION = 1
+DEFAULT_CHUNK_SIZE = 8192
+
+HEADER_LEN = struct.Struct('!H')
+# magic, version, flags, frame_seq, chunk_index, total_chunks, frame_size, offset, cart_id_len
+HEADER = struct.Struct('!2sBBIHHIIB')
+
+FLAG_KEYFRAME = 0x01
+
+
+class FrameProtocolError(ValueError):
+    """Raised when a binary chunk cannot be parsed"""
+
+
+class FrameChunk:
+    """One parsed chunk. `payload` is a memoryview into the received message."""
+
+    __slots__ = ('cart_id', 'frame_seq', 'chunk_index', 'total_chunks', 'frame_size', 'offset', 'flags', 'payload')
+
+    def __init__(self, cart_id, frame_seq, chunk_index, total_chunks, frame_size, offset, flags, payload):
+        self.cart_id = cart_id
+        self.frame_seq = frame_seq
+        self.chunk_index = chunk_index
+        self.total_chunks = total_chunks
+        self.frame_size = frame_size
+        self.offset = offset
+        self.flags = flags
+        self.payload = payload
+
+
+def encode_chunk(cart_id, frame_seq, chunk_index, total_chunks, frame_size, offset, payload, flags=0):
+    """Build one binary chunk message"""
+    cart_id_bytes = cart_id.encode('utf-8')
+    if len(cart_id_bytes) > 255:
+        raise FrameProtocolError('cart_id is longer than 255 bytes')
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, flags, frame_seq & 0xFFFFFFFF, chunk_index,
+                         total_chunks, frame_size, offset, len(cart_id_bytes)) + cart_id_bytes
+    return HEADER_LEN.pack(len(header)) + header + bytes(payload)
+
+
+def encode_frame(cart_id, frame_seq, jpeg_bytes, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Split a JPEG frame into binary chunk messages, the same way the firmware does"""
+    view = memoryview(jpeg_bytes)
+    frame_size = len(view)
+    total_chunks = max(1, (frame_size + chunk_size - 1) // chunk_size)
+    return [
+        encode_chunk(cart_id, frame_seq, i, total_chunks, frame_size, i * chunk_size,
+                     view[i * chunk_size:(i + 1) * chunk_size])
+        for i in range(total_chunks)
+    ]
+
+
+def parse_chunk(message):
+    """Parse a binary chunk message without copying its payload"""
+    view = memoryview(message)
+    if len(view) < HEADER_LEN.size + HEADER.size:
+        raise FrameProtocolError('Message shorter than the frame header')
+    (header_len,) = HEADER_LEN.unpack_from(view, 0)
+    magic, version, flags, frame_seq, chunk_index, total_chunks, frame_size, offset, cart_id_len = \
+        HEADER.unpack_from(view, HEADER_LEN.size)
+    if magic != MAGIC:
+        raise FrameProtocolError('Bad magic')
+    if version != PROTOCOL_VERSION:
+        raise FrameProtocolError(f'Unsupported protocol version {version}')
+    if header_len != HEADER.size + cart_id_len:
+        raise FrameProtocolError('Header length does not match cart_id length')
+    if total_chunks == 0 or chunk_index >= total_chunks:
+        raise FrameProtocolError('Chunk index out of range')
+    cart_id_start = HEADER_LEN.size + HEADER.size
+    payload_start = HEADER_LEN.size + header_len
+    cart_id = bytes(view[cart_id_start:payload_start]).decode('utf-8')
+    payload = view[payload_start:]
+    if offset + len(payload) > frame_size:
+        raise FrameProtocolError('Chunk extends past the end of the frame')
+    return FrameChunk(cart_id, frame_seq, chunk_index, total_chunks, frame_size, offset, flags, payload)
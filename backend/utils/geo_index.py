@@ -0,0 +1,149 @@
+"""
+Radius search over latitude/longitude points.
+
+Points are bucketed into a fixed grid of `cell_deg` x `cell_deg` cells (a
+geohash at one precision), so a radius query only looks at the cells its
+bounding box covers and computes exact haversine distances, vectorized, for
+the points in those cells.
+"""
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to each of `lats`/`lons`"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lats - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, [(min_lon, max_lon), ...]) enclosing a circle.
+
+    Longitude comes back as one or two ranges: two when the box crosses the
+    antimeridian, the whole circle when it reaches a pole.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlon = math.degrees(math.asin(ratio))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+class _Cell:
+    __slots__ = ('points', 'arrays')
+
+    def __init__(self):
+        self.points = {}
+        self.arrays = None
+
+    def get_arrays(self):
+        # Cached until the cell changes
+        if self.arrays is None:
+            ids = list(self.points)
+            coords = np.array([self.points[i] for i in ids], dtype=np.float64).reshape(-1, 2)
+            self.arrays = (np.array(ids), coords[:, 0], coords[:, 1])
+        return self.arrays
+
+
+class GeoIndex:
+    """In-memory grid index of points keyed by id.
+
+    `upsert` and `remove` touch one or two cells, so the index is kept up to
+    date point by point instead of being rebuilt; `replace_all` loads a full
+    set. `query(lat, lon, radius_km)` returns (ids, distances) within the
+    radius, nearest first.
+    """
+
+    def __init__(self, cell_deg=0.1):
+        self.cell_deg = cell_deg
+        self._cells = {}
+        self._where = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, point_id):
+        return point_id in self._where
+
+    def _cell_key(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _remove_locked(self, point_id):
+        key = self._where.pop(point_id, None)
+        if key is None:
+            return
+        cell = self._cells[key]
+        del cell.points[point_id]
+        cell.arrays = None
+        if not cell.points:
+            del self._cells[key]
+
+    def _add_locked(self, point_id, lat, lon):
+        key = self._cell_key(lat, lon)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = _Cell()
+        cell.points[point_id] = (lat, lon)
+        cell.arrays = None
+        self._where[point_id] = key
+
+    def upsert(self, point_id, lat, lon):
+        with self._lock:
+            self._remove_locked(point_id)
+            self._add_locked(point_id, lat, lon)
+
+    def remove(self, point_id):
+        with self._lock:
+            self._remove_locked(point_id)
+
+    def replace_all(self, points):
+        """Replace the contents with (id, lat, lon) tuples"""
+        with self._lock:
+            self._cells = {}
+            self._where = {}
+            for point_id, lat, lon in points:
+                self._add_locked(point_id, lat, lon)
+
+    def _candidate_cells(self, lat, lon, radius_km):
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        rows = range(math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg) + 1)
+        cols = [c for lo, hi in lon_ranges
+                for c in range(math.floor(lo / self.cell_deg), math.floor(hi / self.cell_deg) + 1)]
+        if len(rows) * len(cols) >= len(self._cells):
+            # A box this large covers most cells anyway
+            return list(self._cells.values())
+        cells = (self._cells.get((row, col)) for row in rows for col in cols)
+        return [cell for cell in cells if cell is not None]
+
+    def query(self, lat, lon, radius_km):
+        with self._lock:
+            arrays = [cell.get_arrays() for cell in self._candidate_cells(lat, lon, radius_km)]
+        if not arrays:
+            return np.array([]), np.array([])
+        ids = np.concatenate([a[0] for a in arrays])
+        distances = haversine_km(lat, lon, np.concatenate([a[1] for a in arrays]), np.concatenate([a[2] for a in arrays]))
+        within = distances <= radius_km
+        ids, distances = ids[within], distances[within]
+        order = np.argsort(distances, kind='stable')
+        return ids[order], distances[order]
+
+    def stats(self):
+        with self._lock:
+            return {'points': len(self._where), 'cells': len(self._cells), 'cell_deg': self.cell_deg}
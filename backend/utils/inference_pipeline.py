@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class FrameDropped(Exception):
+    """Raised for a frame that was shed because a newer one from the same cart replaced it"""
+
+
+class InferencePipeline:
+    """Executor-backed frame pipeline for the asyncio (Quart) server.
+
+    Decoding/preprocessing runs in a thread pool, inference goes through a
+    MicroBatcher worker thread, and blocking file writes use a separate IO
+    pool, so the event loop only ever awaits. At most `max_in_flight` frames
+    are processed at once; frames beyond that wait per cart, and once a cart
+    has `max_pending_per_cart` frames waiting its oldest one is shed with
+    FrameDropped.
+    """
+
+    def __init__(self, preprocess_fn, batcher, max_in_flight=8, max_pending_per_cart=2,
+                 preprocess_workers=4, io_workers=2, release_fn=None):
+        self.preprocess_fn = preprocess_fn
+        self.release_fn = release_fn
+        self.batcher = batcher
+        self.max_in_flight = max_in_flight
+        self.max_pending_per_cart = max_pending_per_cart
+        self._preprocess_pool = ThreadPoolExecutor(max_workers=preprocess_workers, thread_name_prefix='preprocess')
+        self._io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='frame-io')
+        self._free_slots = max_in_flight
+        self._waiting = deque()  # (cart_id, future) in arrival order
+        self._waiting_per_cart = {}
+        self._processed = 0
+        self._dropped = 0
+        self._failed = 0
+
+    async def _acquire(self, cart_id):
+        if self._free_slots > 0:
+            self._free_slots -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        pending = self._waiting_per_cart.setdefault(cart_id, deque())
+        while len(pending) >= self.max_pending_per_cart:
+            oldest = pending.popleft()
+            if not oldest.done():
+                oldest.set_exception(FrameDropped(f'Frame for cart {cart_id} shed under load'))
+                self._dropped += 1
+        pending.append(waiter)
+        self._waiting.append((cart_id, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just before cancellation; pass it on
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiting:
+            cart_id, waiter = self._waiting.popleft()
+            pending = self._waiting_per_cart.get(cart_id)
+            if pending and pending[0] is waiter:
+                pending.popleft()
+            if not pending:
+                self._waiting_per_cart.pop(cart_id, None)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free_slots += 1
+
+    async def run_io(self, fn, *args):
+        """Run a blocking file operation on the IO pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, fn, *args)
+
+    async def predict(self, cart_id, image_data):
+        """Preprocess and classify one frame; returns the prediction row.
+
+        Raises FrameDropped if the frame was shed, ValueError if it could not
+        be decoded.
+        """
+        await self._acquire(cart_id)
+        model_input = None
+        batch_future = None
+        try:
+            loop = asyncio.get_running_loop()
+            model_input = await loop.run_in_executor(self._preprocess_pool, self.preprocess_fn, image_data)
+            if model_input is None:
+                raise ValueError('Failed to process image')
+            batch_future = self.batcher.submit(model_input)
+            # Shielded so a cancelled request does not cancel the batch Future
+            # while the batcher may still be reading the input buffer
+            predictions = await asyncio.shield(asyncio.wrap_future(batch_future))
+            self._processed += 1
+            return predictions
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._release()
+            if self.release_fn is not None and model_input is not None:
+                # The input buffer goes back only once the batcher has resolved its Future
+                if batch_future is None:
+                    self.release_fn(model_input)
+                else:
+                    batch_future.add_done_callback(lambda _: self.release_fn(model_input))
+
+    def stats(self):
+        return {
+            'in_flight': self.max_in_flight - self._free_slots,
+            'max_in_flight': self.max_in_flight,
+            'waiting': sum(len(p) for p in self._waiting_per_cart.values()),
+            'processed': self._processed,
+            'dropped': self._dropped,
+            'failed': self._failed,
+            'batcher': self.batcher.stats()
+        }
+
+    def shutdown(self):
+        self._preprocess_pool.shutdown(wait=False)
+        self._io_pool.shutdown(wait=False)
@@ -0,0 +1,188 @@
+"""
+List endpoints that do not build the whole list in memory.
+
+    ?limit=50&after=<id>    keyset page: rows with key > after, in key order;
+                            the next page's cursor is in X-Next-Cursor and a
+                            Link: <...>; rel="next" header
+    ?format=ndjson          (or Accept: application/x-ndjson) one JSON row
+                            per line instead of one JSON document
+
+Without ?limit the full list is streamed from a server-side cursor in the
+same JSON shape the endpoint always returned, so clients see no change.
+
+A database error after the first chunk cannot turn into an error status any
+more: it is logged and re-raised, so the server aborts the connection
+instead of ending a truncated body as if it were complete.
+
+Responses carry a weak ETag built from cheap fingerprints of the tables
+behind them (row count, max id, max updated_at) plus a per-table change
+counter in the state store, bumped on every commit that touches a tracked
+table. A matching If-None-Match gets 304 without reading any rows.
+"""
+import hashlib
+import json
+import logging
+import random
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH = 500
+MAX_PAGE = 1000
+
+_versions = {'store': None, 'tables': set()}
+
+
+def track_table_versions(store, *models):
+    """Count commits touching `models` in `store`, for table_etag"""
+    _versions['store'] = store
+    _versions['tables'].update(model.__tablename__ for model in models)
+
+
+def version_key(name):
+    return f'table_version:{name}'
+
+
+def bump_version(store, name):
+    # Random steps, so a counter restarted from zero cannot repeat an old ETag
+    store.incr(version_key(name), random.randint(1, 2 ** 31))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    tables = _versions['tables']
+    if not tables:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        name = getattr(obj, '__tablename__', None)
+        if name in tables:
+            session.info.setdefault('changed_tables', set()).add(name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_changed_tables(session):
+    for name in session.info.pop('changed_tables', ()):
+        bump_version(_versions['store'], name)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
+
+
+def wants_ndjson():
+    return request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON
+
+
+def make_etag(*parts):
+    """Weak ETag value of `parts` and everything in the request that changes the body"""
+    parts = parts + (sorted(request.args.items(multi=True)), wants_ndjson())
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:32]
+
+
+def table_etag(*models):
+    """ETag of the current contents of `models`' tables (see track_table_versions)"""
+    store = _versions['store']
+    parts = []
+    for model in models:
+        fingerprint = model.query.with_entities(func.count(), func.max(model.id), func.max(model.updated_at)).one()
+        version = store.get(version_key(model.__tablename__), 0) if store is not None else 0
+        parts.append([model.__tablename__, list(fingerprint), version])
+    return make_etag(*parts)
+
+
+def not_modified(etag):
+    """304 response if the client already has `etag`, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Vary'] = 'Accept'
+        return response
+    return None
+
+
+def page_args(cursor_type=int):
+    """(limit or None, after or None) from ?limit=&after="""
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE)
+    return limit, request.args.get('after', type=cursor_type)
+
+
+def keyset(query, key_column, key=lambda row: row.id):
+    """(rows, next cursor) for the request's ?limit=&after= over integer `key_column`.
+
+    Without ?limit, rows is the whole ordered query, fetched STREAM_BATCH
+    rows at a time, and the cursor is None.
+    """
+    limit, after = page_args(int)
+    if after is not None:
+        query = query.filter(key_column > after)
+    query = query.order_by(key_column)
+    if limit is None:
+        return query.yield_per(STREAM_BATCH), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], key(rows[limit - 1])
+    return rows, None
+
+
+def list_response(rows, serialize, etag=None, next_cursor=None, wrap=None, as_object=False):
+    """Stream `rows` as JSON (or NDJSON) without holding the serialized list.
+
+    `serialize(row)` returns a JSON-able value, or a (key, value) pair with
+    as_object=True, which renders the rows as one JSON object. `wrap` puts
+    the list under a key: {"<wrap>": [...]}. In NDJSON each line is one row
+    (one single-key object with as_object=True).
+    """
+    provider = current_app.json
+    ndjson = wants_ndjson()
+
+    def dumps(value):
+        # Same encoding as jsonify (sorted keys, dates), compact
+        return provider.dumps(value, separators=(',', ':'))
+
+    def encode(row):
+        value = serialize(row)
+        if ndjson:
+            return dumps(dict([value]) if as_object else value) + '\n'
+        return f'{json.dumps(str(value[0]))}:{dumps(value[1])}' if as_object else dumps(value)
+
+    def generate():
+        # One chunk per STREAM_BATCH rows rather than a write per row
+        opening, closing = ('{', '}') if as_object else ('[', ']')
+        if wrap:
+            opening, closing = f'{{{json.dumps(wrap)}:{opening}', f'{closing}}}'
+        separator = '' if ndjson else ','
+        chunk = [] if ndjson else [opening]
+        first = True
+        try:
+            for row in rows:
+                chunk.append(encode(row) if first else separator + encode(row))
+                first = False
+                if len(chunk) >= STREAM_BATCH:
+                    yield ''.join(chunk)
+                    chunk = []
+        except Exception as e:
+            # The 200 is already sent: abort the connection so the client sees a failure
+            logger.error(f'[Listing] {request.path} failed mid-stream: {str(e)}')
+            raise
+        if not ndjson:
+            chunk.append(closing + '\n')
+        if chunk:
+            yield ''.join(chunk)
+
+    response = Response(stream_with_context(generate()), mimetype=NDJSON if ndjson else 'application/json')
+    response.headers['Vary'] = 'Accept'
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    if next_cursor is not None:
+        args = [(k, v) for k, v in request.args.items(multi=True) if k != 'after'] + [('after', next_cursor)]
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+MODEL_WEIGHTS_DIR = os.path.join(BASE_DIR, 'ml_models', 'weights')
+# A .tflite file (see ml_models/training/export_tflite.py) is served with the TFLite backend
+DEFAULT_MODEL_PATH = os.environ.get('PRODUCT_MODEL_PATH', os.path.join(MODEL_WEIGHTS_DIR, 'product_model3_finetuned.h5'))
+DEFAULT_CLASS_INDICES_PATH = os.path.join(BASE_DIR, 'ml_models', 'training', 'class_indices.json')
+INPUT_SHAPE = (224, 224, 3)
+
+
+def load_class_indices(class_indices_path):
+    """Load a class_indices.json file and return an index -> label mapping"""
+    with open(class_indices_path, 'r') as f:
+        class_indices = json.load(f)
+    return {int(v): k for k, v in class_indices.items()}
+
+
+class LoadedModel:
+    """A loaded model together with its label map and compiled inference function.
+
+    Instances are never swapped out from under a request: one that grabbed a
+    LoadedModel keeps using it even if the registry swaps in a newer model
+    meanwhile. The only state added later is the lazily built embedder.
+    """
+
+    def __init__(self, model, idx_to_class, infer_fn, model_path, version, backend='keras'):
+        self.model = model
+        self.idx_to_class = idx_to_class
+        self.infer_fn = infer_fn
+        self.model_path = model_path
+        self.version = version
+        self.backend = backend
+        self.loaded_at = time.time()
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+
+    def predict(self, batch):
+        """Run inference on a (N, 224, 224, 3) batch and return a NumPy array of probabilities"""
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.infer_fn(batch)
+
+    @property
+    def can_embed(self):
+        return self.backend == 'keras'
+
+    def embed(self, batch):
+        """GlobalAveragePooling features for a (N, 224, 224, 3) batch (Keras models only)"""
+        embedder = self._embedder
+        if embedder is None:
+            if not self.can_embed:
+                raise NotImplementedError(f'Embeddings need the Keras model, not a {self.backend} model')
+            from utils.compiled_model import CompiledPredictor
+            from utils.embedding_index import embedding_submodel
+
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = CompiledPredictor(embedding_submodel(self.model)).warmup()
+                embedder = self._embedder
+        return embedder.predict(np.asarray(batch, dtype=np.float32))
+
+    def label(self, class_idx):
+        return self.idx_to_class.get(int(class_idx), 'Unknown or Not Recognized')
+
+
+class ModelRegistry:
+    """Process-wide holder for the product classifier.
+
+    The model and its label map are loaded once (at startup or on first use)
+    and shared across all request threads. `swap` loads a replacement in the
+    background of the caller and publishes it atomically.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, class_indices_path=DEFAULT_CLASS_INDICES_PATH):
+        self.model_path = model_path
+        self.class_indices_path = class_indices_path
+        self._current = None
+        self._version = 0
+        self._load_lock = threading.Lock()
+
+    def _build(self, model_path, class_indices_path):
+        started = time.time()
+        idx_to_class = load_class_indices(class_indices_path)
+        if model_path.endswith('.tflite'):
+            from utils.tflite_backend import TFLiteClassifier
+
+            backend = 'tflite'
+            model = TFLiteClassifier(model_path)
+            infer_fn = model.predict
+        else:
+            import tensorflow as tf
+            from utils.compiled_model import CompiledPredictor
+
+            backend = 'keras'
+            model = tf.keras.models.load_model(model_path, compile=False)
+            # Traced once per batch-size bucket, so the first real frame does not pay for tracing
+            infer_fn = CompiledPredictor(model).warmup().predict
+        self._version += 1
+        logger.info(f'[ModelRegistry] Loaded {model_path} ({backend}, v{self._version}) in {time.time() - started:.2f}s')
+        return LoadedModel(model, idx_to_class, infer_fn, model_path, self._version, backend)
+
+    def get(self):
+        """Return the current LoadedModel, loading it on first use"""
+        current = self._current
+        if current is not None:
+            return current
+        with self._load_lock:
+            if self._current is None:
+                self._current = self._build(self.model_path, self.class_indices_path)
+            return self._current
+
+    def load(self):
+        """Eagerly load the model, e.g. at server startup"""
+        return self.get()
+
+    def is_loaded(self):
+        return self._current is not None
+
+    def swap(self, model_path=None, class_indices_path=None):
+        """Load a new model file and replace the current one.
+
+        In-flight requests keep the LoadedModel they already hold; new requests
+        see the replacement as soon as it is published. If loading fails the
+        current model stays in place and the error is raised to the caller.
+        """
+        model_path = model_path or self.model_path
+        class_indices_path = class_indices_path or self.class_indices_path
+        with self._load_lock:
+            replacement = self._build(model_path, class_indices_path)
+            self.model_path = model_path
+            self.class_indices_path = class_indices_path
+            self._current = replacement
+        return replacement
+
+    def predict(self, batch, model=None):
+        """Predict with `model` if the caller pinned one, else the current model"""
+        return (model or self.get()).predict(batch)
+
+    def embed(self, batch, model=None):
+        return (model or self.get()).embed(batch)
+
+    def info(self):
+        current = self._current
+        if current is None:
+            return {'loaded': False, 'model_path': self.model_path}
+        return {
+            'loaded': True,
+            'model_path': current.model_path,
+            'version': current.version,
+            'backend': current.backend,
+            'num_classes': len(current.idx_to_class),
+            'loaded_at': current.loaded_at
+        }
+
+
+product_model_registry = ModelRegistry()
@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+
+
+class CartPredictions:
+    """Ring buffer of one cart's recent predictions.
+
+    Writers serialise on the cart's own lock. Readers only read `latest`
+    (replaced, never mutated) or copy `history`, so they never wait on a lock.
+    """
+
+    __slots__ = ('history', 'latest', 'seq', 'lock')
+
+    def __init__(self, history_size):
+        self.history = deque(maxlen=history_size)
+        self.latest = None
+        self.seq = 0
+        self.lock = threading.Lock()
+
+
+class PredictionStore:
+    """Latest prediction and recent history per cart.
+
+    Every record carries the prediction fields plus cart_id, source ('local',
+    'cache', 'gemini', ...), latency_ms, timestamp and a per-cart seq number
+    that increases with each record, so clients can ask for anything newer
+    than the last seq they saw (see wait_for).
+
+    With a shared state store (STATE_STORE_URL=redis://...) the latest record
+    and the seq counter also live in the store, so any worker can answer for
+    any cart; history stays with the worker that produced it. The per-cart
+    keys expire `ttl` seconds after the cart's last record. After `subscribe`,
+    records from every worker are also published to this one, so waiters
+    read local memory instead of polling the store.
+    """
+
+    def __init__(self, history_size=32, shared_store=None, shared_key='predictions', ttl=3600):
+        self.history_size = history_size
+        self.shared_store = shared_store
+        self.shared_key = shared_key
+        self.ttl = ttl
+        self._carts = {}
+        self._carts_lock = threading.Lock()
+        self._last_cart_id = None
+        self._subscribed = False
+
+    def _latest_key(self, cart_id):
+        return f'{self.shared_key}:latest:{cart_id}'
+
+    def _next_seq(self, cart_id):
+        key = f'{self.shared_key}:seq:{cart_id}'
+        seq = self.shared_store.incr(key, ttl=self.ttl)
+        if seq == 1:
+            # New or expired counter: jump past any seq a client may still be waiting above
+            seq = self.shared_store.incr(key, int(time.time() * 1000), ttl=self.ttl)
+        return seq
+
+    def subscribe(self):
+        """Hear about other workers' records through the store's pub/sub"""
+        if self.shared_store is None or self._subscribed:
+            return
+        self.shared_store.subscribe(f'{self.shared_key}:updates', self._remember)
+        self._subscribed = True
+
+    def _remember(self, entry):
+        # Keep whichever is newer: what this worker recorded or what it heard about
+        cart = self._cart(entry['cart_id'])
+        current = cart.latest
+        if current is None or entry['seq'] > current['seq']:
+            cart.latest = entry
+
+    def _read_shared(self, cart_id):
+        entry = self.shared_store.get(self._latest_key(cart_id))
+        if entry is not None and self._subscribed:
+            self._remember(entry)
+        return entry
+
+    def _cart(self, cart_id):
+        cart = self._carts.get(cart_id)
+        if cart is None:
+            with self._carts_lock:
+                cart = self._carts.setdefault(cart_id, CartPredictions(self.history_size))
+        return cart
+
+    def record(self, cart_id, result, source, latency_ms=None, timestamp=None):
+        """Append a prediction for the cart and return the stored record"""
+        cart = self._cart(cart_id)
+        with cart.lock:
+            if self.shared_store is not None:
+                seq = self._next_seq(cart_id)
+            elif cart.seq:
+                seq = cart.seq + 1
+            else:
+                # New cart (or one dropped by expire/a restart): start above any seq
+                # a client may still be waiting on, like _next_seq does
+                seq = int(time.time() * 1000)
+            entry = dict(
+                result,
+                cart_id=cart_id,
+                source=source,
+                latency_ms=None if latency_ms is None else round(latency_ms, 2),
+                timestamp=timestamp or time.time(),
+                seq=seq
+            )
+            cart.history.append(entry)
+            cart.seq = seq
+            if cart.latest is None or seq > cart.latest['seq']:
+                cart.latest = entry
+        self._last_cart_id = cart_id
+        if self.shared_store is not None:
+            self.shared_store.set(self._latest_key(cart_id), entry, ttl=self.ttl)
+            self.shared_store.set(f'{self.shared_key}:last_cart', cart_id, ttl=self.ttl)
+            self.shared_store.publish(f'{self.shared_key}:updates', entry)
+        return entry
+
+    def latest(self, cart_id):
+        cart = self._carts.get(cart_id)
+        local = None if cart is None else cart.latest
+        if self.shared_store is not None and (local is None or not self._subscribed):
+            return self._read_shared(cart_id)
+        return local
+
+    def last_cart_id(self):
+        """Cart that recorded a prediction most recently"""
+        if self.shared_store is not None:
+            return self.shared_store.get(f'{self.shared_key}:last_cart')
+        return self._last_cart_id
+
+    def history(self, cart_id, limit=None):
+        """Recent records for the cart, oldest first"""
+        cart = self._carts.get(cart_id)
+        if cart is None:
+            return []
+        entries = list(cart.history)
+        return entries[-limit:] if limit else entries
+
+    def wait_for(self, cart_id, since=0, timeout=25.0, sleep=time.sleep, interval=0.05, refresh=5.0):
+        """Return the cart's latest record once its seq is above `since`, or None on timeout.
+
+        A `since` above the current seq comes from a counter that has since
+        been reset, so the current record is returned at once.
+
+        Checks a single attribute per `interval`; pass the server's cooperative
+        sleep (e.g. socketio.sleep) so waiting clients do not block the event
+        loop. With a shared store the store is read once, then (once
+        subscribed) only every `refresh` seconds in case a message was lost;
+        unsubscribed it is read every `interval`.
+        """
+        deadline = time.monotonic() + timeout
+        next_read = 0.0
+        while True:
+            now = time.monotonic()
+            authoritative = self.shared_store is None or not self._subscribed or now >= next_read
+            if self.shared_store is not None and authoritative:
+                entry = self._read_shared(cart_id)
+                next_read = now + refresh
+            else:
+                cart = self._carts.get(cart_id)
+                entry = None if cart is None else cart.latest
+            if entry is not None and entry['seq'] != since:
+                if entry['seq'] > since or authoritative:
+                    return entry
+                # The local copy may lag a record another worker already served
+                next_read = 0.0
+                continue
+            if now >= deadline:
+                return None
+            sleep(interval)
+
+    def expire(self, max_age, now=None):
+        """Drop carts whose latest prediction is older than max_age seconds"""
+        now = now or time.time()
+        with self._carts_lock:
+            stale = [cart_id for cart_id, cart in self._carts.items()
+                     if cart.latest is None or now - cart.latest['timestamp'] > max_age]
+            for cart_id in stale:
+                del self._carts[cart_id]
+        return len(stale)
+
+    def stats(self):
+        carts = list(self._carts.values())
+        return {
+            'carts': len(carts),
+            'history_size': self.history_size,
+            'buffered_records': sum(len(cart.history) for cart in carts),
+            'shared': self.shared_store is not None
+        }
@@ -0,0 +1,176 @@
+"""
+Shared JPEG -> model input preprocessing for every inference path.
+
+The serving contract matches training (ml_models/training/finetuned.py):
+RGB channel order, float32 in [0, 1], 224x224, area ("box") downscaling.
+No float64 temporaries are created along the way.
+
+JPEGs are decoded at reduced resolution (libjpeg scales the DCT blocks, so
+the full-size image is never materialised): a 640x480 frame decodes straight
+to 320x240 before the final resize. Single frames are written into a
+caller-supplied buffer, usually taken from an InputBufferPool, and lists of
+frames become one contiguous NHWC or NCHW batch (preprocess_batch).
+tools/check_preprocessing.py compares these tensors with the training ones.
+"""
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+INPUT_SIZE = (224, 224)
+SCALE = np.float32(1.0 / 255.0)
+
+# Largest factor first; cv2 reduced-decode flags for 1/2, 1/4 and 1/8 scale
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# SOF markers carrying the frame size (baseline, extended, progressive, lossless, ...)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_scratch = threading.local()
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG's SOF header without decoding it, or None if not a JPEG"""
+    view = memoryview(data)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 9 <= len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack_from('>H', view, pos + 2)[0]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack_from('>HH', view, pos + 5)
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def reduction_factor(size, target_size=INPUT_SIZE):
+    """Largest DCT scale-down (1, 2, 4 or 8) that keeps the frame at least target_size"""
+    if size is None:
+        return 1
+    width, height = size
+    for factor, _ in _REDUCED_FLAGS:
+        if width // factor >= target_size[0] and height // factor >= target_size[1]:
+            return factor
+    return 1
+
+
+def decode_image(data, target_size=INPUT_SIZE):
+    """Decode encoded image bytes to BGR uint8, at the smallest JPEG scale not below target_size.
+
+    Returns None if the bytes cannot be decoded. Non-JPEG formats decode at full size.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    factor = reduction_factor(jpeg_size(data), target_size)
+    flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+    return cv2.imdecode(buf, flag)
+
+
+def _scratch_u8(target_size):
+    shape = (target_size[1], target_size[0], 3)
+    buf = getattr(_scratch, 'u8', None)
+    if buf is None or buf.shape != shape:
+        buf = _scratch.u8 = np.empty(shape, np.uint8)
+    return buf
+
+
+def _resize_into(img, dst, target_size):
+    # Area averaging for downscales (PIL 'box' in training); frames smaller than the input are upscaled bilinearly
+    interpolation = cv2.INTER_AREA if img.shape[1] >= target_size[0] and img.shape[0] >= target_size[1] else cv2.INTER_LINEAR
+    cv2.resize(img, target_size, dst=dst, interpolation=interpolation)
+
+
+def to_model_input(img, out=None, target_size=INPUT_SIZE):
+    """BGR uint8 image (as decoded by OpenCV) -> (H, W, 3) RGB float32 in [0, 1], written into `out` if given"""
+    if out is None:
+        out = np.empty((target_size[1], target_size[0], 3), np.float32)
+    resized = _scratch_u8(target_size)
+    _resize_into(img, resized, target_size)
+    np.multiply(resized[..., ::-1], SCALE, out=out, casting='unsafe')
+    return out
+
+
+def preprocess_jpeg(data, out=None, target_size=INPUT_SIZE):
+    """Encoded image bytes -> (H, W, 3) RGB float32 model input, or None if undecodable"""
+    img = decode_image(data, target_size)
+    if img is None:
+        return None
+    return to_model_input(img, out, target_size)
+
+
+def preprocess_batch(frames, layout='NHWC', out=None, target_size=INPUT_SIZE):
+    """Preprocess a list of frames into one contiguous float32 batch.
+
+    Frames may be encoded image bytes or decoded BGR uint8 arrays. Each frame
+    is resized into a shared uint8 batch; channel reordering, NCHW transposition
+    and scaling then happen in a single vectorized pass. Raises ValueError if a
+    frame cannot be decoded. `layout` is 'NHWC' (Keras/TFLite) or 'NCHW'.
+    """
+    if layout not in ('NHWC', 'NCHW'):
+        raise ValueError(f'Unknown layout: {layout}')
+    width, height = target_size
+    staged = np.empty((len(frames), height, width, 3), np.uint8)
+    for i, frame in enumerate(frames):
+        img = frame if isinstance(frame, np.ndarray) else decode_image(frame, target_size)
+        if img is None:
+            raise ValueError(f'Could not decode frame {i}')
+        _resize_into(img, staged[i], target_size)
+    rgb = staged[..., ::-1]
+    if layout == 'NCHW':
+        rgb = rgb.transpose(0, 3, 1, 2)
+    if out is None:
+        out = np.empty(rgb.shape, np.float32)
+    np.multiply(rgb, SCALE, out=out, casting='unsafe')
+    return out
+
+
+class InputBufferPool:
+    """Reusable float32 model-input buffers.
+
+    `acquire` hands out a free buffer (allocating one if all are in use) and
+    `release` returns it once the batcher is done with the frame, or
+    `release_after` once the frame's batcher Future is done, however long the
+    caller waits for it. At most `max_free` idle buffers are kept.
+    """
+
+    def __init__(self, shape=(INPUT_SIZE[1], INPUT_SIZE[0], 3), preallocate=4, max_free=32):
+        self.shape = shape
+        self.max_free = max_free
+        self._free = [np.empty(shape, np.float32) for _ in range(preallocate)]
+        self._lock = threading.Lock()
+        self._allocated = preallocate
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self._allocated += 1
+        return np.empty(self.shape, np.float32)
+
+    def release(self, buf):
+        if buf is None or buf.shape != self.shape or buf.dtype != np.float32:
+            return
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buf)
+
+    def release_after(self, buf, future):
+        # The batcher reads the buffer until it resolves the future; a caller that
+        # times out must not hand the buffer to the next frame before that
+        future.add_done_callback(lambda _: self.release(buf))
+
+    def stats(self):
+        with self._lock:
+            return {'allocated': self._allocated, 'free': len(self._free)}
+
+
+input_buffers = InputBufferPool()
@@ -0,0 +1,56 @@
+"""
+Count the SQL statements a block of code issues.
+
+Meant for checks that an endpoint's statement count stays fixed however
+many rows it returns (i.e. no N+1 lazy loads):
+
+    with count_queries(db.engine) as queries:
+        client.get('/admin/carts/active')
+    assert queries.count == 2, queries.statements
+
+    with expect_queries(db.engine, 2):
+        client.get('/admin/carts/active')
+"""
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Records every statement executed on `engine` while active (a context manager)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+
+def count_queries(engine):
+    return QueryCounter(engine)
+
+
+class expect_queries(QueryCounter):
+    """Like count_queries, but raises AssertionError on exit unless exactly `expected` statements ran"""
+
+    def __init__(self, engine, expected):
+        super().__init__(engine)
+        self.expected = expected
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        if exc_type is None and self.count != self.expected:
+            listing = '\n'.join(f'  {i + 1}. {" ".join(s.split())[:200]}' for i, s in enumerate(self.statements))
+            raise AssertionError(f'Expected {self.expected} SQL statements, got {self.count}:\n{listing}')
+        return False
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class PartialFrame:
+    """Chunks received so far for one (cart_id, frame_seq).
+
+    Frames with a known size (binary protocol) are written straight into a
+    preallocated bytearray at each chunk's offset. Legacy frames without
+    offsets keep their pieces by chunk index (only the chunks that arrived)
+    and are joined on completion.
+    """
+
+    __slots__ = ('cart_id', 'frame_seq', 'total_chunks', 'frame_size', 'buffer', 'pieces',
+                 'bitmap', 'received', 'bytes_received', 'nbytes', 'created_at', 'updated_at')
+
+    def __init__(self, cart_id, frame_seq, total_chunks, frame_size, now):
+        self.cart_id = cart_id
+        self.frame_seq = frame_seq
+        self.total_chunks = total_chunks
+        self.frame_size = frame_size
+        self.buffer = bytearray(frame_size) if frame_size is not None else None
+        self.pieces = None if frame_size is not None else {}
+        self.bitmap = 0
+        self.received = 0
+        self.bytes_received = 0
+        self.nbytes = frame_size if frame_size is not None else 0
+        self.created_at = now
+        self.updated_at = now
+
+    def is_complete(self):
+        return self.received == self.total_chunks
+
+    def is_covered(self):
+        # Binary frames: the chunks' bytes must fill the buffer exactly, with no gaps or overlaps
+        return self.buffer is None or self.bytes_received == self.frame_size
+
+    def missing_chunks(self):
+        # Open-ended frames (total_chunks None until the final chunk): gaps so far
+        total = self.bitmap.bit_length() if self.total_chunks is None else self.total_chunks
+        return [i for i in range(total) if not self.bitmap & (1 << i)]
+
+    def assemble(self):
+        if self.buffer is not None:
+            return self.buffer
+        return b''.join(self.pieces[i] for i in range(self.total_chunks))
+
+
+class FrameReassembler:
+    """Reassemble chunked camera frames keyed by (cart_id, frame_seq).
+
+    Chunks may arrive in any order and frames may interleave, so a late chunk
+    of frame N never disturbs frame N+1. Incomplete frames are evicted once
+    they are older than `max_frame_age` seconds, when a cart has more than
+    `max_frames_per_cart` frames in flight, or when the buffered bytes across
+    all carts would exceed `max_memory_bytes` (oldest first). Chunks claiming
+    more than `max_chunks` chunks per frame are rejected outright.
+    """
+
+    def __init__(self, max_memory_bytes=32 * 1024 * 1024, max_frame_age=2.0, max_frames_per_cart=4,
+                 max_frame_size=2 * 1024 * 1024, max_chunks=1024, completed_history=32):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_frame_age = max_frame_age
+        self.max_frames_per_cart = max_frames_per_cart
+        self.max_frame_size = max_frame_size
+        self.max_chunks = max_chunks
+        self.completed_history = completed_history
+        self._frames = OrderedDict()  # (cart_id, frame_seq) -> PartialFrame, oldest first
+        self._completed = {}  # cart_id -> recently completed frame_seqs
+        self._cart_stats = {}
+        self._memory = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty_stats():
+        return {'completed': 0, 'dropped': 0, 'partial': 0, 'duplicate_chunks': 0, 'late_chunks': 0}
+
+    def _stats_for(self, cart_id):
+        stats = self._cart_stats.get(cart_id)
+        if stats is None:
+            stats = self._empty_stats()
+            self._cart_stats[cart_id] = stats
+        return stats
+
+    def _drop(self, key):
+        frame = self._frames.pop(key)
+        self._memory -= frame.nbytes
+        stats = self._stats_for(frame.cart_id)
+        stats['partial'] -= 1
+        stats['dropped'] += 1
+        return frame
+
+    def _expire(self, now):
+        while self._frames:
+            key, frame = next(iter(self._frames.items()))
+            if now - frame.created_at <= self.max_frame_age:
+                break
+            self._drop(key)
+
+    def _make_room(self, cart_id, nbytes):
+        in_flight = [key for key in self._frames if key[0] == cart_id]
+        while len(in_flight) >= self.max_frames_per_cart:
+            self._drop(in_flight.pop(0))
+        while self._frames and self._memory + nbytes > self.max_memory_bytes:
+            self._drop(next(iter(self._frames)))
+
+    def add(self, cart_id, frame_seq, chunk_index, total_chunks, payload, frame_size=None, offset=None, now=None,
+            final=False):
+        """Add one chunk. Returns the assembled frame once all chunks are in, else None.
+
+        `frame_size` and `offset` come from the binary protocol; without them
+        the chunk is stored by index and joined when the frame completes.
+        Senders that do not know the chunk count up front pass
+        total_chunks=None and final=True on the last chunk.
+        Raises ValueError for chunks that contradict their frame's header.
+        """
+        now = time.time() if now is None else now
+        if total_chunks is None and final:
+            total_chunks = chunk_index + 1
+        if total_chunks is not None and total_chunks > self.max_chunks:
+            raise ValueError(f'Frame of {total_chunks} chunks exceeds the {self.max_chunks} chunk limit')
+        if not 0 <= chunk_index < (self.max_chunks if total_chunks is None else total_chunks):
+            raise ValueError('Chunk index out of range')
+        if frame_size is not None and frame_size > self.max_frame_size:
+            raise ValueError(f'Frame of {frame_size} bytes exceeds the {self.max_frame_size} byte limit')
+        key = (cart_id, frame_seq)
+
+        with self._lock:
+            self._expire(now)
+            stats = self._stats_for(cart_id)
+            if frame_seq in self._completed.get(cart_id, ()):
+                stats['late_chunks'] += 1
+                return None
+
+            frame = self._frames.get(key)
+            if frame is None:
+                self._make_room(cart_id, frame_size or len(payload))
+                frame = PartialFrame(cart_id, frame_seq, total_chunks, frame_size, now)
+                self._frames[key] = frame
+                self._memory += frame.nbytes
+                stats['partial'] += 1
+            elif frame.frame_size != frame_size:
+                raise ValueError('Chunk header does not match its frame')
+            elif total_chunks is not None and frame.total_chunks != total_chunks:
+                if frame.total_chunks is not None or frame.bitmap >> total_chunks:
+                    raise ValueError('Chunk header does not match its frame')
+                # The final chunk of an open-ended frame fixes its length
+                frame.total_chunks = total_chunks
+            elif frame.total_chunks is not None and chunk_index >= frame.total_chunks:
+                raise ValueError('Chunk index out of range')
+
+            bit = 1 << chunk_index
+            if frame.bitmap & bit:
+                stats['duplicate_chunks'] += 1
+                return None
+            if frame.buffer is not None:
+                if offset is None or offset + len(payload) > frame.frame_size:
+                    raise ValueError('Chunk extends past the end of the frame')
+                memoryview(frame.buffer)[offset:offset + len(payload)] = payload
+                frame.bytes_received += len(payload)
+            else:
+                frame.pieces[chunk_index] = bytes(payload)
+                frame.nbytes += len(payload)
+                self._memory += len(payload)
+                while self._memory > self.max_memory_bytes and next(iter(self._frames)) != key:
+                    self._drop(next(iter(self._frames)))
+            frame.bitmap |= bit
+            frame.received += 1
+            frame.updated_at = now
+
+            if not frame.is_complete():
+                return None
+            if not frame.is_covered():
+                self._drop(key)
+                raise ValueError(f'Chunks carried {frame.bytes_received} bytes for a {frame.frame_size} byte frame')
+            del self._frames[key]
+            self._memory -= frame.nbytes
+            stats['partial'] -= 1
+            stats['completed'] += 1
+            completed = self._completed.setdefault(cart_id, deque(maxlen=self.completed_history))
+            completed.append(frame_seq)
+            return frame.assemble()
+
+    def add_chunk(self, chunk, now=None):
+        """Add a parsed binary FrameChunk (see utils/frame_protocol.py)"""
+        return self.add(chunk.cart_id, chunk.frame_seq, chunk.chunk_index, chunk.total_chunks,
+                        chunk.payload, frame_size=chunk.frame_size, offset=chunk.offset, now=now)
+
+    def expire(self, now=None):
+        """Evict frames older than max_frame_age; called periodically by the cleanup task"""
+        with self._lock:
+            self._expire(time.time() if now is None else now)
+
+    def discard(self, cart_id):
+        """Forget all in-flight frames and history for a cart"""
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == cart_id]:
+                self._drop(key)
+            self._completed.pop(cart_id, None)
+            self._cart_stats.pop(cart_id, None)
+
+    def stats(self, cart_id=None):
+        """Per-cart completed/dropped/partial counters plus global buffer usage"""
+        with self._lock:
+            if cart_id is not None:
+                return dict(self._cart_stats.get(cart_id) or self._empty_stats())
+            return {
+                'memory_bytes': self._memory,
+                'max_memory_bytes': self.max_memory_bytes,
+                'frames_in_flight': len(self._frames),
+                'carts': {cart: dict(stats) for cart, stats in self._cart_stats.items()}
+            }
@@ -0,0 +1,238 @@
+"""
+Fallback classification through a remote vision model (Gemini generateContent).
+
+Frames only go out when the local model is unsure. Calls run on a small
+worker pool sharing one pooled HTTP session, are throttled by a token bucket,
+coalesced per cart (only the newest waiting frame of a cart is sent) and
+cached by perceptual hash, so a product held still in front of the camera
+is sent once rather than once per frame.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent'
+PROMPT = ("What product is in this image?think only about products in any shopping store or grocery items  "
+          "Return a JSON with product_name and confidence (0-1).")
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average and bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class TTLCache:
+    """LRU mapping whose entries also expire `ttl` seconds after being stored"""
+
+    def __init__(self, max_entries=512, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def parse_generate_content(data):
+    """Pull {product_name, confidence} out of a generateContent response, or None"""
+    text = data['candidates'][0]['content']['parts'][0]['text']
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        logger.error(f'[RemoteClassifier] No JSON found in response text: {text}')
+        return None
+    result = json.loads(match.group(0))
+    return {
+        'product_name': result.get('product_name'),
+        'confidence': float(result.get('confidence', 0))
+    }
+
+
+class RemoteClassifier:
+    """Rate-limited, cached, per-cart coalescing client for the remote model.
+
+    `submit` never blocks the caller: the result (or None) is delivered to
+    `callback(cart_id, result, confidence_local, latency_ms)` on a worker
+    thread. Frames are skipped when the local confidence already reaches
+    `confidence_threshold`, when the hash cache has an answer (the callback
+    still fires, with latency_ms=0), or when the rate limit is exhausted.
+    """
+
+    def __init__(self, api_key=None, api_url=DEFAULT_API_URL, callback=None, workers=2,
+                 rate=1.0, burst=3, confidence_threshold=0.85, cache_size=512, cache_ttl=600,
+                 timeout=8, max_job_age=5.0):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.callback = callback
+        self.confidence_threshold = confidence_threshold
+        self.timeout = timeout
+        self.max_job_age = max_job_age
+        self.bucket = TokenBucket(rate, burst)
+        self.cache = TTLCache(cache_size, cache_ttl)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remote-classifier')
+
+        self._pending = {}  # cart_id -> newest job not yet sent
+        self._scheduled = set()  # carts with a drain task on the pool
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'confident': 0, 'cache_hits': 0, 'coalesced': 0,
+            'rate_limited': 0, 'stale': 0, 'calls': 0, 'errors': 0
+        }
+        self._call_time = 0.0
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def should_query(self, confidence_local):
+        return confidence_local < self.confidence_threshold
+
+    def submit(self, cart_id, image_b64, image_hash, confidence_local):
+        """Queue a frame for remote classification; returns False if it was not queued"""
+        self._count('submitted')
+        if not self.api_key:
+            return False
+        if not self.should_query(confidence_local):
+            self._count('confident')
+            return False
+        cached = self.cache.get(image_hash)
+        if cached is not None:
+            self._count('cache_hits')
+            self._deliver(cart_id, cached, confidence_local, 0.0)
+            return False
+        job = (image_b64, image_hash, confidence_local, time.monotonic())
+        with self._lock:
+            if cart_id in self._pending:
+                self._stats['coalesced'] += 1
+            self._pending[cart_id] = job
+            if cart_id in self._scheduled:
+                return True
+            self._scheduled.add(cart_id)
+        self._executor.submit(self._drain, cart_id)
+        return True
+
+    def _drain(self, cart_id):
+        # At most one request in flight per cart; frames that arrive meanwhile replace each other
+        while True:
+            with self._lock:
+                job = self._pending.pop(cart_id, None)
+                if job is None:
+                    self._scheduled.discard(cart_id)
+                    return
+            image_b64, image_hash, confidence_local, queued_at = job
+            if time.monotonic() - queued_at > self.max_job_age:
+                self._count('stale')
+                continue
+            cached = self.cache.get(image_hash)
+            if cached is not None:
+                self._count('cache_hits')
+                self._deliver(cart_id, cached, confidence_local, 0.0)
+                continue
+            if not self.bucket.try_acquire():
+                self._count('rate_limited')
+                continue
+            started = time.perf_counter()
+            result = self.classify(image_b64)
+            latency_ms = (time.perf_counter() - started) * 1000
+            if result is not None:
+                self.cache.put(image_hash, result)
+            self._deliver(cart_id, result, confidence_local, latency_ms)
+
+    def _deliver(self, cart_id, result, confidence_local, latency_ms):
+        if self.callback is None:
+            return
+        try:
+            self.callback(cart_id, result, confidence_local, latency_ms)
+        except Exception as e:
+            logger.error(f'[RemoteClassifier] Callback failed for cart {cart_id}: {e}')
+
+    def classify(self, image_b64):
+        """Blocking generateContent call for one JPEG; returns {product_name, confidence} or None"""
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": PROMPT},
+                        {"inlineData": {"mimeType": "image/jpeg", "data": image_b64}}
+                    ]
+                }
+            ]
+        }
+        started = time.perf_counter()
+        try:
+            resp = self.session.post(self.api_url, params={'key': self.api_key}, json=payload, timeout=self.timeout)
+            logger.info(f'[RemoteClassifier] Status: {resp.status_code}')
+            resp.raise_for_status()
+            return parse_generate_content(resp.json())
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'[RemoteClassifier] API error: {e}')
+            return None
+        finally:
+            with self._lock:
+                self._stats['calls'] += 1
+                self._call_time += time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_carts'] = len(self._pending)
+            calls = stats['calls']
+            stats['mean_call_ms'] = round(self._call_time / calls * 1000, 2) if calls else None
+        stats['cache_entries'] = len(self.cache)
+        stats['confidence_threshold'] = self.confidence_threshold
+        stats['enabled'] = bool(self.api_key)
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
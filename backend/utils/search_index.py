@@ -0,0 +1,258 @@
+"""
+In-memory full-text search for product, item and store names.
+
+An inverted index (term -> documents) with a sorted vocabulary for prefix
+matches and a symmetric-delete table for typos, so a query only touches the
+postings of the terms it matches instead of scanning every row:
+
+    britania good     -> "Britannia Good Day ..."   (typo)
+    chacalate         -> "... Chocolate ..."   (two typos, in longer words)
+    maska chas        -> "Britannia 50-50 Maska Chaska"   (prefix)
+    5050, goodday     -> "50-50", "Good Day"   (adjacent words joined)
+
+Every query word has to match (exactly, as a prefix or within the allowed
+edit distance); results are ranked by field weight, term rarity and match
+quality. Documents are added, changed and removed one at a time.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Weight of two adjacent words indexed as one term, relative to a word
+PAIR = 0.5
+EXACT = 1.0
+PREFIX = 0.7
+TYPO = (1.0, 0.6, 0.4)  # by edit distance
+
+
+def normalize(text):
+    """Lower-case and strip accents"""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Normalized words of `text`"""
+    return WORD_RE.findall(normalize(text))
+
+
+def max_edits(term):
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+# Query words this long may be two edits away from an indexed term of 8+ characters
+TWO_EDIT_QUERY_LENGTH = 6
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(term, depth):
+    """term and every variant with up to `depth` characters removed"""
+    variants = frontier = {term}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        variants = variants | frontier
+    return variants
+
+
+def parse_page(args, default_limit=20, max_limit=100):
+    """(limit, offset) from request args, clamped"""
+    limit = args.get('limit', default_limit, type=int) or default_limit
+    offset = args.get('offset', 0, type=int) or 0
+    return min(max(limit, 1), max_limit), max(offset, 0)
+
+
+class SearchIndex:
+    """Inverted index over documents made of weighted text fields.
+
+    `fields` maps field name -> weight, e.g. {'name': 3.0, 'description': 1.0}.
+    `upsert(doc_id, {field: text})` (re)indexes one document and `remove`
+    drops it; `search(query, limit, offset, where)` returns
+    (total matches, [(doc_id, score), ...]) for one page, best first.
+    """
+
+    def __init__(self, fields, min_prefix=2, max_expansions=100):
+        self.fields = dict(fields)
+        self.min_prefix = min_prefix
+        self.max_expansions = max_expansions
+        self._docs = {}
+        self._postings = {}
+        self._terms = []
+        self._deletes = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def _weights(self, document):
+        weights = {}
+        for field, field_weight in self.fields.items():
+            text = document.get(field)
+            if not text:
+                continue
+            words = tokenize(text)
+            counts = {}
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+            pairs = {a + b for a, b in zip(words, words[1:])}
+            for term in counts.keys() | pairs:
+                # Repeats count sublinearly; a joined pair counts less than a word
+                tf = counts.get(term)
+                score = field_weight * (1 + math.log(tf)) if tf else field_weight * PAIR
+                weights[term] = weights.get(term, 0.0) + score
+        length_norm = 1.0 / (1.0 + 0.1 * len(weights))
+        return {term: weight * length_norm for term, weight in weights.items()}
+
+    def _add_term(self, term):
+        # Symmetric delete: a term and a query word within n edits share a variant
+        # with at most n characters removed from each
+        bisect.insort(self._terms, term)
+        if max_edits(term):
+            for variant in _deletes(term, max_edits(term)):
+                self._deletes.setdefault(variant, set()).add(term)
+
+    def _drop_term(self, term):
+        del self._terms[bisect.bisect_left(self._terms, term)]
+        if max_edits(term):
+            for variant in _deletes(term, max_edits(term)):
+                terms = self._deletes.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[variant]
+
+    def _remove_locked(self, doc_id):
+        weights = self._docs.pop(doc_id, None)
+        if weights is None:
+            return
+        for term in weights:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+
+    def upsert(self, doc_id, document):
+        weights = self._weights(document)
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._docs[doc_id] = weights
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[doc_id] = weight
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def replace_all(self, documents):
+        """Replace the contents with (doc_id, document) pairs"""
+        with self._lock:
+            self._docs = {}
+            self._postings = {}
+            self._terms = []
+            self._deletes = {}
+            for doc_id, document in documents:
+                self.upsert(doc_id, document)
+
+    def _expand(self, token):
+        """{term: match quality} for one query word"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = EXACT
+        if len(token) >= self.min_prefix:
+            start = bisect.bisect_left(self._terms, token)
+            for term in self._terms[start:start + self.max_expansions]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    # Closer to the whole word ranks higher
+                    matches[term] = PREFIX + (EXACT - PREFIX) * len(token) / len(term)
+        depth = 2 if len(token) >= TWO_EDIT_QUERY_LENGTH else max_edits(token)
+        if depth:
+            candidates = set()
+            for variant in _deletes(token, depth):
+                candidates |= self._deletes.get(variant, set())
+            for term in candidates:
+                if term in matches:
+                    continue
+                # The longer word sets the allowed edits
+                limit = max(max_edits(token), max_edits(term))
+                distance = edit_distance(token, term, limit)
+                if distance <= limit:
+                    matches[term] = TYPO[distance]
+        return matches
+
+    def _idf(self, term):
+        df = len(self._postings[term])
+        return math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, limit=20, offset=0, where=None):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+        with self._lock:
+            expanded = []
+            for token in tokens:
+                terms = [(self._postings[term], quality * self._idf(term)) for term, quality in self._expand(token).items()]
+                if not terms:
+                    return 0, []
+                expanded.append(terms)
+            # Every word has to match: score the rarest word's documents, then
+            # look up only those in the other words' postings
+            expanded.sort(key=lambda terms: sum(len(postings) for postings, _ in terms))
+            totals = {}
+            for postings, factor in expanded[0]:
+                for doc_id, weight in postings.items():
+                    score = factor * weight
+                    if score > totals.get(doc_id, 0.0):
+                        totals[doc_id] = score
+            if where is not None:
+                totals = {doc_id: score for doc_id, score in totals.items() if where(doc_id)}
+            for terms in expanded[1:]:
+                narrowed = {}
+                for doc_id, score in totals.items():
+                    best = 0.0
+                    for postings, factor in terms:
+                        weight = postings.get(doc_id)
+                        if weight is not None and factor * weight > best:
+                            best = factor * weight
+                    if best > 0.0:
+                        narrowed[doc_id] = score + best
+                totals = narrowed
+        page = heapq.nsmallest(offset + limit, totals.items(), key=lambda item: (-item[1], str(item[0])))
+        return len(totals), page[offset:]
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._docs), 'terms': len(self._postings), 'delete_variants': len(self._deletes)}
@@ -0,0 +1,431 @@
+"""
+Shared state backends for running more than one server worker.
+
+Live state (connection counts, latest predictions, connected carts, the
+in-memory inventory) goes through a StateStore instead of module-level dicts.
+MemoryStateStore keeps the old single-process behaviour; RedisStateStore
+shares state between workers and nodes. Pick one with STATE_STORE_URL:
+
+    STATE_STORE_URL=memory://                 (default)
+    STATE_STORE_URL=redis://localhost:6379/0
+
+Values are stored as JSON in both backends, so callers always get copies
+back and must write changes back explicitly.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Key/value, hash and set operations shared by all backends"""
+
+    # Whether other workers see what this store holds
+    shared = False
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key, amount=1, ttl=None):
+        """Add to a counter; `ttl` (seconds) refreshes its expiry"""
+        raise NotImplementedError
+
+    def hget(self, name, field, default=None):
+        raise NotImplementedError
+
+    def hset(self, name, field, value):
+        raise NotImplementedError
+
+    def hdel(self, name, field):
+        raise NotImplementedError
+
+    def hupdate(self, name, field, update):
+        """Atomically replace a hash field with `update(current)` (current is None if
+        unset); an update returning None deletes the field. Returns the new value.
+        `update` may run more than once if another worker races it.
+        """
+        raise NotImplementedError
+
+    def hgetall(self, name):
+        raise NotImplementedError
+
+    def hscan(self, name, count=500):
+        """Iterate (field, value) pairs of a hash without loading it all at once"""
+        raise NotImplementedError
+
+    def sadd(self, name, member):
+        raise NotImplementedError
+
+    def srem(self, name, member):
+        raise NotImplementedError
+
+    def smembers(self, name):
+        raise NotImplementedError
+
+    def scard(self, name):
+        raise NotImplementedError
+
+    def zadd(self, name, member, score, ttl=None):
+        """Add or re-score a sorted-set member; `ttl` (seconds) refreshes the key's expiry"""
+        raise NotImplementedError
+
+    def zrem(self, name, member):
+        raise NotImplementedError
+
+    def zmembers(self, name, min_score):
+        """Members scored min_score or higher"""
+        raise NotImplementedError
+
+    def zadd_capped(self, name, member, score, limit, min_score, ttl=None, shared_with=()):
+        """Atomically add `member` unless `limit` members scored min_score or higher are
+        already in `name` and `shared_with`; lower-scored members are dropped first.
+        A member already present is re-scored. Returns whether it was added.
+        """
+        raise NotImplementedError
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel, callback):
+        """Call `callback(message)` for every message published on `channel` from now on"""
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; state is not shared between workers"""
+
+    def __init__(self):
+        self._values = {}
+        self._expires = {}
+        self._hashes = {}
+        self._sets = {}
+        self._zsets = {}
+        self._subscribers = {}
+        self._lock = threading.RLock()
+
+    def _expired(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+            return True
+        return False
+
+    def get(self, key, default=None):
+        with self._lock:
+            if self._expired(key) or key not in self._values:
+                return default
+            return json.loads(self._values[key])
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = json.dumps(value)
+            if ttl is None:
+                self._expires.pop(key, None)
+            else:
+                self._expires[key] = time.time() + ttl
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+            self._hashes.pop(key, None)
+            self._sets.pop(key, None)
+            self._zsets.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            value = self.get(key, 0) + amount
+            self._values[key] = json.dumps(value)
+            if ttl is not None:
+                self._expires[key] = time.time() + ttl
+            return value
+
+    def hget(self, name, field, default=None):
+        with self._lock:
+            raw = self._hashes.get(name, {}).get(field)
+            return default if raw is None else json.loads(raw)
+
+    def hset(self, name, field, value):
+        with self._lock:
+            self._hashes.setdefault(name, {})[field] = json.dumps(value)
+
+    def hdel(self, name, field):
+        with self._lock:
+            fields = self._hashes.get(name)
+            if fields is not None:
+                fields.pop(field, None)
+                if not fields:
+                    del self._hashes[name]
+
+    def hupdate(self, name, field, update):
+        with self._lock:
+            value = update(self.hget(name, field))
+            if value is None:
+                self.hdel(name, field)
+            else:
+                self.hset(name, field, value)
+            return value
+
+    def hgetall(self, name):
+        with self._lock:
+            return {field: json.loads(raw) for field, raw in self._hashes.get(name, {}).items()}
+
+    def hscan(self, name, count=500):
+        with self._lock:
+            items = list(self._hashes.get(name, {}).items())
+        for field, raw in items:
+            yield field, json.loads(raw)
+
+    def sadd(self, name, member):
+        with self._lock:
+            self._sets.setdefault(name, set()).add(member)
+
+    def srem(self, name, member):
+        with self._lock:
+            members = self._sets.get(name)
+            if members is not None:
+                members.discard(member)
+                if not members:
+                    del self._sets[name]
+
+    def smembers(self, name):
+        with self._lock:
+            return set(self._sets.get(name, ()))
+
+    def scard(self, name):
+        with self._lock:
+            return len(self._sets.get(name, ()))
+
+    def zadd(self, name, member, score, ttl=None):
+        # Process-local: nothing outlives the process, so `ttl` is not needed here
+        with self._lock:
+            self._zsets.setdefault(name, {})[member] = score
+
+    def zrem(self, name, member):
+        with self._lock:
+            members = self._zsets.get(name)
+            if members is not None:
+                members.pop(member, None)
+                if not members:
+                    del self._zsets[name]
+
+    def zmembers(self, name, min_score):
+        with self._lock:
+            return {member for member, score in self._zsets.get(name, {}).items() if score >= min_score}
+
+    def zadd_capped(self, name, member, score, limit, min_score, ttl=None, shared_with=()):
+        with self._lock:
+            live = 0
+            for key in (name,) + tuple(shared_with):
+                members = self._zsets.get(key, {})
+                for stale in [m for m, s in members.items() if s < min_score]:
+                    del members[stale]
+                live += len(members)
+            if member not in self._zsets.get(name, {}) and live >= limit:
+                return False
+            self._zsets.setdefault(name, {})[member] = score
+            return True
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(json.loads(json.dumps(message)))
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+
+class RedisStateStore(StateStore):
+    """Store backed by Redis (or anything speaking its protocol).
+
+    Pass either a URL or an existing redis-py compatible client, e.g. a
+    fakeredis.FakeRedis() instance when running without a Redis server.
+    """
+
+    shared = True
+
+    def __init__(self, url=None, client=None, prefix='smartcart:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f'{self.prefix}{key}'
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def incr(self, key, amount=1, ttl=None):
+        if not ttl:
+            return int(self.client.incrby(self._key(key), amount))
+        with self.client.pipeline() as pipe:
+            pipe.incrby(self._key(key), amount)
+            pipe.expire(self._key(key), int(ttl))
+            return int(pipe.execute()[0])
+
+    def hget(self, name, field, default=None):
+        raw = self.client.hget(self._key(name), field)
+        return default if raw is None else json.loads(raw)
+
+    def hset(self, name, field, value):
+        self.client.hset(self._key(name), field, json.dumps(value))
+
+    def hdel(self, name, field):
+        self.client.hdel(self._key(name), field)
+
+    def hupdate(self, name, field, update):
+        from redis.exceptions import WatchError
+        key = self._key(name)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # WATCH/MULTI, as in zadd_capped: retried if another worker wrote the hash meanwhile
+                    pipe.watch(key)
+                    raw = pipe.hget(key, field)
+                    value = update(None if raw is None else json.loads(raw))
+                    pipe.multi()
+                    if value is None:
+                        pipe.hdel(key, field)
+                    else:
+                        pipe.hset(key, field, json.dumps(value))
+                    pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+    def hgetall(self, name):
+        return {self._text(field): json.loads(raw) for field, raw in self.client.hgetall(self._key(name)).items()}
+
+    def hscan(self, name, count=500):
+        # HSCAN may repeat a field if the hash is rehashed mid-scan
+        seen = set()
+        for field, raw in self.client.hscan_iter(self._key(name), count=count):
+            field = self._text(field)
+            if field not in seen:
+                seen.add(field)
+                yield field, json.loads(raw)
+
+    def sadd(self, name, member):
+        self.client.sadd(self._key(name), member)
+
+    def srem(self, name, member):
+        self.client.srem(self._key(name), member)
+
+    def smembers(self, name):
+        return {self._text(member) for member in self.client.smembers(self._key(name))}
+
+    def scard(self, name):
+        return int(self.client.scard(self._key(name)))
+
+    def zadd(self, name, member, score, ttl=None):
+        with self.client.pipeline() as pipe:
+            pipe.zadd(self._key(name), {member: score})
+            if ttl:
+                pipe.expire(self._key(name), int(ttl))
+            pipe.execute()
+
+    def zrem(self, name, member):
+        self.client.zrem(self._key(name), member)
+
+    def zmembers(self, name, min_score):
+        return {self._text(member) for member in self.client.zrangebyscore(self._key(name), min_score, '+inf')}
+
+    def zadd_capped(self, name, member, score, limit, min_score, ttl=None, shared_with=()):
+        from redis.exceptions import WatchError
+        keys = [self._key(name)] + [self._key(key) for key in shared_with]
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # WATCH/MULTI: the transaction fails if another worker changed the keys since the count
+                    pipe.watch(*keys)
+                    live = sum(int(pipe.zcount(key, min_score, '+inf')) for key in keys)
+                    present = pipe.zscore(keys[0], member) is not None
+                    if not present and live >= limit:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    for key in keys:
+                        pipe.zremrangebyscore(key, '-inf', f'({min_score}')
+                    pipe.zadd(keys[0], {member: score})
+                    if ttl:
+                        pipe.expire(keys[0], int(ttl))
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def publish(self, channel, message):
+        self.client.publish(self._key(channel), json.dumps(message))
+
+    def subscribe(self, channel, callback):
+        # Messages are handled on a background thread that owns the subscription
+        def handle(message):
+            try:
+                callback(json.loads(message['data']))
+            except Exception as e:
+                logger.error(f'[StateStore] Subscriber of {channel} failed: {str(e)}')
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._key(channel): handle})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+def create_state_store(url=None):
+    """Build a store from a URL (defaults to STATE_STORE_URL, then memory://)"""
+    url = url or os.environ.get('STATE_STORE_URL', 'memory://')
+    if url.startswith('memory://'):
+        return MemoryStateStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStateStore(url)
+    raise ValueError(f'Unsupported state store URL: {url}')
+
+
+def socketio_message_queue(url=None):
+    """Message queue URL for Flask-SocketIO so emits reach clients on every worker.
+
+    Returns None for the in-memory store, where a single worker owns all clients.
+    """
+    url = url or os.environ.get('SOCKETIO_MESSAGE_QUEUE') or os.environ.get('STATE_STORE_URL', 'memory://')
+    if url.startswith('memory://'):
+        return None
+    return url
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Process-wide store shared by run.py and the route blueprints"""
+    global _state_store
+    if _state_store is None:
+        with _state_store_lock:
+            if _state_store is None:
+                _state_store = create_state_store()
+    return _state_store
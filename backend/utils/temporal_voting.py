@@ -0,0 +1,118 @@
+"""
+Temporal smoothing of per-frame product predictions.
+
+Frames are classified independently, so the label flickers and every frame
+looks like a fresh detection. CartTracker keeps an exponential moving
+average of each product's confidence per cart (or camera) and turns it into
+confirmed "added" / "removed" events with hysteresis: a product is added
+once its average rises above `add_threshold` and removed only after it falls
+below the lower `remove_threshold`. With the defaults a product seen at 0.9
+confidence is confirmed on its 4th consecutive frame and dropped 7 frames
+after it leaves view; a single stray frame never produces an event.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackState:
+    __slots__ = ('scores', 'info', 'present', 'last_update', 'frames')
+
+    def __init__(self):
+        self.scores = {}
+        self.info = {}
+        self.present = {}
+        self.last_update = 0.0
+        self.frames = 0
+
+
+class CartTracker:
+    """Per-key EMA vote over product confidences with add/remove hysteresis.
+
+    `update` takes one frame's observations as {label: (confidence, info)}
+    (an empty dict means nothing was recognised) and returns the events it
+    confirmed, each {'event': 'added'|'removed', 'label', 'score',
+    'timestamp', **info}. Only these events should reach the database or
+    clients. Products are tracked as present/absent, not counted.
+    """
+
+    def __init__(self, alpha=0.2, add_threshold=0.5, remove_threshold=0.2, min_score=0.02):
+        if not remove_threshold < add_threshold:
+            raise ValueError('remove_threshold must be below add_threshold')
+        self.alpha = alpha
+        self.add_threshold = add_threshold
+        self.remove_threshold = remove_threshold
+        self.min_score = min_score
+        self._states = {}
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._events = 0
+
+    def update(self, key, observations, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        events = []
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _TrackState()
+            state.last_update = timestamp
+            state.frames += 1
+            self._frames += 1
+            for label in set(state.scores) | set(observations):
+                confidence, info = observations.get(label, (0.0, None))
+                if info is not None:
+                    state.info[label] = info
+                score = (1 - self.alpha) * state.scores.get(label, 0.0) + self.alpha * confidence
+                if label in state.present:
+                    if score < self.remove_threshold:
+                        del state.present[label]
+                        events.append(self._event('removed', label, score, state, timestamp))
+                elif score >= self.add_threshold:
+                    state.present[label] = timestamp
+                    events.append(self._event('added', label, score, state, timestamp))
+                if score < self.min_score and label not in state.present:
+                    state.scores.pop(label, None)
+                    state.info.pop(label, None)
+                else:
+                    state.scores[label] = score
+            self._events += len(events)
+        return events
+
+    def _event(self, kind, label, score, state, timestamp):
+        return dict(state.info.get(label) or {}, event=kind, label=label, score=score, timestamp=timestamp)
+
+    def items(self, key):
+        """Confirmed products for a key: [{'label', 'score', 'since', **info}], highest score first"""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return []
+            items = [dict(state.info.get(label) or {}, label=label, score=state.scores[label], since=since)
+                     for label, since in state.present.items()]
+        return sorted(items, key=lambda item: -item['score'])
+
+    def reset(self, key):
+        with self._lock:
+            self._states.pop(key, None)
+
+    def expire(self, max_age):
+        """Forget keys with no update for max_age seconds (no removal events are emitted)"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [key for key, state in self._states.items() if state.last_update < cutoff]
+            for key in stale:
+                del self._states[key]
+        if stale:
+            logger.info(f'[CartTracker] Expired {len(stale)} idle tracks')
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracks': len(self._states),
+                'frames': self._frames,
+                'events': self._events,
+                'event_rate': self._events / self._frames if self._frames else 0.0
+            }
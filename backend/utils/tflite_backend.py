@@ -0,0 +1,123 @@
+"""
+TFLite serving backend for the product classifier.
+
+Runs float16 or int8 models exported by ml_models/training/export_tflite.py
+with a multi-threaded interpreter. predict() takes and returns the same
+float32 arrays as the Keras path, so ModelRegistry can serve either.
+Uses the standalone LiteRT / tflite-runtime interpreter when installed,
+otherwise the one bundled with TensorFlow.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from utils.compiled_model import DEFAULT_BUCKETS, bucket_for, chunk_sizes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', os.cpu_count() or 1))
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """Thread-safe wrapper around TFLite interpreters for one model file.
+
+    Interpreters have a fixed input shape, so batches are zero-padded to the
+    same size buckets as CompiledPredictor (1/4/8/16/32; larger or mostly
+    padded batches are split) and one interpreter is kept per bucket, all
+    sharing the model bytes. Quantized int8/uint8 inputs and outputs are converted
+    from and to float32 with the model's own scale and zero point.
+    """
+
+    def __init__(self, model_path, num_threads=DEFAULT_NUM_THREADS, buckets=DEFAULT_BUCKETS, max_padding=0.25):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.buckets = tuple(sorted(buckets))
+        self.max_padding = max_padding
+        with open(model_path, 'rb') as f:
+            self._model_content = f.read()
+        self._Interpreter = _interpreter_class()
+        self._interpreters = {}
+        self._lock = threading.Lock()
+        probe = self._interpreter(1)[0]
+        input_detail = probe.get_input_details()[0]
+        output_detail = probe.get_output_details()[0]
+        self.input_shape = tuple(input_detail['shape'][1:])
+        self.input_dtype = input_detail['dtype']
+        self.output_dtype = output_detail['dtype']
+        logger.info(f'[TFLite] {os.path.basename(model_path)}: input {self.input_dtype.__name__}{self.input_shape}, '
+                    f'output {self.output_dtype.__name__}, {num_threads} threads')
+
+    def _interpreter(self, batch_size):
+        entry = self._interpreters.get(batch_size)
+        if entry is None:
+            interpreter = self._Interpreter(model_content=self._model_content, num_threads=self.num_threads)
+            input_index = interpreter.get_input_details()[0]['index']
+            if batch_size != 1:
+                interpreter.resize_tensor_input(input_index, [batch_size] + list(interpreter.get_input_details()[0]['shape'][1:]))
+            interpreter.allocate_tensors()
+            padded = np.zeros([batch_size] + list(interpreter.get_input_details()[0]['shape'][1:]), np.float32)
+            entry = (interpreter, threading.Lock(), padded)
+            self._interpreters[batch_size] = entry
+        return entry
+
+    @staticmethod
+    def _quantize(batch, detail):
+        scale, zero_point = detail['quantization']
+        if not scale:
+            return batch.astype(detail['dtype'])
+        info = np.iinfo(detail['dtype'])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(detail['dtype'])
+
+    @staticmethod
+    def _dequantize(values, detail):
+        scale, zero_point = detail['quantization']
+        if not scale:
+            return values.astype(np.float32)
+        return (values.astype(np.float32) - zero_point) * np.float32(scale)
+
+    def _run(self, batch):
+        n = len(batch)
+        with self._lock:
+            interpreter, lock, padded = self._interpreter(bucket_for(n, self.buckets))
+        with lock:
+            input_detail = interpreter.get_input_details()[0]
+            output_detail = interpreter.get_output_details()[0]
+            if n < len(padded):
+                # Only the padding rows are zeroed
+                padded[:n] = batch
+                padded[n:] = 0
+                batch = padded
+            if input_detail['dtype'] != np.float32:
+                batch = self._quantize(batch, input_detail)
+            interpreter.set_tensor(input_detail['index'], np.ascontiguousarray(batch))
+            interpreter.invoke()
+            output = interpreter.get_tensor(output_detail['index'])[:n]
+        if output_detail['dtype'] != np.float32:
+            return self._dequantize(output, output_detail)
+        return output.copy()
+
+    def predict(self, batch):
+        """Run a (N, 224, 224, 3) float32 batch and return (N, classes) float32 probabilities"""
+        batch = np.asarray(batch, dtype=np.float32)
+        sizes = chunk_sizes(len(batch), self.buckets, self.max_padding)
+        if len(sizes) == 1:
+            return self._run(batch)
+        offsets = np.cumsum([0] + sizes)
+        return np.concatenate([self._run(batch[start:end]) for start, end in zip(offsets[:-1], offsets[1:])])
+
+    def model_size(self):
+        return len(self._model_content)
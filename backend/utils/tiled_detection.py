@@ -0,0 +1,125 @@
+"""
+Multi-object detection with the product classifier.
+
+The product model is a whole-image classifier, so a basket with several items
+still yields one label. TiledDetector splits the frame into a pyramid of
+overlapping tiles (the whole frame plus a 2x2 grid by default), scores every
+tile in one batched forward pass and merges duplicate hits per product with
+non-maximum suppression. Boxes are tile boxes, so they locate an item to
+within a tile rather than tightly.
+"""
+import logging
+
+import numpy as np
+
+from utils.preprocessing import preprocess_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRIDS = ((1, 1), (2, 2))
+
+
+def tile_boxes(width, height, grids=DEFAULT_GRIDS, overlap=0.2):
+    """(N, 4) int array of x0, y0, x1, y1 tiles; each (cols, rows) grid covers the frame with `overlap` between neighbours"""
+    boxes = []
+    for cols, rows in grids:
+        tile_w = width / (cols * (1 - overlap) + overlap)
+        tile_h = height / (rows * (1 - overlap) + overlap)
+        for row in range(rows):
+            for col in range(cols):
+                x0 = col * tile_w * (1 - overlap)
+                y0 = row * tile_h * (1 - overlap)
+                boxes.append((x0, y0, min(x0 + tile_w, width), min(y0 + tile_h, height)))
+    return np.rint(boxes).astype(np.int32)
+
+
+def box_areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def _intersections(box, boxes):
+    w = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    h = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    return np.clip(w, 0, None) * np.clip(h, 0, None)
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.5):
+    """Indices of the boxes kept by greedy NMS, highest score first"""
+    boxes = np.asarray(boxes, dtype=np.float32)
+    order = np.argsort(-np.asarray(scores))
+    areas = box_areas(boxes)
+    keep = []
+    while len(order):
+        best, rest = order[0], order[1:]
+        keep.append(int(best))
+        inter = _intersections(boxes[best], boxes[rest])
+        iou = inter / (areas[best] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+def merge_detections(boxes, labels, scores, iou_threshold=0.5, containment=0.9):
+    """Per-label NMS over tile hits, returning kept indices by descending score.
+
+    Tiles of different sizes overlap too little for IoU to catch a product
+    seen both in the whole frame and in one tile, so a hit whose box (almost)
+    contains a smaller kept hit of the same label is dropped as well; the
+    finer tile wins. Two identical items in different tiles stay two items.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    labels = np.asarray(labels)
+    scores = np.asarray(scores)
+    areas = box_areas(boxes)
+    kept = []
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        survivors = idx[non_max_suppression(boxes[idx], scores[idx], iou_threshold)]
+        for i in survivors:
+            others = survivors[(survivors != i) & (areas[survivors] < areas[i])]
+            if len(others) and np.any(_intersections(boxes[i], boxes[others]) >= containment * areas[others]):
+                continue
+            kept.append(int(i))
+    return sorted(kept, key=lambda i: -scores[i])
+
+
+class TiledDetector:
+    """Detect several products per frame with one batched forward pass.
+
+    `classify_batch` maps a (N, H, W, 3) float32 batch to two length-N
+    arrays: a label per tile and its confidence (see `softmax_labels`).
+    Tiles below `min_confidence` are ignored before merging.
+    """
+
+    def __init__(self, classify_batch, grids=DEFAULT_GRIDS, overlap=0.2, min_confidence=0.7, iou_threshold=0.5):
+        self.classify_batch = classify_batch
+        self.grids = tuple(grids)
+        self.overlap = overlap
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+
+    def detect(self, img):
+        """BGR uint8 frame -> list of {'label', 'confidence', 'box': [x0, y0, x1, y1]}, best first"""
+        height, width = img.shape[:2]
+        boxes = tile_boxes(width, height, self.grids, self.overlap)
+        # Crops are views into the frame; preprocess_batch resizes them straight into the batch
+        batch = preprocess_batch([img[y0:y1, x0:x1] for x0, y0, x1, y1 in boxes])
+        labels, scores = self.classify_batch(batch)
+        scores = np.asarray(scores, dtype=np.float32)
+        confident = np.flatnonzero(scores >= self.min_confidence)
+        if not len(confident):
+            return []
+        keep = merge_detections(boxes[confident], np.asarray(labels)[confident], scores[confident], self.iou_threshold)
+        return [{
+            'label': np.asarray(labels)[confident[i]].item(),
+            'confidence': float(scores[confident[i]]),
+            'box': boxes[confident[i]].tolist()
+        } for i in keep]
+
+
+def softmax_labels(predict_fn):
+    """Wrap a batch -> class-probabilities function as a TiledDetector classify_batch"""
+    def classify_batch(batch):
+        predictions = np.asarray(predict_fn(batch))
+        labels = np.argmax(predictions, axis=1)
+        return labels, predictions[np.arange(len(predictions)), labels]
+    return classify_batch
@@ -0,0 +1,278 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import exc as sa_exc
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient(error):
+    """Whether a failed flush may succeed if retried: lost connections, timeouts, locks"""
+    if isinstance(error, sa_exc.DBAPIError) and error.connection_invalidated:
+        return True
+    if isinstance(error, (sa_exc.OperationalError, sa_exc.DisconnectionError, sa_exc.TimeoutError)):
+        return True
+    if isinstance(error, sa_exc.SQLAlchemyError):
+        # IntegrityError, DataError, ProgrammingError, ...: the rows themselves are bad
+        return False
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class WriteBehindSink:
+    """Buffer rows in memory and write them in bulk from a background worker.
+
+    `put` queues one JSON-serialisable row dict and returns immediately. The
+    worker hands up to `batch_size` rows at a time to `flush_fn(rows)` (one
+    bulk insert + commit), waiting at most `flush_interval` seconds after the
+    oldest queued row. The queue is bounded: when it is full `put` drops the
+    row and returns False rather than stalling the caller. A flush that fails
+    with a transient error (see `is_transient`) is retried with backoff; any
+    other error means the rows themselves are bad, so the batch is retried a
+    row at a time and the rows that still fail go to the dead-letter file
+    (`dead_letter_path`, by default `<name>.dead.jsonl` in `spool_dir`) or,
+    without one, to the log.
+
+    With `spool_dir` set every accepted row is first appended to a local
+    JSON-lines segment file; segments are deleted once all their rows are
+    committed, and left-over segments are replayed by `start` (i.e. after a
+    crash or restart). Delivery is then at-least-once: a crash between a
+    commit and the segment delete replays those rows. Appends are flushed to
+    the OS (surviving a process crash); `fsync=True` also survives power loss
+    at the cost of a disk sync per row.
+    """
+
+    def __init__(self, flush_fn, batch_size=500, flush_interval=1.0, max_queue_size=10000,
+                 spool_dir=None, fsync=False, name='sink', dead_letter_path=None, is_transient=is_transient):
+        self.flush_fn = flush_fn
+        self.is_transient = is_transient
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+        self.name = name
+        if dead_letter_path is None and spool_dir:
+            dead_letter_path = os.path.join(spool_dir, f'{name}.dead.jsonl')
+        self.dead_letter_path = dead_letter_path
+        self._dead_letter_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # Spool: rows are appended to segment `_segment`; queue items remember their segment
+        self._spool_lock = threading.Lock()
+        self._abandoned = False
+        self._segment = 0
+        self._segment_file = None
+        self._segment_rows = 0
+
+        # Stats
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._replayed = 0
+        self._flushes = 0
+        self._errors = 0
+        self._dead_lettered = 0
+        self._flush_time = 0.0
+
+    def _segment_path(self, segment):
+        return os.path.join(self.spool_dir, f'{self.name}-{segment:010d}.jsonl')
+
+    def _spooled_segments(self):
+        paths = glob.glob(os.path.join(self.spool_dir, f'{self.name}-*.jsonl'))
+        return sorted(int(os.path.basename(p)[len(self.name) + 1:-6]) for p in paths)
+
+    def start(self):
+        """Start the worker, which first replays any spooled rows left from a previous run"""
+        with self._start_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return self
+            segments = []
+            if self.spool_dir:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                segments = self._spooled_segments()
+                self._segment = segments[-1] + 1 if segments else 0
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, args=(segments,), name=f'{self.name}-writer', daemon=True)
+            self._worker.start()
+        return self
+
+    def _replay(self, segments):
+        for segment in segments:
+            path = self._segment_path(segment)
+            rows = []
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        logger.warning(f'[WriteBehindSink:{self.name}] Skipping unreadable spool line in {path}')
+            for i in range(0, len(rows), self.batch_size):
+                if not self._flush(rows[i:i + self.batch_size]):
+                    return
+            os.remove(path)
+            with self._stats_lock:
+                self._replayed += len(rows)
+            if rows:
+                logger.info(f'[WriteBehindSink:{self.name}] Replayed {len(rows)} spooled rows from {path}')
+
+    def put(self, row):
+        """Queue a row for writing; returns False if the queue is full and the row was dropped"""
+        if self._worker is None:
+            self.start()
+        if self._queue.full():
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+        with self._spool_lock:
+            if self.spool_dir:
+                if self._segment_file is None:
+                    self._segment_file = open(self._segment_path(self._segment), 'a', encoding='utf-8')
+                self._segment_file.write(json.dumps(row, separators=(',', ':')) + '\n')
+                self._segment_file.flush()
+                if self.fsync:
+                    os.fsync(self._segment_file.fileno())
+                self._segment_rows += 1
+            # Queued under the spool lock so queue order matches segment order
+            self._queue.put((self._segment, row, time.monotonic()))
+        return True
+
+    def _rotate(self):
+        # New rows go to a fresh segment, so segments behind the oldest queued row can be deleted
+        with self._spool_lock:
+            if self._segment_file is not None and self._segment_rows:
+                self._segment_file.close()
+                self._segment_file = None
+                self._segment += 1
+                self._segment_rows = 0
+
+    def _release_segments(self):
+        with self._queue.mutex:
+            oldest = self._queue.queue[0][0] if self._queue.queue else None
+        with self._spool_lock:
+            current = self._segment
+        keep_from = current if oldest is None else min(oldest, current)
+        for segment in self._spooled_segments():
+            if segment >= keep_from:
+                break
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+
+    def _collect(self, timeout):
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        pending = [first]
+        deadline = first[2] + self.flush_interval
+        while len(pending) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stopped.is_set():
+                    pending.append(self._queue.get_nowait())
+                else:
+                    pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def dead_letter(self, rows, reason):
+        """Set aside rows that can never be written, with the reason"""
+        with self._stats_lock:
+            self._dead_lettered += len(rows)
+        if not self.dead_letter_path:
+            logger.error(f'[WriteBehindSink:{self.name}] Dropping {len(rows)} rows ({reason}): {rows}')
+            return
+        with self._dead_letter_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps({'row': row, 'error': reason, 'time': time.time()}, separators=(',', ':')) + '\n')
+        logger.error(f'[WriteBehindSink:{self.name}] Wrote {len(rows)} rejected rows to {self.dead_letter_path} ({reason})')
+
+    def _flush(self, rows):
+        backoff = 0.5
+        while True:
+            started = time.perf_counter()
+            try:
+                self.flush_fn(rows)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                if not self.is_transient(e):
+                    if len(rows) == 1:
+                        self.dead_letter(rows, f'{type(e).__name__}: {str(e)}')
+                        return True
+                    # Find the bad rows; the rest are written
+                    logger.warning(f'[WriteBehindSink:{self.name}] Flush of {len(rows)} rows rejected, writing them one at a time: {str(e)}')
+                    for row in rows:
+                        if not self._flush([row]):
+                            return False
+                    return True
+                logger.error(f'[WriteBehindSink:{self.name}] Flush of {len(rows)} rows failed, retrying in {backoff:.1f}s: {str(e)}')
+                if self._stopped.wait(backoff):
+                    # Shutting down: give up rather than hang (spooled rows are replayed on the next start)
+                    self._abandoned = True
+                    return False
+                backoff = min(backoff * 2, 30.0)
+                continue
+            with self._stats_lock:
+                self._written += len(rows)
+                self._flushes += 1
+                self._flush_time += time.perf_counter() - started
+            return True
+
+    def _run(self, replay_segments):
+        self._replay(replay_segments)
+        while True:
+            pending = self._collect(timeout=0.1)
+            if not pending:
+                if self._stopped.is_set():
+                    break
+                continue
+            if self.spool_dir:
+                self._rotate()
+            if self._flush([row for _, row, _ in pending]) and self.spool_dir:
+                self._release_segments()
+
+    def close(self, timeout=10):
+        """Write out everything queued, stop the worker and drop fully written segments"""
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)
+        with self._spool_lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+        finished = self._worker is None or not self._worker.is_alive()
+        if self.spool_dir and finished and self._queue.empty() and not self._abandoned:
+            self._segment += 1
+            self._release_segments()
+
+    def stats(self):
+        with self._stats_lock:
+            flushes = self._flushes
+            stats = {
+                'name': self.name,
+                'written': self._written,
+                'replayed': self._replayed,
+                'dropped': self._dropped,
+                'errors': self._errors,
+                'dead_lettered': self._dead_lettered,
+                'flushes': flushes,
+                'mean_batch_size': round(self._written / flushes, 2) if flushes else 0,
+                'mean_flush_ms': round(self._flush_time / flushes * 1000, 3) if flushes else None
+            }
+        stats['queue_depth'] = self._queue.qsize()
+        if self.spool_dir:
+            stats['spool_segments'] = len(self._spooled_segments())
+        return stats
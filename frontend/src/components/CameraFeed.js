@@ -13,6 +13,7 @@ const CameraFeed = ({ cartId }) => {
   const socketRef = useRef(null);
   const imageRef = useRef(null);
   const videoRef = useRef(null);
+  const predictionSeqRef = useRef({ cartId: null, seq: 0 });
   const addItem = useCartStore(state => state.addItem);
 
   // Webcam stream logic
@@ -177,46 +178,69 @@ const CameraFeed = ({ cartId }) => {
 
   useEffect(() => {
     if (useWebcam) return;
-    const fetchPrediction = () => {
-      fetch(`${API_URL}/latest_prediction`)
-        .then(res => res.json())
+    if (predictionSeqRef.current.cartId !== cartId) {
+      predictionSeqRef.current = { cartId, seq: 0 };
+    }
+    let cancelled = false;
+    const controller = new AbortController();
+    const handlePrediction = data => {
+      if (data && typeof data.confidence !== 'undefined' && data.product_name) {
+        setLastDetection(data);
+        if (
+          data.product_name !== 'Unknown or Not Recognized' &&
+          typeof data.confidence === 'number' &&
+          data.confidence >= 0.85
+        ) {
+          if (
+            lastAddedProduct.id !== data.product_id ||
+            lastAddedProduct.confidence < 0.85
+          ) {
+            const price = Math.floor(Math.random() * 100) + 1;
+            addItem({
+              id: data.product_id,
+              name: data.product_name,
+              price,
+              confidence: data.confidence
+            });
+            setLastAddedProduct({ id: data.product_id, confidence: data.confidence });
+            toast.success(`Added to cart: ${data.product_name} (₹${price})`);
+          }
+        } else {
+          if (
+            lastAddedProduct.id === data.product_id &&
+            data.confidence < 0.85
+          ) {
+            setLastAddedProduct({ id: null, confidence: 0 });
+          }
+        }
+      }
+    };
+    // Long poll: the server answers as soon as this cart has a newer prediction (204 on timeout)
+    const pollPrediction = () => {
+      fetch(`${API_URL}/latest_prediction/${cartId}/wait?since=${predictionSeqRef.current.seq}`, { signal: controller.signal })
+        .then(res => {
+          if (res.status === 200) return res.json();
+          if (res.status === 204) return null;
+          // Server errors back off below instead of re-polling at once
+          throw new Error(`Prediction poll failed: HTTP ${res.status}`);
+        })
         .then(data => {
-          if (data && typeof data.confidence !== 'undefined' && data.product_name) {
-            setLastDetection(data);
-            if (
-              data.product_name !== 'Unknown or Not Recognized' &&
-              typeof data.confidence === 'number' &&
-              data.confidence >= 0.85
-            ) {
-              if (
-                lastAddedProduct.id !== data.product_id ||
-                lastAddedProduct.confidence < 0.85
-              ) {
-                const price = Math.floor(Math.random() * 100) + 1;
-                addItem({
-                  id: data.product_id,
-                  name: data.product_name,
-                  price,
-                  confidence: data.confidence
-                });
-                setLastAddedProduct({ id: data.product_id, confidence: data.confidence });
-                toast.success(`Added to cart: ${data.product_name} (₹${price})`);
-              }
-            } else {
-              if (
-                lastAddedProduct.id === data.product_id &&
-                data.confidence < 0.85
-              ) {
-                setLastAddedProduct({ id: null, confidence: 0 });
-              }
-            }
+          if (cancelled) return;
+          if (data) {
+            predictionSeqRef.current.seq = data.seq;
+            handlePrediction(data);
           }
+          pollPrediction();
         })
-        .catch(() => {});
+        .catch(() => {
+          if (!cancelled) setTimeout(pollPrediction, 1000);
+        });
+    };
+    pollPrediction();
+    return () => {
+      cancelled = true;
+      controller.abort();
     };
-    fetchPrediction();
-    const interval = setInterval(fetchPrediction, 1000);
-    return () => clearInterval(interval);
   }, [cartId, addItem, lastAddedProduct, useWebcam]);
 
   return (
@@ -0,0 +1,175 @@
+"""
+Export the fine-tuned product classifier to TFLite (float16 and int8) and
+report accuracy vs latency against the Keras model on the validation split.
+
+Int8 calibration uses a representative sample of the training split, loaded
+exactly as finetuned.py loads it. Exported models keep float32 inputs and
+outputs, so the backend serves them through the same predict interface
+(set PRODUCT_MODEL_PATH or POST /model/reload with the .tflite file name).
+
+Run from ml_models/training, like finetuned.py:
+
+    python export_tflite.py
+    python export_tflite.py --model ../weights/product_model3_finetuned.h5 --calibration-samples 300
+    python export_tflite.py --report-only
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+
+from utils.tflite_backend import TFLiteClassifier
+
+# Same data settings as finetuned.py
+DATASET_DIR = "dataset"
+IMAGE_SIZE = (224, 224)
+INTERPOLATION = "box"
+VALIDATION_SPLIT = 0.2
+
+WEIGHTS_DIR = os.path.join("..", "weights")
+DEFAULT_MODEL = os.path.join(WEIGHTS_DIR, "product_model3_finetuned.h5")
+
+
+def flow(subset, batch_size, shuffle):
+    datagen = ImageDataGenerator(rescale=1./255, validation_split=VALIDATION_SPLIT)
+    return datagen.flow_from_directory(
+        DATASET_DIR,
+        target_size=IMAGE_SIZE,
+        batch_size=batch_size,
+        class_mode='categorical',
+        subset=subset,
+        shuffle=shuffle,
+        interpolation=INTERPOLATION
+    )
+
+
+def representative_dataset(samples):
+    """Calibration generator over a shuffled sample of the training split"""
+    data = flow('training', 1, True)
+
+    def generator():
+        for _ in range(min(samples, data.samples)):
+            images, _ = next(data)
+            yield [images.astype(np.float32)]
+    return generator
+
+
+def export(model, output_prefix, calibration_samples):
+    """Write <prefix>_float16.tflite and <prefix>_int8.tflite; returns {variant: path}"""
+    paths = {}
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    paths['float16'] = f"{output_prefix}_float16.tflite"
+    with open(paths['float16'], "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ float16 model saved as '{paths['float16']}'")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(calibration_samples)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Input and output stay float32 (quantize/dequantize ops are added at the edges)
+    paths['int8'] = f"{output_prefix}_int8.tflite"
+    with open(paths['int8'], "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ int8 model saved as '{paths['int8']}'")
+    return paths
+
+
+def evaluate(predict_fn, images, labels, throughput_batch):
+    """Accuracy plus batch-1 latency and batched throughput for one predict function"""
+    predict_fn(images[:1])
+    latencies = []
+    predictions = []
+    for i in range(len(images)):
+        started = time.perf_counter()
+        predictions.append(predict_fn(images[i:i + 1])[0])
+        latencies.append(time.perf_counter() - started)
+    predictions = np.argmax(np.stack(predictions), axis=1)
+
+    batch = images[:throughput_batch]
+    predict_fn(batch)
+    started = time.perf_counter()
+    rounds = max(1, 64 // len(batch))
+    for _ in range(rounds):
+        predict_fn(batch)
+    throughput = rounds * len(batch) / (time.perf_counter() - started)
+
+    latencies_ms = np.array(latencies) * 1000
+    return predictions, {
+        'accuracy': float(np.mean(predictions == labels)),
+        'latency_ms_mean': float(latencies_ms.mean()),
+        'latency_ms_p50': float(np.percentile(latencies_ms, 50)),
+        'latency_ms_p95': float(np.percentile(latencies_ms, 95)),
+        'throughput_ips': float(throughput)
+    }
+
+
+def report(model, model_path, tflite_paths, limit, throughput_batch, num_threads):
+    val_data = flow('validation', 32, False)
+    images, labels = [], []
+    for _ in range(len(val_data)):
+        batch_images, batch_labels = next(val_data)
+        images.append(batch_images)
+        labels.append(np.argmax(batch_labels, axis=1))
+    images = np.concatenate(images)[:limit].astype(np.float32)
+    labels = np.concatenate(labels)[:limit]
+    print(f"Validation images: {len(images)}")
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=(None,) + images.shape[1:], dtype=tf.float32)])
+    def keras_infer(batch):
+        return model(batch, training=False)
+
+    results = {}
+    keras_predictions, results['keras'] = evaluate(lambda b: keras_infer(b).numpy(), images, labels, throughput_batch)
+    results['keras']['size_mb'] = os.path.getsize(model_path) / 1e6
+    results['keras']['agreement'] = 1.0
+    for variant, path in tflite_paths.items():
+        classifier = TFLiteClassifier(path, num_threads=num_threads)
+        predictions, results[variant] = evaluate(classifier.predict, images, labels, throughput_batch)
+        results[variant]['size_mb'] = classifier.model_size() / 1e6
+        results[variant]['agreement'] = float(np.mean(predictions == keras_predictions))
+
+    baseline = results['keras']['throughput_ips']
+    print(f"\n{'model':<8} {'acc':>6} {'agree':>6} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8} {'speedup':>8} {'MB':>7}")
+    for variant, r in results.items():
+        print(f"{variant:<8} {r['accuracy']:>6.3f} {r['agreement']:>6.3f} {r['latency_ms_p50']:>8.2f} "
+              f"{r['latency_ms_p95']:>8.2f} {r['throughput_ips']:>8.1f} {r['throughput_ips'] / baseline:>7.2f}x {r['size_mb']:>7.2f}")
+
+    with open("tflite_report.json", "w") as f:
+        json.dump({'model': model_path, 'validation_images': len(images), 'num_threads': num_threads,
+                   'throughput_batch': throughput_batch, 'results': results}, f, indent=2)
+    print("✅ Report saved as 'tflite_report.json'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--output-prefix', help='Defaults to the model path without .h5')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=1000, help='Max validation images in the report')
+    parser.add_argument('--throughput-batch', type=int, default=16)
+    parser.add_argument('--num-threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--report-only', action='store_true', help='Reuse previously exported .tflite files')
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    output_prefix = args.output_prefix or os.path.splitext(args.model)[0]
+    if args.report_only:
+        tflite_paths = {variant: f"{output_prefix}_{variant}.tflite" for variant in ('float16', 'int8')}
+    else:
+        tflite_paths = export(model, output_prefix, args.calibration_samples)
+    report(model, args.model, tflite_paths, args.limit, args.throughput_batch, args.num_threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@ import matplotlib.pyplot as plt
 # Configuration
 DATASET_DIR = "dataset"
 IMAGE_SIZE = (224, 224)
+# Resize filter; must match serving (area downscaling in backend/utils/preprocessing.py)
+INTERPOLATION = "box"
 BATCH_SIZE = 32
 EPOCHS = 10
 LEARNING_RATE = 0.001
@@ -41,6 +43,7 @@ train_data = train_datagen.flow_from_directory(
     batch_size=BATCH_SIZE,
     class_mode='categorical',
     subset='training',
+    interpolation=INTERPOLATION,
     shuffle=True
 )
 
@@ -50,6 +53,7 @@ val_data = val_datagen.flow_from_directory(
     batch_size=BATCH_SIZE,
     class_mode='categorical',
     subset='validation',
+    interpolation=INTERPOLATION,
     shuffle=False
 )
 